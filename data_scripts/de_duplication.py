@@ -8,69 +8,60 @@ import logging
 import os
 import ndjson
 
-from helpers import merge
+from helpers import columnar, errors, maputil, merge, schemas
 
 MERGED_FOLDER = 'food-data/merged-data'
 
 MERGE_FILE = os.path.join(MERGED_FOLDER, 'merged-raw-sources.csv')
+TYPED_MERGE_FILE = columnar.get_typed_name(MERGE_FILE)
 OUTPUT_FILE = os.path.join(MERGED_FOLDER, 'deduped-merged-data.csv')
 DUPLICATE_FILE = os.path.join(MERGED_FOLDER, 'duplicate-merged-data.csv')
 NDJSON_FILE = os.path.join(MERGED_FOLDER, 'deduped-merged-data.ndjson')
+ERROR_INDEX_FILE = os.path.join(MERGED_FOLDER, 'error-index.json')
+STATE_FILE = os.path.join(MERGED_FOLDER, 'dedup-state.json')
+MERGE_SOURCE = 'merge'
 SCHEMA_FILE = 'food-data/schema/map-data-schema.json'
 
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
+def load_file(path: str, schema: dict) -> list:
     """
-    Loads the Schema File to a dictionary.
+    Loads the CSV File to a List of typed records. The file is read by column so each
+    column is converted to the schema type in a single pass. Columnar files already
+    hold typed values and are used as they are. Blank lines are skipped, like the
+    DictReader did.
 
     Args:
-        path (str): Schema File Path
+        path (str): CSV or columnar Path
+        schema (dict): JSON Schema
 
     Returns:
-        dict: Schema Dictionry
-    """
-
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
+        list: List of Records
 
-
-def load_file(path: str) -> list:
+    Raises:
+        ValueError: When a row does not have a value for every column of the header
     """
-    Loads the CSV File to a List of Dictionaries
-
-    Args:
-        path (str): CSV Path
 
-    Returns:
-        list: List of Dictionaries
-    """
+    if columnar.is_columnar(path):
+        columns = columnar.read_columns(path)
+        return maputil.columns_to_records(columns, schema) if columns and next(iter(columns.values())) else []
 
-    records = []
     csv.register_dialect('input', delimiter='|')
     with open(path, 'r', encoding='utf-8') as input_file:
-        reader = csv.DictReader(input_file, dialect='input')
-        records = list(reader)
-    return records
-
-
-def get_columns(schema: dict) -> list:
-    """
-    Creates a column list from the schema.
-
-    Args:
-        schema (dict): JSON Schema
-
-    Returns:
-        list: list of columns names
-    """
+        reader = csv.reader(input_file, dialect='input')
+        header = next(reader, [])
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(header):
+                raise ValueError(f"{path} line {reader.line_num} has {len(row)} values for {len(header)} columns")
+            rows.append(row)
 
-    properties = schema.get('properties', {})
-    columns = []
-    for key in properties.keys():
-        columns.append(key)
-    return columns
+    columns = {key: list(values) for key, values in zip(header, zip(*rows))} if rows else {}
+    maputil.coerce_columns(columns, schema)
+    return maputil.columns_to_records(columns, schema)
 
 
 def output_results(path: str, records: list, columns: list) -> None:
@@ -100,37 +91,119 @@ def output_ndjson(path: str, records: list) -> None:
     with open(path, 'w', encoding='utf-8') as output_file:
         ndjson.dump(records, output_file)
 
+def load_state(path: str, schema: dict) -> dict:
+    """
+    Loads the blocks and merged clusters of the previous run. The state is only used when it
+    was written for the same schema and version of the merge logic.
+
+    Args:
+        path (str): State path
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        dict: Clusters of each block and merged record of each cluster
+    """
+
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as input_file:
+        try:
+            state = json.load(input_file)
+        except json.JSONDecodeError:
+            return {}
+    if state.get('version') != merge.STATE_VERSION or state.get('schema') != schema.digest:
+        return {}
+    return {'blocks': state.get('blocks', {}), 'clusters': state.get('clusters', {})}
+
+
+def output_state(path: str, state: dict, schema: dict) -> None:
+    """
+    Outputs the blocks and merged clusters for the next run.
+
+    Args:
+        path (str): State path
+        state (dict): Clusters of each block and merged record of each cluster
+        schema (dict): Compiled JSON Schema
+    """
+
+    with open(path, 'w', encoding='utf-8') as output_file:
+        json.dump({'version': merge.STATE_VERSION, 'schema': schema.digest, **state}, output_file)
+
+
+def deduplicate(records: list, schema: dict) -> dict:
+    """
+    De-duplicates typed records, reusing the merged clusters of the previous run.
+
+    Args:
+        records (list): Typed records
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        dict: Dictionary of results
+    """
+
+    state = load_state(STATE_FILE, schema)
+    result = merge.deduplicate(records, schema, typed=True, state=state)
+    blocks = result['blocks']
+    logging.info(f"REBUILT {blocks['rebuilt']} OF {blocks['blocks']} BLOCKS WITH {blocks['records']} RECORDS")
+    logging.info(f"REUSED {result['reused']} OF {len(result['state']['clusters'])} MERGED CLUSTERS FROM THE PREVIOUS RUN")
+    output_state(STATE_FILE, result['state'], schema)
+    blocking = result.get('blocking')
+    if blocking:
+        logging.info(f"NAME BLOCKING: {blocking['candidates']} CANDIDATES, {blocking['pairs']} PAIRS, "
+                     f"RECALL {blocking['recall']:.3f}, {blocking['records_per_second']} RECORDS/SECOND")
+    return result
+
+
+def output_files(result: dict, schema: dict) -> None:
+    """
+    Outputs the de-duplicated and duplicate records and adds the merge errors to the error index.
+
+    Args:
+        result (dict): Dictionary of results
+        schema (dict): Compiled JSON Schema
+    """
+
+    logging.info('OUTPUTTING RESULTS...')
+    columns = schema.columns
+
+    clean_recs = result.get('records', [])
+    dupe_recs = result.get('duplicates', [])
+
+    if clean_recs:
+        logging.info(f"OUTPUTTING CLEANED RECORDS: {OUTPUT_FILE}")
+        output_results(OUTPUT_FILE, clean_recs, columns)
+        logging.info(f" OUTPUTTING CLEANED RECORDS TO NDJSON: {NDJSON_FILE}")
+        output_ndjson(NDJSON_FILE, clean_recs)
+
+    if dupe_recs:
+        logging.info(f"OUTPUTING DUPLICATE RECORDS: {DUPLICATE_FILE}")
+        output_results(DUPLICATE_FILE, dupe_recs, columns)
+
+    error_index = errors.ErrorIndex()
+    for record in clean_recs:
+        if record.get('merged_record') is True:
+            error_index.add_record(record, MERGE_SOURCE, 'group_id')
+    logging.info(f"REPLACING THE MERGE ERRORS IN THE ERROR INDEX WITH {error_index.total()}: {ERROR_INDEX_FILE}")
+    error_index.write(ERROR_INDEX_FILE, sources=[MERGE_SOURCE])
+
+
 def main():
     """
     Main Processing Functions
     """
 
-    logging.info(f"DEDUPLICATING FILE {MERGE_FILE}...")
+    merge_file = TYPED_MERGE_FILE if columnar.ENABLED and os.path.exists(TYPED_MERGE_FILE) else MERGE_FILE
+    logging.info(f"DEDUPLICATING FILE {merge_file}...")
 
-    schema = load_schema(SCHEMA_FILE)
-    records = load_file(MERGE_FILE)
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = load_file(merge_file, schema)
     
     if not os.path.exists(MERGED_FOLDER):
         os.makedirs(MERGED_FOLDER)
 
     if records:
-        result = merge.deduplicate(records, schema)
-        if result:
-            logging.info('OUTPUTTING RESULTS...')
-            columns = get_columns(schema)
-
-            clean_recs = result.get('records', [])
-            dupe_recs = result.get('duplicates', [])
-
-            if clean_recs:
-                logging.info(f"OUTPUTTING CLEANED RECORDS: {OUTPUT_FILE}")
-                output_results(OUTPUT_FILE, clean_recs, columns)
-                logging.info(f" OUTPUTTING CLEANED RECORDS TO NDJSON: {NDJSON_FILE}")
-                output_ndjson(NDJSON_FILE, clean_recs)
-                
-            if dupe_recs:
-                logging.info(f"OUTPUTING DUPLICATE RECORDS: {DUPLICATE_FILE}")
-                output_results(DUPLICATE_FILE, dupe_recs, columns)
+        output_files(deduplicate(records, schema), schema)
 
     logging.info('DONE')
 
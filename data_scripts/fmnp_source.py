@@ -4,11 +4,10 @@ Nutrition Program from the ARC GIS File.
 """
 
 import csv
-import json
 import logging
 import os
 
-from helpers import gis, maputil, validation
+from helpers import gis, maputil, validation, schemas, schedule, identity, columnar, metrics
 from helpers.rules import RulesEngine
 
 RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
@@ -21,26 +20,13 @@ DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output.
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file.
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -52,6 +38,7 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
 
 
 def map_record(record: dict, schema: dict) -> dict:
@@ -90,7 +77,7 @@ def map_record(record: dict, schema: dict) -> dict:
 
 def set_schedule(record: dict) -> dict:
     """
-    Retrieves the Vendor Schedules for the item and sets the Date_From, Date_To and Location_Description
+    Retrieves the Vendor Schedules for the item and sets the Date_From, Date_To, Location_Description and Open_Hours
 
     Args:
         record (dict): Commone Record
@@ -103,46 +90,59 @@ def set_schedule(record: dict) -> dict:
 
     record = maputil.merge_location_description(record, schedules)
     record = maputil.set_date_range(record, schedules)
+    record = schedule.set_open_hours(record, schedules)
     return record
 
 
-def main():
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the FMNP Markets from the ARC GIS Web Services
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the FMNP Markets from the ARC GIS Web Services
     logging.info(f"RETRIVING FARMER'S MARKETS FROM WEB SERVICES...")
     markets = gis.get_fmnp_markets()
-    schema = load_schema(SCHEMA_FILE)
     logging.info(f"RETRIEVED {len(markets)} ENTRIES TO CONVERT.")
     records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for market in markets:
-        # Map the Record
-        mapped_record = map_record(market, schema)
-
-        # Set the Schedule
-        mapped_record = set_schedule(mapped_record)
-
-        # Add the Id
-        mapped_record['id'] = row_number
-        mapped_record['file_name'] = SOURCE
-        # Validate the record
-        result = validation.validate(schema, mapped_record)
-        if not result.get('valid', True):
-            mapped_record['in_error'] = True
-            mapped_record['data_issues'] = result.get('errors', '')
-            error_records = error_records + 1
-
-        # Add it to the Collection
-        records.append(mapped_record)
-        row_number = row_number + 1
+    metrics.count(metrics.RECORDS_IN, len(markets))
+    with metrics.span(metrics.MAP):
+        for market in markets:
+            # Map the Record
+            mapped_record = map_record(market, schema)
+
+            # Set the Schedule
+            mapped_record = set_schedule(mapped_record)
+
+            # Add the Id
+            mapped_record['id'] = ids.next_id(mapped_record)
+            mapped_record['file_name'] = SOURCE
+            # Validate the record
+            validation.validate_record(schema, mapped_record)
+
+            # Add it to the Collection
+            records.append(mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING FMNP FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info('DONE PROCESSING RAW FMNP SOURCE INFORMATION')
 
 
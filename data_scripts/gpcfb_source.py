@@ -4,11 +4,10 @@ from ARC GIS API and maps to the standard output format.
 """
 
 import csv
-import json
 import logging
 import os
 
-from helpers import gis, maputil, validation
+from helpers import gis, maputil, validation, schemas, identity, columnar, metrics
 from helpers.rules import RulesEngine
 
 RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
@@ -21,26 +20,13 @@ DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -52,6 +38,7 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
 
 
 def map_record(record: dict, schema: dict) -> dict:
@@ -126,47 +113,53 @@ def join_location_description(entries: dict) -> str | None:
     return desc.replace('\n', '').replace('|', ' ')
 
 
-def main():
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the GPCFB Sites from the ARC GIS WebServices
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the GPCFB Sites from the ARC GIS WebServices
     logging.info(f"RETRIVING FOOD BANK SITES FROM WEB SERVICES...")
     locations = gis.get_gpcfb_sites()
-    schema = load_schema(SCHEMA_FILE)
     logging.info(f"RETRIEVED {len(locations)} ENTRIES TO CONVERT.")
     records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for location in locations:
-        if location.get('STATUS') == 'active':
-            # Map the Record
-            mapped_record = map_record(location, schema)
-
-            # Add the Id
-            mapped_record['id'] = row_number
-            mapped_record['file_name'] = SOURCE
-            # Validate the record
-            result = validation.validate(schema, mapped_record)
-            if not result.get('valid', True):
-                mapped_record['in_error'] = True
-                mapped_record['data_issues'] = result.get('errors', '')
-                error_records = error_records + 1
-
-            if not validation.validate_latitude(mapped_record.get('latitude', 0)) or not validation.validate_longitude(mapped_record.get('longitude', 0)):
-                mapped_record['in_error'] = True
-                errors = mapped_record.get('data_issues', '')
-                errors = errors + '|Invalid Latitude/Longitude'
-                mapped_record['data_issues'] = errors
-
-            # Add it to the Collection
-            records.append(mapped_record)
-            row_number = row_number + 1
+    metrics.count(metrics.RECORDS_IN, len(locations))
+    with metrics.span(metrics.MAP):
+        for location in locations:
+            if location.get('STATUS') == 'active':
+                # Map the Record
+                mapped_record = map_record(location, schema)
+
+                # Add the Id
+                mapped_record['id'] = ids.next_id(mapped_record)
+                mapped_record['file_name'] = SOURCE
+                # Validate the record
+                validation.validate_record(schema, mapped_record)
+
+                # Add it to the Collection
+                records.append(mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING GPCFB FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info('DONE PROCESSING RAW GPCFB SOURCE INFORMATION')
 
 
@@ -3,10 +3,9 @@ Converts the information from GP_garden_directory_listing CSV file to the common
 """
 
 import csv
-import json
 import logging
 import os
-from helpers import maputil, validation
+from helpers import maputil, validation, schemas, identity, columnar, metrics
 
 from helpers.rules import RulesEngine
 
@@ -14,6 +13,8 @@ RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
 RAW_OUTPUT_FILE = 'grow-pgh-raw.csv'
 SCHEMA_FILE = 'food-data/schema/map-data-schema.json'
 SOURCE = 'food-data/PFPC_data_files/GP_garden_directory_listing-20210322.csv'
+# Files the source reads, its output only changes when they do.
+INPUT_FILES = (SOURCE,)
 
 IN_DELIMITER = ','
 OUT_DELIMITER = '|'
@@ -21,26 +22,13 @@ OUT_DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -52,6 +40,7 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
 
 
 def map_record(record: dict, schema: dict) -> dict:
@@ -106,40 +95,53 @@ def load_csv(path: str) -> list:
     return records
 
 
-def main():
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the Grow PGH Items from the CSV file
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the Grow PGH Items from the CSV FILE
     logging.info(f"LOADING GROW PGH CSV...")
-    gardens = load_csv(SOURCE)
-    schema = load_schema(SCHEMA_FILE)
+    with metrics.span(metrics.FETCH):
+        gardens = load_csv(SOURCE)
     logging.info(f"RETRIEVED {len(gardens)} ENTRIES TO CONVERT.")
     records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for garden in gardens:
-        # Map the Record
-        mapped_record = map_record(garden, schema)
-
-        # Add the Id
-        mapped_record['id'] = row_number
-
-        # Validate the record
-        result = validation.validate(schema, mapped_record)
-        if not result.get('valid', True):
-            mapped_record['in_error'] = True
-            mapped_record['data_issues'] = result.get('errors', '')
-            error_records = error_records + 1
-
-        # Add it to the Collection
-        records.append(mapped_record)
-        row_number = row_number + 1
+    metrics.count(metrics.RECORDS_IN, len(gardens))
+    with metrics.span(metrics.MAP):
+        for garden in gardens:
+            # Map the Record
+            mapped_record = map_record(garden, schema)
+
+            # Add the Id
+            mapped_record['id'] = ids.next_id(mapped_record)
+
+            # Validate the record
+            validation.validate_record(schema, mapped_record)
+
+            # Add it to the Collection
+            records.append(mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING GROW PGH FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info('DONE PROCESSING RAW GROW PGH SOURCE INFORMATION')
 
 
@@ -0,0 +1,254 @@
+"""
+Column oriented batches of records. Boolean columns are held as integer bit sets
+where bit N belongs to row N, so a rule can update every row with a single mask operation.
+"""
+
+from helpers import flags
+
+def to_bits(values) -> int:
+    """
+    Packs an iterable of truth values into a bit set.
+
+    Args:
+        values (iterable): Truth value for each row
+
+    Returns:
+        int: Bit set with bit N set when row N is truthy
+    """
+
+    digits = ''.join(['1' if value else '0' for value in values])
+    return int(digits[::-1], 2) if digits else 0
+
+
+def rows_to_bits(rows: list, size: int) -> int:
+    """
+    Packs a list of row numbers into a bit set.
+
+    Args:
+        rows (list): Row numbers to set
+        size (int): Number of rows
+
+    Returns:
+        int: Bit set with the bit for each row set
+    """
+
+    digits = bytearray(b'0') * size
+    for row in rows:
+        digits[size - 1 - row] = 49
+    return int(digits, 2) if size else 0
+
+
+def from_bits(bits: int, size: int) -> list:
+    """
+    Unpacks a bit set into a list of booleans.
+
+    Args:
+        bits (int): Bit set
+        size (int): Number of rows
+
+    Returns:
+        list: Boolean for each row
+    """
+
+    if size == 0:
+        return []
+    return [digit == '1' for digit in format(bits, f'0{size}b')[::-1]]
+
+
+class RecordBatch(object):
+
+    records: list
+    size: int
+    columns: dict
+    indexes: dict
+    flags: dict
+    active: int
+    active_rows: int
+
+    def __init__(self, records: list) -> None:
+        self.records = records
+        self.size = len(records)
+        self.columns = {}
+        self.indexes = {}
+        self.flags = {}
+        for field, bit in flags.FLAG_BITS.items():
+            self.flags[bit] = to_bits([flags.is_set(record.get(field, False)) for record in records])
+        self.active = to_bits([flags.is_set(record.get('active_record', False)) for record in records])
+        self.active_rows = 0
+
+    @classmethod
+    def from_columns(cls, columns: dict):
+        """
+        Creates a batch from columns of values instead of records.
+        Flag and active_record columns may be lists of booleans or bit sets.
+
+        Args:
+            columns (dict): Column name mapped to the list of values
+
+        Returns:
+            RecordBatch: Record Batch
+        """
+
+        size = max([len(values) for values in columns.values() if isinstance(values, list)], default=0)
+        batch = cls([])
+        batch.records = None
+        batch.size = size
+        for name, values in columns.items():
+            if name in flags.FLAG_BITS:
+                batch.flags[flags.FLAG_BITS[name]] = values if isinstance(values, int) else to_bits(values)
+            elif name == 'active_record':
+                batch.active = values if isinstance(values, int) else to_bits(values)
+            else:
+                batch.columns[name] = values
+        return batch
+
+    @property
+    def all_rows(self) -> int:
+        """
+        Returns the bit set selecting every row in the batch.
+
+        Returns:
+            int: Bit set
+        """
+        return (1 << self.size) - 1
+
+    def column(self, name: str) -> list:
+        """
+        Returns the values of a column, reading them from the records on first use.
+
+        Args:
+            name (str): Column name
+
+        Returns:
+            list: Value for each row
+        """
+        if name not in self.columns:
+            self.columns[name] = [record.get(name) for record in self.records]
+        return self.columns[name]
+
+    def where(self, column: str, predicate, rows: int = -1) -> int:
+        """
+        Evaluates a predicate against the values of a column.
+        Only the selected rows are evaluated.
+
+        Args:
+            column (str): Column name
+            predicate (callable): Function returning a truth value for a column value
+            rows (int): Bit set of the rows to evaluate, defaults to every row
+
+        Returns:
+            int: Bit set of the matching rows
+        """
+        values = self.column(column)
+        if rows == -1:
+            return to_bits([predicate(value) for value in values])
+        selected = from_bits(rows, self.size)
+        return rows_to_bits([row for row, value in enumerate(values) if selected[row] and predicate(value)], self.size)
+
+    def equals(self, column: str, value: str) -> int:
+        """
+        Returns the rows where the column is equal to the value.
+
+        Args:
+            column (str): Column name
+            value (str): Value to compare
+
+        Returns:
+            int: Bit set of the matching rows
+        """
+        if column not in self.indexes:
+            positions = {}
+            for row, item in enumerate(self.column(column)):
+                positions.setdefault(item, []).append(row)
+            self.indexes[column] = {item: rows_to_bits(rows, self.size) for item, rows in positions.items()}
+        return self.indexes[column].get(value, 0)
+
+    def set_flags(self, rows: int, mask: int) -> None:
+        """
+        Sets the flags in the mask for the selected rows.
+
+        Args:
+            rows (int): Bit set of rows
+            mask (int): Flag mask
+        """
+        for bit in self.flags:
+            if mask & bit:
+                self.flags[bit] |= rows
+
+    def clear_flags(self, rows: int, mask: int) -> None:
+        """
+        Clears the flags in the mask for the selected rows.
+
+        Args:
+            rows (int): Bit set of rows
+            mask (int): Flag mask
+        """
+        for bit in self.flags:
+            if mask & bit:
+                self.flags[bit] &= ~rows
+
+    def set_active(self, rows: int, active: int) -> None:
+        """
+        Sets the active flag for the selected rows.
+
+        Args:
+            rows (int): Bit set of rows to update
+            active (int): Bit set of rows that are active
+        """
+        self.active = (self.active & ~rows) | (active & rows)
+        self.active_rows |= rows
+
+    def set_value(self, rows: int, column: str, value: str) -> None:
+        """
+        Sets a text column to the value for the selected rows.
+
+        Args:
+            rows (int): Bit set of rows
+            column (str): Column name
+            value (str): Value to set
+        """
+        values = self.column(column)
+        self.indexes.pop(column, None)
+        for index, selected in enumerate(from_bits(rows, self.size)):
+            if selected:
+                values[index] = value
+
+    def to_columns(self) -> dict:
+        """
+        Returns the batch as columns with the flags unpacked to lists of booleans.
+
+        Returns:
+            dict: Column name mapped to the list of values
+        """
+
+        columns = dict(self.columns)
+        for field, bit in flags.FLAG_BITS.items():
+            columns[field] = from_bits(self.flags[bit], self.size)
+        columns['active_record'] = from_bits(self.active, self.size)
+        return columns
+
+    def to_records(self) -> list:
+        """
+        Writes the batch columns back onto the records.
+
+        Returns:
+            list: Updated records
+        """
+
+        if self.records is None:
+            columns = self.to_columns()
+            return [dict(zip(columns.keys(), values)) for values in zip(*columns.values())]
+
+        flag_columns = [(field, from_bits(self.flags[bit], self.size))
+                        for field, bit in flags.FLAG_BITS.items()]
+        active = from_bits(self.active, self.size)
+        active_rows = from_bits(self.active_rows, self.size)
+        groups = self.columns.get('open_to_spec_group')
+        for index, record in enumerate(self.records):
+            for field, values in flag_columns:
+                record[field] = values[index]
+            if active_rows[index]:
+                record['active_record'] = active[index]
+            if groups and groups[index] != record.get('open_to_spec_group'):
+                record['open_to_spec_group'] = groups[index]
+        return self.records
@@ -5,6 +5,8 @@ Engine used for identifying the Type of a location based on the name.
 import re
 from xmlrpc.client import boolean
 
+from helpers import metrics
+
 SUPERMARKET = 'supermarket'
 FARMERS_MARKET = "farmer's market"
 OTHER = 'other'
@@ -76,6 +78,7 @@ CONVENIENCE = [
         '^.*circle.*$'
 ]
 
+@metrics.timed(metrics.CLASSIFY)
 def find_type(name:str) -> str|None:
     """
     Uses the name of the organization to identify the possibly type.
@@ -0,0 +1,140 @@
+"""
+Disjoint-set (union-find) clustering of records. Records that match are joined into the
+same cluster, so a group of any size at a location ends up in one cluster no matter
+which pairs were compared or in what order.
+"""
+
+
+class DisjointSet(object):
+    """
+    Disjoint-set forest over the integers 0 to size - 1, using union by size and path halving.
+    """
+
+    parents: list
+    sizes: list
+
+    def __init__(self, size: int) -> None:
+        self.parents = list(range(size))
+        self.sizes = [1] * size
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def add(self) -> int:
+        """
+        Adds a new single item set.
+
+        Returns:
+            int: Item number
+        """
+
+        self.parents.append(len(self.parents))
+        self.sizes.append(1)
+        return len(self.parents) - 1
+
+    def find(self, item: int) -> int:
+        """
+        Returns the root item of the set containing the item.
+
+        Args:
+            item (int): Item number
+
+        Returns:
+            int: Root item number
+        """
+
+        parents = self.parents
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    def union(self, first: int, second: int) -> bool:
+        """
+        Joins the sets containing two items.
+
+        Args:
+            first (int): Item number
+            second (int): Item number
+
+        Returns:
+            bool: True when the items were in different sets
+        """
+
+        first = self.find(first)
+        second = self.find(second)
+        if first == second:
+            return False
+        if self.sizes[first] < self.sizes[second]:
+            first, second = second, first
+        self.parents[second] = first
+        self.sizes[first] += self.sizes[second]
+        return True
+
+    def connected(self, first: int, second: int) -> bool:
+        """
+        Checks if two items are in the same set.
+
+        Args:
+            first (int): Item number
+            second (int): Item number
+
+        Returns:
+            bool: True/False
+        """
+
+        return self.find(first) == self.find(second)
+
+    def groups(self) -> list:
+        """
+        Returns the items of every set. Sets are ordered by their lowest item and the
+        items of each set are in ascending order.
+
+        Returns:
+            list: List of item number lists
+        """
+
+        groups = {}
+        for item in range(len(self.parents)):
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
+
+
+def build_clusters(size: int, pairs) -> list:
+    """
+    Clusters items from the pairs found to match.
+
+    Args:
+        size (int): Number of items
+        pairs (iterable): Matching item number pairs
+
+    Returns:
+        list: List of item number lists, including the single item clusters
+    """
+
+    disjoint_set = DisjointSet(size)
+    for first, second in pairs:
+        disjoint_set.union(first, second)
+    return disjoint_set.groups()
+
+
+def key_pairs(keys: list):
+    """
+    Generates the pairs joining every item to the first item with the same key, which
+    clusters items with equal keys using one pair per item instead of every pair.
+
+    Args:
+        keys (list): Key of each item, None for items that never match
+
+    Returns:
+        generator: Item number pairs
+    """
+
+    first = {}
+    for item, key in enumerate(keys):
+        if key is None:
+            continue
+        if key in first:
+            yield (first[key], item)
+        else:
+            first[key] = item
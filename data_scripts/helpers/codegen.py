@@ -0,0 +1,193 @@
+"""
+Generates plain Python validation functions from flat JSON Schemas.
+The generated function is compiled in memory and kept for the process keyed by a hash of
+the schema, so it is only generated once for each version of the schema. Nothing is
+written to or imported from disk.
+"""
+
+import hashlib
+import json
+import types
+
+GENERATOR_VERSION = '1'
+MAX_CACHED_VALIDATORS = 32
+
+# Drafts whose keywords the generator implements. Older drafts give exclusiveMinimum and
+# exclusiveMaximum boolean values, which change the meaning of minimum and maximum.
+SUPPORTED_DRAFTS = {
+    'https://json-schema.org/draft/2020-12/schema',
+    'https://json-schema.org/draft/2019-09/schema',
+    'http://json-schema.org/draft-07/schema',
+    'http://json-schema.org/draft-06/schema'
+}
+
+# Keywords that do not affect validation.
+ANNOTATIONS = {'$schema', '$id', '$comment', 'name', 'title', 'description', 'desription', 'decription', 'examples', 'default'}
+PROPERTY_KEYWORDS = {'type', 'minLength', 'maxLength', 'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum'}
+ROOT_KEYWORDS = {'type', 'properties', 'required'}
+
+TYPE_CHECKS = {
+    'string': 'isinstance(value, str)',
+    'number': '(isinstance(value, Number) and value is not True and value is not False)',
+    'integer': '(value is not True and value is not False and (isinstance(value, int) or (isinstance(value, float) and value.is_integer())))',
+    'boolean': '(value is True or value is False)',
+    'null': 'value is None',
+    'object': 'isinstance(value, dict)',
+    'array': 'isinstance(value, list)'
+}
+
+NUMERIC_CHECK = '(isinstance(value, Number) and value is not True and value is not False)'
+NUMERIC_KEYWORDS = ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum')
+
+_validators = {}
+
+
+def schema_hash(schema: dict) -> str:
+    """
+    Returns the hash used to identify a version of a schema.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        str: Hex digest
+    """
+
+    content = json.dumps(schema, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{GENERATOR_VERSION}:{content}".encode('utf-8')).hexdigest()
+
+
+def is_supported(schema: dict) -> bool:
+    """
+    Checks if the schema only uses keywords the generator understands, from a draft
+    whose meaning of them the generator implements.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        bool: True/False
+    """
+
+    if not isinstance(schema, dict) or set(schema.keys()) - ANNOTATIONS - ROOT_KEYWORDS:
+        return False
+    if schema.get('type', 'object') != 'object':
+        return False
+    draft = schema.get('$schema')
+    if draft is not None and (not isinstance(draft, str) or draft.rstrip('#') not in SUPPORTED_DRAFTS):
+        return False
+
+    for attributes in schema.get('properties', {}).values():
+        if not isinstance(attributes, dict) or set(attributes.keys()) - ANNOTATIONS - PROPERTY_KEYWORDS:
+            return False
+        types = attributes.get('type', [])
+        types = types if isinstance(types, list) else [types]
+        if any(prop_type not in TYPE_CHECKS for prop_type in types):
+            return False
+        for keyword in NUMERIC_KEYWORDS:
+            value = attributes.get(keyword, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return False
+    return True
+
+
+def generate_source(schema: dict) -> str:
+    """
+    Generates the source of a module containing an is_valid(record) function for the schema.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        str: Python source code
+    """
+
+    lines = [
+        '"""',
+        f"Generated validator for schema {schema_hash(schema)}",
+        '"""',
+        '',
+        'from numbers import Number',
+        '',
+        '_MISSING = object()',
+        '',
+        '',
+        'def is_valid(record):',
+        '    if not isinstance(record, dict):',
+        f"        return {'type' not in schema}"
+    ]
+
+    for key in schema.get('required', []):
+        lines.append(f"    if {key!r} not in record:")
+        lines.append('        return False')
+
+    for key, attributes in schema.get('properties', {}).items():
+        checks = []
+        types = attributes.get('type')
+        if types is not None:
+            types = types if isinstance(types, list) else [types]
+            checks.append('not (' + ' or '.join(TYPE_CHECKS[prop_type] for prop_type in types) + ')')
+
+        if 'minLength' in attributes:
+            checks.append(f"(isinstance(value, str) and len(value) < {attributes['minLength']!r})")
+        if 'maxLength' in attributes:
+            checks.append(f"(isinstance(value, str) and len(value) > {attributes['maxLength']!r})")
+        if 'minimum' in attributes:
+            checks.append(f"({NUMERIC_CHECK} and value < {attributes['minimum']!r})")
+        if 'maximum' in attributes:
+            checks.append(f"({NUMERIC_CHECK} and value > {attributes['maximum']!r})")
+        if 'exclusiveMinimum' in attributes:
+            checks.append(f"({NUMERIC_CHECK} and value <= {attributes['exclusiveMinimum']!r})")
+        if 'exclusiveMaximum' in attributes:
+            checks.append(f"({NUMERIC_CHECK} and value >= {attributes['exclusiveMaximum']!r})")
+
+        if checks:
+            lines.append(f"    value = record.get({key!r}, _MISSING)")
+            lines.append('    if value is not _MISSING and (' + ' or '.join(checks) + '):')
+            lines.append('        return False')
+
+    lines.append('    return True')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def load_module(source: str, name: str):
+    """
+    Compiles generated source into a module in memory.
+
+    Args:
+        source (str): Python source code
+        name (str): Module name
+
+    Returns:
+        module: Module
+    """
+
+    module = types.ModuleType(name)
+    exec(compile(source, f"<{name}>", 'exec'), module.__dict__)
+    return module
+
+
+def get_validator(schema: dict):
+    """
+    Returns the generated is_valid function for a schema, generating and compiling it
+    the first time the schema hash is seen.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        callable: is_valid(record) function or None when the schema is not supported
+    """
+
+    if not is_supported(schema):
+        return None
+
+    digest = schema_hash(schema)
+    is_valid = _validators.get(digest)
+    if is_valid is None:
+        is_valid = load_module(generate_source(schema), f"schema_validator_{digest[:16]}").is_valid
+        if len(_validators) >= MAX_CACHED_VALIDATORS:
+            _validators.clear()
+        _validators[digest] = is_valid
+    return is_valid
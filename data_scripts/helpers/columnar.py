@@ -0,0 +1,457 @@
+"""
+Compressed columnar files for handing typed records from one pipeline stage to the next.
+A file holds the name and schema type of each column followed by row groups, and every
+column of a row group is stored as one zlib compressed block: integers and numbers as
+packed 64 bit arrays, booleans as one byte each and strings as a JSON array. Values are
+read back with the type they were written with, so the next stage neither parses text
+nor converts the values with the schema again. Row groups are written as records arrive,
+so files are streamed the same way as the CSV files they stand in for.
+
+The format is used when the INTERMEDIATE_FORMAT environment variable is set to columnar,
+and the CSV files are still written alongside as the export.
+"""
+
+import array
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+
+from helpers import maputil
+
+EXTENSION = '.col'
+EXPORT_EXTENSION = '.csv'
+MAGIC = b'FDCOL01\n'
+
+ROW_GROUP_SIZE = 10000
+COMPRESSION_LEVEL = 6
+
+ENABLED = os.environ.get('INTERMEDIATE_FORMAT', 'csv').lower() == 'columnar'
+
+LENGTH = struct.Struct('<I')
+
+# Array type codes of the packed columns, always stored little endian.
+ARRAY_TYPES = {'integer': 'q', 'number': 'd'}
+DEFAULTS = {'integer': 0, 'number': 0.0, 'boolean': False}
+SWAP_BYTES = sys.byteorder != 'little'
+
+
+def is_columnar(path: str) -> bool:
+    """
+    Checks if a path is a columnar file.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        bool: True/False
+    """
+
+    return path.endswith(EXTENSION)
+
+
+def get_typed_name(file: str) -> str:
+    """
+    Returns the name of the columnar file standing in for a CSV file.
+
+    Args:
+        file (str): CSV file name or path
+
+    Returns:
+        str: Columnar file name or path
+    """
+
+    return os.path.splitext(file)[0] + EXTENSION
+
+
+def get_export_name(file: str) -> str:
+    """
+    Returns the name of the CSV export of a columnar file, other files are returned unchanged.
+
+    Args:
+        file (str): File name or path
+
+    Returns:
+        str: CSV file name or path
+    """
+
+    return os.path.splitext(file)[0] + EXPORT_EXTENSION if is_columnar(file) else file
+
+
+def encode_column(values: list, column_type: str) -> tuple:
+    """
+    Encodes the values of a column, converting them to the column type.
+    Strings store missing values as empty strings, like a CSV file, and the other
+    types keep them in a mask of one byte per value, where empty strings are missing too,
+    as sources leave coordinates they could not find empty.
+
+    Args:
+        values (list): Values
+        column_type (str): Schema type
+
+    Returns:
+        tuple: Null mask, empty when no value is missing, and the encoded values
+    """
+
+    if column_type not in DEFAULTS:
+        strings = ['' if value is None else value if type(value) is str else str(value) for value in values]
+        return b'', json.dumps(strings, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    converter = maputil.get_converter(column_type)
+    default = DEFAULTS[column_type]
+    mask = bytes(value is None or value == '' for value in values)
+    if not any(mask):
+        mask = b''
+        converted = list(map(converter, values))
+    else:
+        converted = [default if missing else converter(value) for value, missing in zip(values, mask)]
+    if column_type == 'boolean':
+        return mask, bytes(converted)
+
+    packed = array.array(ARRAY_TYPES[column_type], converted)
+    if SWAP_BYTES:
+        packed.byteswap()
+    return mask, packed.tobytes()
+
+
+def decode_column(mask: bytes, data: bytes, column_type: str) -> list:
+    """
+    Decodes the values of a column.
+
+    Args:
+        mask (bytes): Null mask
+        data (bytes): Encoded values
+        column_type (str): Schema type
+
+    Returns:
+        list: Values
+    """
+
+    if column_type not in DEFAULTS:
+        return json.loads(data.decode('utf-8'))
+
+    if column_type == 'boolean':
+        values = [value == 1 for value in data]
+    else:
+        packed = array.array(ARRAY_TYPES[column_type])
+        packed.frombytes(data)
+        if SWAP_BYTES:
+            packed.byteswap()
+        values = packed.tolist()
+
+    if mask:
+        values = [None if missing else value for value, missing in zip(values, mask)]
+    return values
+
+
+def read_length(input_file) -> int | None:
+    """
+    Reads a length prefix.
+
+    Args:
+        input_file (file): Binary file
+
+    Returns:
+        int | None: Length, None at the end of the file
+    """
+
+    data = input_file.read(LENGTH.size)
+    if len(data) < LENGTH.size:
+        return None
+    return LENGTH.unpack(data)[0]
+
+
+def read_header(input_file) -> list:
+    """
+    Reads the header of a columnar file.
+
+    Args:
+        input_file (file): Binary file at its start
+
+    Returns:
+        list: Name and type of each column
+    """
+
+    if input_file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{getattr(input_file, 'name', 'File')} is not a columnar file")
+    length = read_length(input_file)
+    return [tuple(column) for column in json.loads(input_file.read(length or 0))['columns']]
+
+
+def encode_header(types: dict) -> bytes:
+    """
+    Returns the header of a columnar file.
+
+    Args:
+        types (dict): Column name mapped to the schema type
+
+    Returns:
+        bytes: Header
+    """
+
+    header = json.dumps({'columns': [[name, column_type] for name, column_type in types.items()]}).encode('utf-8')
+    return MAGIC + LENGTH.pack(len(header)) + header
+
+
+class ColumnarWriter(object):
+    """
+    Writes records to a columnar file a row group at a time. Like the CSV writers, the file
+    is only created when the first row group is written.
+    """
+
+    path: str
+    types: dict
+    columns: list
+    count: int
+    size: int
+    row_group_size: int
+
+    def __init__(self, path: str, types: dict, row_group_size: int = ROW_GROUP_SIZE) -> None:
+        """
+        Args:
+            path (str): File path
+            types (dict): Column name mapped to the schema type
+            row_group_size (int): Records in each row group
+        """
+
+        self.path = path
+        self.types = dict(types)
+        self.columns = list(self.types)
+        self.count = 0
+        self.size = 0
+        self.row_group_size = row_group_size
+        self._header = encode_header(self.types)
+        self._file = None
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """
+        Creates the file and writes the header, unless the file is already open.
+        """
+
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+            self._file.write(self._header)
+            self.size = len(self._header)
+
+    def write(self, record: dict) -> None:
+        """
+        Adds a record, writing a row group when enough records are waiting.
+
+        Args:
+            record (dict): Record
+        """
+
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def write_records(self, records) -> None:
+        """
+        Adds several records.
+
+        Args:
+            records (iterable): Records
+        """
+
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        """
+        Writes the waiting records as a row group.
+        """
+
+        if not self._buffer:
+            return
+        self.open()
+
+        records = self._buffer
+        self._buffer = []
+        blocks = []
+        lengths = []
+        for name, column_type in self.types.items():
+            mask, data = encode_column([record.get(name) for record in records], column_type)
+            mask = zlib.compress(mask, COMPRESSION_LEVEL) if mask else b''
+            data = zlib.compress(data, COMPRESSION_LEVEL)
+            blocks.extend((mask, data))
+            lengths.append([len(mask), len(data)])
+
+        header = json.dumps({'rows': len(records), 'blocks': lengths}).encode('utf-8')
+        self._file.write(LENGTH.pack(len(header)) + header)
+        self._file.writelines(blocks)
+        self.size += LENGTH.size + len(header) + sum(map(len, blocks))
+        self.count += len(records)
+
+    def append(self, path: str, count: int) -> None:
+        """
+        Appends the row groups of a file written with the same columns, without decoding them.
+
+        Args:
+            path (str): File path
+            count (int): Number of records in the file
+        """
+
+        if not count:
+            return
+        self.flush()
+        self.open()
+        with open(path, 'rb') as part_file:
+            header = part_file.read(len(self._header))
+            if header != self._header:
+                raise ValueError(f"{path} does not have the columns of {self.path}")
+            while True:
+                data = part_file.read(1 << 20)
+                if not data:
+                    break
+                self._file.write(data)
+                self.size += len(data)
+        self.count += count
+
+    def close(self) -> None:
+        """
+        Writes the waiting records and closes the file.
+        """
+
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_row_groups(path: str, columns: list = None):
+    """
+    Reads a columnar file one row group at a time. Columns that are not requested
+    are skipped without being decompressed.
+
+    Args:
+        path (str): File path
+        columns (list): Columns to read, defaults to every column
+
+    Returns:
+        generator: Column name mapped to the values of each row group
+    """
+
+    with open(path, 'rb') as input_file:
+        header = read_header(input_file)
+        wanted = set(columns) if columns is not None else None
+        while True:
+            length = read_length(input_file)
+            if length is None:
+                return
+            group = json.loads(input_file.read(length))
+            values = {}
+            for (name, column_type), (mask_length, data_length) in zip(header, group['blocks']):
+                if wanted is not None and name not in wanted:
+                    input_file.seek(mask_length + data_length, os.SEEK_CUR)
+                    continue
+                mask = zlib.decompress(input_file.read(mask_length)) if mask_length else b''
+                values[name] = decode_column(mask, zlib.decompress(input_file.read(data_length)), column_type)
+            yield values
+
+
+def read_columns(path: str, columns: list = None) -> dict:
+    """
+    Reads the columns of a columnar file.
+
+    Args:
+        path (str): File path
+        columns (list): Columns to read, defaults to every column
+
+    Returns:
+        dict: Column name mapped to the list of values, in the order of the file
+    """
+
+    with open(path, 'rb') as input_file:
+        names = [name for name, _ in read_header(input_file)]
+    result = {name: [] for name in names if columns is None or name in columns}
+    for group in read_row_groups(path, columns):
+        for name, values in group.items():
+            result[name].extend(values)
+    return result
+
+
+def read_records(path: str):
+    """
+    Reads the records of a columnar file one row group at a time.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        generator: Records
+    """
+
+    for group in read_row_groups(path):
+        names = list(group)
+        for values in zip(*group.values()):
+            yield dict(zip(names, values))
+
+
+def write_records(path: str, records, types: dict) -> int:
+    """
+    Writes records to a columnar file.
+
+    Args:
+        path (str): File path
+        records (iterable): Records
+        types (dict): Column name mapped to the schema type
+
+    Returns:
+        int: Number of records written
+    """
+
+    with ColumnarWriter(path, types) as writer:
+        writer.write_records(records)
+    return writer.count
+
+
+def write_typed(csv_path: str, records: list, schema: dict) -> str | None:
+    """
+    Writes the columnar file standing in for a CSV hand-off file when the format is enabled.
+
+    Args:
+        csv_path (str): Path of the CSV file
+        records (list): Records
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        str | None: Path of the columnar file, None when the format is not enabled
+    """
+
+    if not ENABLED or schema is None:
+        return None
+    path = get_typed_name(csv_path)
+    write_records(path, records, getattr(schema, 'types', None) or maputil.get_field_types(schema))
+    return path
+
+
+def export_csv(path: str, csv_path: str = None, delimiter: str = '|') -> str:
+    """
+    Exports a columnar file to a delimited CSV file.
+
+    Args:
+        path (str): Columnar file path
+        csv_path (str): CSV file path, defaults to the columnar path with a .csv extension
+        delimiter (str): Delimiter
+
+    Returns:
+        str: CSV file path
+    """
+
+    csv_path = csv_path or get_export_name(path)
+    with open(path, 'rb') as input_file:
+        columns = [name for name, _ in read_header(input_file)]
+    with open(csv_path, 'w', newline='', encoding='utf-8') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=columns, delimiter=delimiter)
+        writer.writeheader()
+        writer.writerows(read_records(path))
+    return csv_path
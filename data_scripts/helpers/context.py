@@ -0,0 +1,108 @@
+"""
+Run Context shared by every record processed during a single pipeline run.
+Holds the evaluation instant and the season windows used to set the active flag.
+"""
+
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+FARMERS_MARKET_SEASON = 'farmers_market'
+BLOOMFIELD_SEASON = 'bloomfield'
+SUMMER_MEAL_SEASON = 'summer_meal'
+
+# Season windows as ((start month, start day), (end month, end day))
+SEASONS = {
+    FARMERS_MARKET_SEASON: ((6, 1), (8, 31)),
+    BLOOMFIELD_SEASON: ((5, 1), (11, 30)),
+    SUMMER_MEAL_SEASON: ((6, 1), (8, 30))
+}
+
+_current_context = None
+_context_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_season_windows(year: int) -> dict:
+    """
+    Builds the season windows for a given year.
+
+    Args:
+        year (int): Year of the windows
+
+    Returns:
+        dict: Season name mapped to the start and end datetime
+    """
+
+    windows = {}
+    for name, (start, end) in SEASONS.items():
+        windows[name] = (datetime(year, start[0], start[1]), datetime(year, end[0], end[1]))
+    return windows
+
+
+class RunContext(object):
+
+    evaluated_at: datetime
+    windows: dict
+    active: dict
+
+    def __init__(self, evaluated_at: datetime = None) -> None:
+        self.evaluated_at = evaluated_at or datetime.utcnow()
+        self.windows = get_season_windows(self.evaluated_at.year)
+        self.active = {name: start <= self.evaluated_at <= end for name, (start, end) in self.windows.items()}
+
+    def in_season(self, season: str, current_date: datetime = None) -> bool:
+        """
+        Checks if a date is inside a season window.
+        The evaluation instant of the run uses the precomputed result.
+
+        Args:
+            season (str): Season name
+            current_date (datetime): Date to check, defaults to the evaluation instant
+
+        Returns:
+            bool: True/False
+        """
+
+        if current_date is None or current_date is self.evaluated_at:
+            return self.active[season]
+
+        start, end = get_season_windows(current_date.year)[season]
+        return start <= current_date <= end
+
+
+def get_run_context() -> RunContext:
+    """
+    Returns the context of the current run, creating it on first use. Sources running
+    at the same time share the context created by the first of them.
+
+    Returns:
+        RunContext: Run Context
+    """
+
+    global _current_context
+    context = _current_context
+    if context is None:
+        with _context_lock:
+            if _current_context is None:
+                _current_context = RunContext()
+            context = _current_context
+    return context
+
+
+def set_run_context(context: RunContext | None) -> RunContext | None:
+    """
+    Sets the context used for the rest of the run. Passing None starts a new
+    context on the next call to get_run_context.
+
+    Args:
+        context (RunContext): Run Context
+
+    Returns:
+        RunContext: The context that was set
+    """
+
+    global _current_context
+    with _context_lock:
+        _current_context = context
+    return context
@@ -0,0 +1,416 @@
+"""
+Small scheduler for a directed acyclic graph (DAG) of pipeline stages. Each stage names the
+stages it depends on and runs in a thread pool as soon as all of them have finished, so
+stages that do not depend on each other, such as the sources, run at the same time and the
+run takes about as long as its slowest chain of stages instead of the sum of all of them.
+
+Stages can be retried after a failure and given a timeout. The timeout is advisory: a thread
+can not be stopped, so an attempt running past it is left running in a daemon thread and the
+stage fails without a retry, so two attempts of a stage never run at the same time. A stage
+that fails every attempt is reported with its error and the stages depending on it are skipped. The report of a run
+has the timing of every stage and the critical path, the chain of stages that decided how
+long the run took.
+
+Given a fingerprint manifest, the scheduler also fingerprints the output of every stage. A
+stage with a reuse function whose input fingerprint, its version and the output fingerprints
+of the stages it depends on, matches the last run loads its previous output instead of
+running, once the output is checked against the fingerprint recorded for it.
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+
+from helpers import fingerprint
+
+DEFAULT_WORKERS = 4
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+REUSED = 'reused'
+
+# Statuses of stages whose result is handed to the stages depending on them.
+COMPLETED = (SUCCEEDED, REUSED)
+
+
+class StageError(Exception):
+    """
+    Raised when stages of a run failed, after every other stage that could run has finished.
+    """
+
+    report: dict
+
+    def __init__(self, message: str, report: dict) -> None:
+        super().__init__(message)
+        self.report = report
+
+
+class AttemptTimeout(TimeoutError):
+    """
+    Raised when an attempt of a stage ran past its timeout. The attempt is still running.
+    """
+
+
+class Stage(object):
+    """
+    A stage of the graph. The function is called with the results of the stages it depends on,
+    by stage name, and returns the result handed to the stages depending on it.
+
+    The reuse function loads the result of the last run and raises when it is not available,
+    and the digest function returns the output fingerprint of a result.
+    """
+
+    name: str
+    function: callable
+    depends: tuple
+    retries: int
+    timeout: float | None
+    retry_delay: float
+    version: str
+    reuse: callable
+    digest: callable
+
+    def __init__(self, name: str, function, depends=(), retries: int = 0, timeout: float = None,
+                 retry_delay: float = 1.0, version: str = '', reuse=None, digest=None) -> None:
+        """
+        Args:
+            name (str): Stage name
+            function (callable): Function called with the results of the stages it depends on
+            depends (iterable): Names of the stages it depends on
+            retries (int): Number of times the stage is run again after failing
+            timeout (float): Seconds each attempt may take before the stage fails, no limit when None
+            retry_delay (float): Seconds waited before the first retry, doubled for every retry after it
+            version (str): Fingerprint of the code, settings and files the stage reads
+            reuse (callable): Function loading the result of the last run, the stage always runs when None
+            digest (callable): Function returning the output fingerprint of a result, hashing it as JSON when None
+        """
+
+        self.name = name
+        self.function = function
+        self.depends = tuple(depends)
+        self.retries = retries
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.version = version
+        self.reuse = reuse
+        self.digest = digest
+
+
+def sort_stages(stages: list) -> list:
+    """
+    Returns the stages in an order where every stage comes after the stages it depends on,
+    keeping the given order between stages that do not depend on each other.
+
+    Args:
+        stages (list): Stages
+
+    Returns:
+        list: Sorted stages
+    """
+
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Stage {stage.name} is defined more than once")
+        by_name[stage.name] = stage
+    for stage in stages:
+        for name in stage.depends:
+            if name not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on the unknown stage {name}")
+
+    ordered = []
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if done.issuperset(stage.depends)]
+        if not ready:
+            raise ValueError(f"Stages {', '.join(stage.name for stage in remaining)} depend on each other")
+        ordered.extend(ready)
+        done.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in done]
+    return ordered
+
+
+def get_digest(stage: Stage, result) -> str:
+    """
+    Returns the output fingerprint of the result of a stage.
+
+    Args:
+        stage (Stage): Stage
+        result (any): Result of the stage
+
+    Returns:
+        str: Output fingerprint
+    """
+
+    return (stage.digest or fingerprint.hash_value)(result)
+
+
+def run_attempt(stage: Stage, inputs: dict, attempt: int, starts: dict, fingerprinted: bool = False) -> tuple:
+    """
+    Runs an attempt of a stage in a worker thread, waiting before a retry. An attempt of a
+    stage with a timeout runs in a daemon thread of its own, which is abandoned when it runs
+    past the timeout, so it neither holds the worker nor keeps the interpreter from exiting.
+
+    Args:
+        stage (Stage): Stage
+        inputs (dict): Results of the stages it depends on
+        attempt (int): Attempt number, starting at 0
+        starts (dict): Time the first attempt of each stage started, by stage name
+        fingerprinted (bool): Fingerprint the result
+
+    Returns:
+        tuple: Result of the stage and its output fingerprint, None when not fingerprinted
+
+    Raises:
+        AttemptTimeout: When the attempt ran past the timeout of the stage
+    """
+
+    if attempt:
+        time.sleep(stage.retry_delay * 2 ** (attempt - 1))
+    starts.setdefault(stage.name, time.perf_counter())
+    if stage.timeout is None:
+        result = stage.function(inputs)
+        return result, get_digest(stage, result) if fingerprinted else None
+
+    outcome = {}
+
+    def target() -> None:
+        try:
+            result = stage.function(inputs)
+            outcome['result'] = result, get_digest(stage, result) if fingerprinted else None
+        except BaseException as error:
+            outcome['error'] = error
+
+    thread = threading.Thread(target=target, name=f"stage-{stage.name}-{attempt + 1}", daemon=True)
+    thread.start()
+    thread.join(stage.timeout)
+    if thread.is_alive():
+        raise AttemptTimeout(f"no result after {stage.timeout}s")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def reuse_output(stage: Stage, output: str, starts: dict) -> tuple | None:
+    """
+    Loads the result of the last run of a stage in a worker thread.
+
+    Args:
+        stage (Stage): Stage
+        output (str): Output fingerprint recorded for the last run
+        starts (dict): Time the first attempt of each stage started, by stage name
+
+    Returns:
+        tuple | None: Result of the stage and its output fingerprint, None when the result
+        is not available or does not match the fingerprint
+    """
+
+    starts.setdefault(stage.name, time.perf_counter())
+    try:
+        result = stage.reuse()
+    except Exception as error:
+        logging.info(f"STAGE {stage.name} CAN NOT REUSE ITS LAST OUTPUT: {type(error).__name__}: {error}")
+        return None
+    if get_digest(stage, result) != output:
+        logging.info(f"STAGE {stage.name} CAN NOT REUSE ITS LAST OUTPUT: THE OUTPUT CHANGED")
+        return None
+    return result, output
+
+
+def get_critical_path(stages: list, timings: dict) -> list:
+    """
+    Returns the chain of stages with the longest total duration, which decided how long
+    the run took.
+
+    Args:
+        stages (list): Stages in dependency order
+        timings (dict): Timing of every stage that ran, by stage name
+
+    Returns:
+        list: Stage names from the first to the last stage of the path
+    """
+
+    lengths = {}
+    previous = {}
+    for stage in stages:
+        timing = timings.get(stage.name)
+        if timing is None or timing['status'] not in COMPLETED:
+            continue
+        before = max((name for name in stage.depends if name in lengths), key=lengths.get, default=None)
+        lengths[stage.name] = timing['seconds'] + (lengths[before] if before else 0.0)
+        previous[stage.name] = before
+
+    if not lengths:
+        return []
+    name = max(lengths, key=lengths.get)
+    path = []
+    while name:
+        path.append(name)
+        name = previous[name]
+    return path[::-1]
+
+
+class Scheduler(object):
+    """
+    Runs a graph of stages in a thread pool. Threads suit the pipeline stages, which spend
+    most of their time waiting on web services. A timed out attempt can not be stopped, so
+    it is abandoned and its result ignored, and the stage is not retried while it may still
+    be writing its output.
+    """
+
+    stages: list
+    workers: int
+    manifest: fingerprint.Manifest | None
+    results: dict
+    report: dict
+
+    def __init__(self, stages: list, workers: int = DEFAULT_WORKERS, manifest: fingerprint.Manifest = None) -> None:
+        """
+        Args:
+            stages (list): Stages
+            workers (int): Number of stages run at the same time
+            manifest (Manifest): Fingerprints of the last run, every stage runs when None
+        """
+
+        self.stages = sort_stages(stages)
+        self.workers = max(1, workers)
+        self.manifest = manifest
+        self.results = {}
+        self.report = {}
+
+    def run(self) -> dict:
+        """
+        Runs or reuses every stage once the stages it depends on have completed.
+
+        Returns:
+            dict: Result of every stage, by stage name
+
+        Raises:
+            StageError: When a stage failed every attempt
+        """
+
+        by_name = {stage.name: stage for stage in self.stages}
+        waiting = {stage.name: set(stage.depends) for stage in self.stages}
+        dependents = {stage.name: [] for stage in self.stages}
+        for stage in self.stages:
+            for name in stage.depends:
+                dependents[name].append(stage.name)
+
+        timings = {}
+        starts = {}
+        running = {}
+        inputs_fingerprints = {}
+        outputs = {}
+        fingerprinted = self.manifest is not None
+        started = time.perf_counter()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stage')
+
+        def submit(name: str, attempt: int, reuse: bool = True) -> None:
+            stage = by_name[name]
+            if fingerprinted and not attempt:
+                inputs_fingerprints[name] = fingerprint.combine(
+                    name, stage.version, *(f"{dependency}:{outputs[dependency]}" for dependency in stage.depends))
+                output = self.manifest.get_output(name, inputs_fingerprints[name])
+                if reuse and stage.reuse is not None and output is not None:
+                    running[executor.submit(reuse_output, stage, output, starts)] = (name, None)
+                    timings.setdefault(name, {})['attempts'] = 0
+                    return
+
+            inputs = {dependency: self.results[dependency] for dependency in stage.depends}
+            running[executor.submit(run_attempt, stage, inputs, attempt, starts, fingerprinted)] = (name, attempt)
+            timings.setdefault(name, {})['attempts'] = attempt + 1
+
+        def finish(name: str, status: str, error: str = None) -> None:
+            now = time.perf_counter()
+            timing = timings.setdefault(name, {'attempts': 0})
+            timing['start'] = starts.get(name, now) - started
+            timing['end'] = now - started
+            timing['seconds'] = timing['end'] - timing['start']
+            timing['status'] = status
+            if error:
+                timing['error'] = error
+            if status in COMPLETED:
+                logging.info(f"STAGE {name} {status.upper()} IN {timing['seconds']:.2f}s")
+                for dependent in dependents[name]:
+                    waiting[dependent].discard(name)
+                    if not waiting[dependent]:
+                        submit(dependent, 0)
+            else:
+                logging.error(f"STAGE {name} {status.upper()}{': ' + error if error else ''}")
+                for dependent in dependents[name]:
+                    if dependent not in timings:
+                        finish(dependent, SKIPPED, f"{name} {status}")
+
+        def fail(name: str, attempt: int, error: str, retry: bool = True) -> None:
+            if retry and attempt < by_name[name].retries:
+                logging.warning(f"STAGE {name} ATTEMPT {attempt + 1} FAILED, RETRYING: {error}")
+                submit(name, attempt + 1)
+            else:
+                finish(name, FAILED, error)
+
+        try:
+            for stage in self.stages:
+                if not stage.depends:
+                    submit(stage.name, 0)
+
+            while running:
+                done, _ = concurrent.futures.wait(list(running), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name, attempt = running.pop(future)
+                    error = future.exception()
+                    if attempt is None and future.result() is None:
+                        submit(name, 0, reuse=False)
+                    elif error is None:
+                        self.results[name], outputs[name] = future.result()
+                        finish(name, SUCCEEDED if attempt is not None else REUSED)
+                    elif isinstance(error, AttemptTimeout):
+                        fail(name, attempt, f"TimeoutError: {error}", retry=False)
+                    else:
+                        fail(name, attempt, f"{type(error).__name__}: {error}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if fingerprinted:
+            for name, timing in timings.items():
+                if timing['status'] in COMPLETED:
+                    self.manifest.set(name, inputs_fingerprints[name], outputs[name])
+                elif timing['status'] == FAILED:
+                    self.manifest.remove(name)
+            self.manifest.save()
+
+        wall = time.perf_counter() - started
+        critical_path = get_critical_path(self.stages, timings)
+        self.report = {
+            'seconds': wall,
+            'stage_seconds': sum(timing.get('seconds', 0.0) for timing in timings.values()
+                                 if timing['status'] != SKIPPED),
+            'critical_path': critical_path,
+            'critical_path_seconds': sum(timings[name]['seconds'] for name in critical_path),
+            'stages': {stage.name: timings[stage.name] for stage in self.stages if stage.name in timings}
+        }
+
+        failed = [name for name, timing in self.report['stages'].items() if timing['status'] == FAILED]
+        if failed:
+            raise StageError(f"Stages failed: {', '.join(failed)}", self.report)
+        return self.results
+
+
+def run_stages(stages: list, workers: int = DEFAULT_WORKERS, manifest: fingerprint.Manifest = None) -> tuple:
+    """
+    Runs a graph of stages.
+
+    Args:
+        stages (list): Stages
+        workers (int): Number of stages run at the same time
+        manifest (Manifest): Fingerprints of the last run, every stage runs when None
+
+    Returns:
+        tuple: Result of every stage by stage name, and the run report
+    """
+
+    scheduler = Scheduler(stages, workers, manifest)
+    results = scheduler.run()
+    return results, scheduler.report
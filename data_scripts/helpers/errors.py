@@ -0,0 +1,136 @@
+"""
+Aggregated index of the validation errors found during a pipeline run.
+Counts every error code for each source and keeps a few sample record ids,
+so the issues of a run can be reviewed without reading every record.
+"""
+
+import json
+import os
+
+from helpers import validation
+
+SAMPLE_SIZE = 5
+
+
+class ErrorIndex(object):
+
+    sample_size: int
+    entries: dict
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE) -> None:
+        self.sample_size = sample_size
+        self.entries = {}
+
+    def add(self, source: str, codes, record_id) -> None:
+        """
+        Adds the error codes of a single record.
+
+        Args:
+            source (str): Source of the record
+            codes (iterable): Error codes of the record
+            record_id (str|int): Id used as a sample
+        """
+
+        for code in codes:
+            entry = self.entries.setdefault(source, {}).setdefault(code, {'count': 0, 'samples': []})
+            entry['count'] += 1
+            if len(entry['samples']) < self.sample_size:
+                entry['samples'].append(record_id)
+
+    def add_record(self, record: dict, source: str = None, id_field: str = 'id') -> None:
+        """
+        Adds the error codes carried in the data_issues of a record.
+
+        Args:
+            record (dict): Record
+            source (str): Source of the record, defaults to the record's file_name
+            id_field (str): Field used for the sample ids
+        """
+
+        codes = validation.get_issue_codes(record)
+        if codes:
+            self.add(source or record.get('file_name') or record.get('source_file', ''), codes, record.get(id_field))
+
+    def update(self, entries: dict) -> None:
+        """
+        Adds the entries of another index.
+
+        Args:
+            entries (dict): Index entries as returned by to_dict
+        """
+
+        for source, codes in entries.items():
+            for code, other in codes.items():
+                entry = self.entries.setdefault(source, {}).setdefault(code, {'count': 0, 'samples': []})
+                entry['count'] += other.get('count', 0)
+                room = self.sample_size - len(entry['samples'])
+                entry['samples'].extend(other.get('samples', [])[:max(room, 0)])
+
+    def total(self) -> int:
+        """
+        Returns the number of errors in the index.
+
+        Returns:
+            int: Error count
+        """
+
+        return sum(entry['count'] for codes in self.entries.values() for entry in codes.values())
+
+    def to_dict(self) -> dict:
+        """
+        Returns the index with the sources and codes sorted.
+
+        Returns:
+            dict: Source mapped to each code's count and samples
+        """
+
+        return {
+            source: {code: dict(codes[code]) for code in sorted(codes)}
+            for source, codes in sorted(self.entries.items())
+        }
+
+    def write(self, path: str, replace: bool = False, sources=None) -> None:
+        """
+        Writes the index to a JSON file, adding it to the index already in the file
+        unless replace is set. The entries of the given sources in the file are dropped
+        first, so a stage writing its own sources again does not count them twice.
+
+        Args:
+            path (str): Index path
+            replace (bool): Replace the existing index
+            sources (iterable): Sources replaced in the existing index
+        """
+
+        index = self
+        if not replace and os.path.exists(path):
+            index = load(path, self.sample_size)
+            for source in sources or []:
+                index.entries.pop(source, None)
+            index.update(self.entries)
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, 'w', encoding='utf-8') as output_file:
+            json.dump(index.to_dict(), output_file, indent=2)
+
+
+def load(path: str, sample_size: int = SAMPLE_SIZE) -> ErrorIndex:
+    """
+    Loads an index written by ErrorIndex.write.
+
+    Args:
+        path (str): Index path
+        sample_size (int): Number of sample ids kept for each code
+
+    Returns:
+        ErrorIndex: Error Index
+    """
+
+    index = ErrorIndex(sample_size)
+    with open(path, 'r', encoding='utf-8') as input_file:
+        try:
+            index.update(json.load(input_file))
+        except json.JSONDecodeError:
+            pass
+    return index
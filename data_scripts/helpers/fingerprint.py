@@ -0,0 +1,205 @@
+"""
+Fingerprints of the inputs and outputs of pipeline stages. A stage's input fingerprint
+combines its code and schema version with the output fingerprints of the stages it depends
+on, and its output fingerprint is a hash of the records or files it produced. The manifest
+keeps both for every stage between runs, so a stage whose inputs have not changed since the
+last run can reuse its previous output instead of running again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_VERSION = 1
+
+CHUNK_SIZE = 1 << 20
+
+FIELD_SEPARATOR = '\x1f'
+RECORD_SEPARATOR = '\x1e'
+
+
+def new_hash():
+    """
+    Returns the hash object every fingerprint is built with.
+
+    Returns:
+        hash: BLAKE2b hash
+    """
+
+    return hashlib.blake2b(digest_size=16)
+
+
+def combine(*parts) -> str:
+    """
+    Returns the fingerprint of a sequence of values.
+
+    Args:
+        parts (any): Values, converted to text
+
+    Returns:
+        str: Hex digest
+    """
+
+    digest = new_hash()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(RECORD_SEPARATOR.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def hash_value(value) -> str:
+    """
+    Returns the fingerprint of a JSON serializable value.
+
+    Args:
+        value (any): Value
+
+    Returns:
+        str: Hex digest
+    """
+
+    return combine(json.dumps(value, sort_keys=True, default=str))
+
+
+def hash_records(records, columns: list) -> str:
+    """
+    Returns the fingerprint of records from the text of their values, as they would be
+    written to a CSV file, so records handed over in memory and the same records read back
+    from a file have the same fingerprint.
+
+    Args:
+        records (iterable): Records
+        columns (list): Columns hashed, in order
+
+    Returns:
+        str: Hex digest
+    """
+
+    digest = new_hash()
+    for record in records:
+        values = (record.get(column) for column in columns)
+        row = FIELD_SEPARATOR.join('' if value is None else str(value) for value in values)
+        digest.update(row.encode('utf-8'))
+        digest.update(RECORD_SEPARATOR.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def hash_files(paths) -> str:
+    """
+    Returns the fingerprint of the content of files. Missing files are part of the
+    fingerprint, so creating or deleting one changes it.
+
+    Args:
+        paths (iterable): File paths
+
+    Returns:
+        str: Hex digest
+    """
+
+    digest = new_hash()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        if not os.path.exists(path):
+            digest.update(b'\0missing')
+            continue
+        with open(path, 'rb') as input_file:
+            for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        digest.update(RECORD_SEPARATOR.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_code_version(directory: str) -> str:
+    """
+    Returns the fingerprint of the Python files in a directory and its sub directories.
+
+    Args:
+        directory (str): Code directory
+
+    Returns:
+        str: Hex digest
+    """
+
+    paths = []
+    for root, folders, files in os.walk(directory):
+        folders[:] = sorted(folder for folder in folders if not folder.startswith(('.', '__')))
+        paths.extend(os.path.join(root, file) for file in sorted(files) if file.endswith('.py'))
+    return hash_files(paths)
+
+
+class Manifest(object):
+    """
+    The input and output fingerprints of every stage of the last run, stored in a JSON file.
+    """
+
+    path: str
+    stages: dict
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): Manifest file path
+        """
+
+        self.path = path
+        self.stages = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as input_file:
+                try:
+                    manifest = json.load(input_file)
+                except json.JSONDecodeError:
+                    manifest = {}
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.stages = manifest.get('stages', {})
+
+    def get_output(self, name: str, inputs: str) -> str | None:
+        """
+        Returns the output fingerprint of a stage when it last ran with the same inputs.
+
+        Args:
+            name (str): Stage name
+            inputs (str): Input fingerprint
+
+        Returns:
+            str | None: Output fingerprint, None when the inputs changed
+        """
+
+        entry = self.stages.get(name)
+        if entry is None or entry.get('inputs') != inputs:
+            return None
+        return entry.get('output')
+
+    def set(self, name: str, inputs: str, output: str) -> None:
+        """
+        Stores the fingerprints of a stage.
+
+        Args:
+            name (str): Stage name
+            inputs (str): Input fingerprint
+            output (str): Output fingerprint
+        """
+
+        self.stages[name] = {'inputs': inputs, 'output': output}
+
+    def remove(self, name: str) -> None:
+        """
+        Forgets a stage, so it runs again in the next run.
+
+        Args:
+            name (str): Stage name
+        """
+
+        self.stages.pop(name, None)
+
+    def save(self) -> None:
+        """
+        Writes the manifest file.
+        """
+
+        folder = os.path.dirname(self.path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(handle, 'w', encoding='utf-8') as output_file:
+            json.dump({'version': MANIFEST_VERSION, 'stages': self.stages}, output_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
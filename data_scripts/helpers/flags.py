@@ -0,0 +1,171 @@
+"""
+Bit-packed representation of the service flags carried on each record.
+"""
+
+from helpers import maputil
+
+SNAP = 1 << 0
+WIC = 1 << 1
+FMNP = 1 << 2
+FOOD_BUCKS = 1 << 3
+FRESH_PRODUCE = 1 << 4
+FREE_DISTRIBUTION = 1 << 5
+FOOD_RX = 1 << 6
+
+FLAG_BITS = {
+    'snap': SNAP,
+    'wic': WIC,
+    'fmnp': FMNP,
+    'food_bucks': FOOD_BUCKS,
+    'fresh_produce': FRESH_PRODUCE,
+    'free_distribution': FREE_DISTRIBUTION,
+    'food_rx': FOOD_RX
+}
+
+FLAG_FIELDS = tuple(FLAG_BITS.keys())
+
+ALL_FLAGS = SNAP | WIC | FMNP | FOOD_BUCKS | FRESH_PRODUCE | FREE_DISTRIBUTION | FOOD_RX
+
+# Flags cleared on any location that gives food away for free.
+PAYMENT_FLAGS = SNAP | WIC | FMNP | FOOD_BUCKS
+
+
+def is_set(value) -> bool:
+    """
+    Checks if a flag value is set. Values read from a file, such as 'True', are set the
+    same as True.
+
+    Args:
+        value (any): Flag value
+
+    Returns:
+        bool: True/False
+    """
+
+    return value is True or (value is not False and maputil.convert_boolean(value))
+
+
+def to_mask(record: dict) -> int:
+    """
+    Packs the flag fields of a record into a single integer mask. Values read from a
+    file, such as 'True', set the flag the same as True.
+
+    Args:
+        record (dict): Record containing the flag fields
+
+    Returns:
+        int: Flag mask
+    """
+
+    mask = 0
+    for field, bit in FLAG_BITS.items():
+        if is_set(record.get(field, False)):
+            mask |= bit
+    return mask
+
+
+def from_mask(mask: int, record: dict) -> dict:
+    """
+    Unpacks a flag mask back onto the boolean fields of a record.
+
+    Args:
+        mask (int): Flag mask
+        record (dict): Record to update
+
+    Returns:
+        dict: Updated record
+    """
+
+    for field, bit in FLAG_BITS.items():
+        record[field] = bool(mask & bit)
+    return record
+
+
+def priority_masks(priorities: dict, default: int = 100) -> dict:
+    """
+    Builds the masks used to resolve flags between records of different sources.
+    The result maps the pair of priority tables to the flags won by each side.
+
+    Args:
+        priorities (dict): Source name mapped to its field priorities
+        default (int): Priority used when a source does not define a field
+
+    Returns:
+        dict: (source, target) mapped to (source wins mask, target wins mask)
+    """
+
+    masks = {}
+    names = list(priorities.keys()) + [None]
+    for source in names:
+        for target in names:
+            source_wins = 0
+            target_wins = 0
+            for field, bit in FLAG_BITS.items():
+                source_priority = priorities.get(source, {}).get(field, default)
+                target_priority = priorities.get(target, {}).get(field, default)
+                if source_priority < target_priority:
+                    source_wins |= bit
+                elif source_priority > target_priority:
+                    target_wins |= bit
+            masks[(source, target)] = (source_wins, target_wins)
+    return masks
+
+
+def resolve(source_mask: int, target_mask: int, source_wins: int, target_wins: int) -> int:
+    """
+    Resolves the flags of two records in a single pass. Flags won by a side take
+    that side's value, the remaining flags are set if either record has them set.
+
+    Args:
+        source_mask (int): Flags of the source record
+        target_mask (int): Flags of the target record
+        source_wins (int): Flags where the source has the higher priority
+        target_wins (int): Flags where the target has the higher priority
+
+    Returns:
+        int: Resolved flag mask
+    """
+
+    shared = ALL_FLAGS & ~(source_wins | target_wins)
+    return (source_mask & source_wins) | (target_mask & target_wins) | ((source_mask | target_mask) & shared)
+
+
+def priority_table(priorities: dict, default: int = 100) -> dict:
+    """
+    Builds the priority of every flag for each source, in the order of FLAG_FIELDS.
+
+    Args:
+        priorities (dict): Source name mapped to its field priorities
+        default (int): Priority used when a source does not define a field
+
+    Returns:
+        dict: Source name mapped to a tuple of flag priorities
+    """
+
+    return {
+        source: tuple(fields.get(field, default) for field in FLAG_FIELDS)
+        for source, fields in priorities.items()
+    }
+
+
+def resolve_all(members: list) -> int:
+    """
+    Resolves the flags of any number of records in a single pass. Each flag takes the value
+    of the records with the highest priority for it, set if any of those records has it set.
+    For two records this gives the same result as resolve.
+
+    Args:
+        members (list): Flag mask and flag priorities of each record
+
+    Returns:
+        int: Resolved flag mask
+    """
+
+    result = 0
+    for index, bit in enumerate(FLAG_BITS.values()):
+        best = min(priorities[index] for _, priorities in members)
+        for mask, priorities in members:
+            if priorities[index] == best and mask & bit:
+                result |= bit
+                break
+    return result
@@ -0,0 +1,139 @@
+"""
+Deterministic record ids. A record id is derived from the identity of the record in its
+source, the source's own id when it has one or otherwise the normalized name and address,
+so the same input always produces the same ids no matter the order it was read in.
+Merged records get an id derived from the records they were merged from.
+"""
+
+import hashlib
+import re
+
+# Ids are kept below 2^53 so they are exact as JavaScript numbers on the map.
+ID_BITS = 53
+
+MISSING_VALUES = ('', 'none', 'null', 'nan')
+
+NORMALIZE_PATTERN = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(value) -> str:
+    """
+    Returns a value lower case with every run of punctuation and spaces replaced by one space.
+
+    Args:
+        value (any): Value
+
+    Returns:
+        str: Normalized value
+    """
+
+    return NORMALIZE_PATTERN.sub(' ', str(value if value is not None else '').lower()).strip()
+
+
+def get_source_key(record: dict) -> str:
+    """
+    Returns the identity of a record within its source: the source's id when the record
+    has one, otherwise its normalized type, name and address.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        str: Source key
+    """
+
+    source = str(record.get('source_file') or record.get('file_name') or '')
+    original_id = str(record.get('original_id') or '').strip()
+    if original_id.lower() not in MISSING_VALUES:
+        return f"{source}|id|{original_id}"
+    values = [normalize(record.get(field)) for field in ('type', 'name', 'address', 'city', 'zip_code')]
+    return f"{source}|content|{'|'.join(values)}"
+
+
+def hash_id(key: str) -> int:
+    """
+    Returns the positive integer id for a key.
+
+    Args:
+        key (str): Key
+
+    Returns:
+        int: Id from 1 to 2^53 - 1
+    """
+
+    digest = hashlib.sha256(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> (64 - ID_BITS) or 1
+
+
+class IdAssigner(object):
+    """
+    Assigns the ids of the records of a run. Records with the same source key, such as
+    two rows of a spreadsheet with the same name and address, are numbered in the order
+    they are added so each one still gets its own id.
+    """
+
+    keys: dict
+    ids: set
+
+    def __init__(self) -> None:
+        self.keys = {}
+        self.ids = set()
+
+    def next_id(self, record: dict, namespace: str = '') -> int:
+        """
+        Returns the id for the next record.
+
+        Args:
+            record (dict): Record
+            namespace (str): Prefix of the key, such as the raw file the record was read from,
+                for sources sharing a source_file
+
+        Returns:
+            int: Record id
+        """
+
+        key = get_source_key(record)
+        if namespace:
+            key = f"{namespace}|{key}"
+        record_id = hash_id(key)
+        # Only the integer ids are kept, so the memory used does not depend on the length of the keys.
+        occurrence = self.keys.get(record_id, 0)
+        self.keys[record_id] = occurrence + 1
+
+        if occurrence:
+            record_id = hash_id(f"{key}|{occurrence}")
+        while record_id in self.ids:
+            occurrence += 1
+            record_id = hash_id(f"{key}|{occurrence}")
+        self.ids.add(record_id)
+        return record_id
+
+
+def get_cluster_key(records: list) -> str:
+    """
+    Returns the identity of a group of merged records, independent of their order.
+
+    Args:
+        records (list): Merged records
+
+    Returns:
+        str: Cluster key
+    """
+
+    members = sorted(f"{record.get('source_file', '')}|{record.get('id', '')}" for record in records)
+    return hashlib.sha256('\n'.join(members).encode('utf-8')).hexdigest()
+
+
+def cluster_id(records: list) -> tuple:
+    """
+    Returns the id and original id of the record merged from a group of records.
+
+    Args:
+        records (list): Merged records
+
+    Returns:
+        tuple: Integer id and the cluster key used as the original id
+    """
+
+    key = get_cluster_key(records)
+    return hash_id(f"cluster|{key}"), key[:32]
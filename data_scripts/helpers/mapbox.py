@@ -2,12 +2,13 @@
 Helper for retrieving Long/Lat from Map Box API.
 """
 
-import requests
+from helpers import metrics, web
 
 
 SERVICE_ADDRESS = 'https://api.mapbox.com/geocoding/v5/mapbox.places/$search.json'
 
 
+@metrics.timed(metrics.GEOCODE)
 def get_coordinates(key: str, address: str) -> dict | None:
     """
     Returns an object with the longitude and latitude
@@ -24,7 +25,7 @@ def get_coordinates(key: str, address: str) -> dict | None:
         url = SERVICE_ADDRESS.replace('$search', address)
         params = {'access_token': key, 'limit': 1, 'types': 'address'}
 
-        response = requests.get(url, params=params)
+        response = web.get_session().get(url, params=params)
 
         if response.status_code == 200:
             body = response.json()
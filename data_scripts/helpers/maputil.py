@@ -3,8 +3,17 @@ Utilizes a JSON Schema to create a blank dictionary with default values based on
 """
 
 import calendar
+from array import array
 from datetime import date, datetime, timedelta
 
+from helpers import schedule
+
+MAX_CACHED_SCHEMAS = 32
+
+# Record templates and coercers keyed by the id of the schema object they were generated from.
+_templates = {}
+_coercers = {}
+
 
 def new_record(schema: dict) -> dict:
     """
@@ -17,16 +26,77 @@ def new_record(schema: dict) -> dict:
         dict: Empty Record.
     """
 
-    new_record = {}
+    return dict(get_template(schema))
+
+
+def get_record_defaults(schema: dict) -> tuple:
+    """
+    Returns the property names of a schema and the default value of each.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        tuple: Property names and default values
+    """
 
+    fields = []
+    defaults = []
     for key in schema['properties'].keys():
 
         prop_type = schema['properties'][key]['type']
+        fields.append(key)
         if type(prop_type) == list:
-            new_record[key] = get_default_value(prop_type[0])
+            defaults.append(get_default_value(prop_type[0]))
         else:
-            new_record[key] = get_default_value(prop_type)
-    return new_record
+            defaults.append(get_default_value(prop_type))
+    return tuple(fields), tuple(defaults)
+
+
+def get_template(schema: dict) -> dict:
+    """
+    Returns the record with the default value of every property, built once for each
+    schema object. Compiled schemas return their own template. The template is shared,
+    so it should be copied before it is changed.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        dict: Record template
+    """
+
+    template = getattr(schema, 'template', None)
+    if template is not None:
+        return template
+
+    cached = _templates.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    template = dict(zip(*get_record_defaults(schema)))
+    if len(_templates) >= MAX_CACHED_SCHEMAS:
+        _templates.clear()
+    _templates[id(schema)] = (schema, template)
+    return template
+
+
+def to_record(record: dict, schema: dict) -> dict:
+    """
+    Converts a dictionary read from a file to a record of the schema, adding the
+    default value of every missing property.
+
+    Args:
+        record (dict): Dictionary
+        schema (dict): JSON Schema
+
+    Returns:
+        dict: Record
+    """
+
+    result = dict(get_template(schema))
+    result.update(record)
+    return result
 
 
 def get_default_value(type: str) -> str | int | bool:
@@ -161,16 +231,12 @@ def set_date_range(record: dict, schedules: list) -> dict:
     """
 
     if schedules:
-        parts = str(schedules[0]).split(' ')
-        # Filter out all the Non-month name values.
-        months = [part for part in parts if is_month_name(
-            part) or is_month_abbr(part)]
-
-        if months:
-            record['date_from'] = get_month_start(months[0])
-            if len(months) > 1:
+        dated = [entry for entry in schedule.parse_schedule(str(schedules[0])) if entry.start]
+        if dated:
+            record['date_from'] = get_month_start(dated[0].start[0])
+            if dated[0].end:
                 record['date_to'] = get_month_end(
-                    months[1], date.today().year)
+                    calendar.month_name[dated[0].end[0]], date.today().year)
     return record
 
 
@@ -186,8 +252,9 @@ def apply_schema(records: list, schema: dict) -> list:
         list: List of typed records
     """
 
+    coercer = get_coercer(schema)
     for record in records:
-        apply_schema_to_record(record, schema)
+        coerce_record(record, coercer)
 
 
 def apply_schema_to_record(record: dict, schema: dict) -> None:
@@ -199,16 +266,180 @@ def apply_schema_to_record(record: dict, schema: dict) -> None:
         schema (dict): Schema to apply to the Dictionary
     """
 
-    properties = schema.get('properties', {})
+    coerce_record(record, get_coercer(schema))
+
+
+def coerce_record(record: dict, coercer: tuple) -> None:
+    """
+    Converts the values of a record with a coercer built by get_coercer.
+
+    Args:
+        record (dict): Dictionary
+        coercer (tuple): Pairs of field name and converter
+    """
 
-    for key in properties.keys():
+    for key, converter in coercer:
         if key in record:
-            field_info = properties[key]
-            type_info = field_info.get('type', 'string')
-            if type(type_info) == list:
-                record[key] = convert_value(record[key], type_info[0])
-            else:
-                record[key] = convert_value(record[key], type_info)
+            record[key] = converter(record[key])
+
+
+def coerce_columns(columns: dict, schema: dict, arrays: bool = False) -> dict:
+    """
+    Converts whole columns of values read from a file to the schema types.
+    Boolean columns convert each distinct value once and, when arrays is set,
+    number columns are stored as arrays of floats.
+
+    Args:
+        columns (dict): Column name mapped to the list of values
+        schema (dict): Schema
+        arrays (bool): Store number columns as float arrays
+
+    Returns:
+        dict: Converted columns
+    """
+
+    for key, converter in get_coercer(schema):
+        if key not in columns:
+            continue
+        values = columns[key]
+        if converter is float and arrays:
+            columns[key] = array('d', map(float, values))
+        elif converter is convert_boolean:
+            converted = {value: converter(value) for value in set(values)}
+            columns[key] = list(map(converted.__getitem__, values))
+        else:
+            columns[key] = list(map(converter, values))
+    return columns
+
+
+def columns_to_records(columns: dict, schema: dict) -> list:
+    """
+    Builds records from columns of values, adding the default value of every
+    property without a column.
+
+    Args:
+        columns (dict): Column name mapped to the list of values
+        schema (dict): Schema
+
+    Returns:
+        list: Records
+    """
+
+    template = get_template(schema)
+    keys = list(columns.keys())
+    if keys == list(template):
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+    return [{**template, **dict(zip(keys, values))} for values in zip(*columns.values())]
+
+
+def get_coercer(schema: dict) -> tuple:
+    """
+    Returns the coercer of a schema, a tuple of field name and converter pairs
+    built once for each schema object. Compiled schemas return their own coercer.
+
+    Args:
+        schema (dict): Schema
+
+    Returns:
+        tuple: Pairs of field name and converter
+    """
+
+    coercer = getattr(schema, 'coercer', None)
+    if coercer is not None:
+        return coercer
+
+    cached = _coercers.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    coercer = build_coercer(get_field_types(schema))
+    if len(_coercers) >= MAX_CACHED_SCHEMAS:
+        _coercers.clear()
+    _coercers[id(schema)] = (schema, coercer)
+    return coercer
+
+
+def build_coercer(types: dict) -> tuple:
+    """
+    Builds a coercer from the type of each field.
+
+    Args:
+        types (dict): Field name mapped to the type
+
+    Returns:
+        tuple: Pairs of field name and converter
+    """
+
+    return tuple((key, get_converter(prop_type)) for key, prop_type in types.items())
+
+
+def get_field_types(schema: dict) -> dict:
+    """
+    Returns the type used to convert each property of the schema.
+    Properties accepting several types use the first one.
+
+    Args:
+        schema (dict): Schema
+
+    Returns:
+        dict: Property name mapped to the type
+    """
+
+    types = {}
+    for key, field_info in schema.get('properties', {}).items():
+        type_info = field_info.get('type', 'string')
+        types[key] = type_info[0] if type(type_info) == list else type_info
+    return types
+
+
+def get_converter(type: str):
+    """
+    Returns the function converting a value to the given type.
+
+    Args:
+        type (str): Type to convert to
+
+    Returns:
+        callable: Converter
+    """
+
+    return CONVERTERS.get(type, keep_value)
+
+
+def keep_value(value: any) -> any:
+    """
+    Returns the value unchanged for types that are not converted.
+
+    Args:
+        value (any): Value
+
+    Returns:
+        any: The value
+    """
+
+    return value
+
+
+def convert_boolean(value: any) -> bool:
+    """
+    Converts a value read from a file to a boolean.
+
+    Args:
+        value (any): Value to convert
+
+    Returns:
+        bool: True when the value is true, 1 or yes
+    """
+
+    return str(value).lower() in ('true', '1', 'yes')
+
+
+CONVERTERS = {
+    'string': str,
+    'number': float,
+    'boolean': convert_boolean,
+    'integer': int
+}
 
 
 def convert_value(value: any, type: str) -> str | float | bool | int:
@@ -223,13 +454,4 @@ def convert_value(value: any, type: str) -> str | float | bool | int:
         str | float | bool: return value
     """
 
-    match type:
-        case 'string':
-            return str(value)
-        case 'number':
-            return float(value)
-        case 'boolean':
-            return str(value).lower() in ('true', '1', 'yes')
-        case 'integer':
-            return int(value)
-    return value
+    return get_converter(type)(value)
@@ -2,9 +2,18 @@
 Module Logic for Merging records from a collection based on the name, type and address.
 """
 
-from uuid import uuid4
+import concurrent.futures
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
 import logging
-from helpers import classification, maputil, validation
+import multiprocessing
+import os
+import re
+import time
+from helpers import classification, cluster, flags, identity, maputil, minhash, schemas, spatial, validation
 from helpers.rules import RulesEngine
 
 logging.basicConfig(level=logging.INFO)
@@ -57,87 +66,722 @@ SOURCE_HIERARCHY = {
         
 }
 
+# Flags won by each side of a merge for every pair of sources in the hierarchy.
+FLAG_PRIORITY_MASKS = flags.priority_masks(SOURCE_HIERARCHY)
 
-def deduplicate(records: list, schema: dict) -> dict:
+# Priorities of each source used to merge a cluster, lower wins. Sources missing from the hierarchy use the default.
+DEFAULT_PRIORITY = 100
+FLAG_PRIORITIES = flags.priority_table(SOURCE_HIERARCHY, DEFAULT_PRIORITY)
+DEFAULT_FLAG_PRIORITIES = (DEFAULT_PRIORITY,) * len(flags.FLAG_FIELDS)
+COORDINATE_PRIORITIES = {source: fields.get('coordinates', DEFAULT_PRIORITY) for source, fields in SOURCE_HIERARCHY.items()}
+
+# Records at different addresses within this many meters of each other are compared, 0 turns it off.
+DEDUP_DISTANCE = float(os.environ.get('DEDUP_DISTANCE', 50))
+
+# Records with names at least this similar at the same street number and zip code are compared, 0 turns it off.
+DEDUP_NAME_SIMILARITY = float(os.environ.get('DEDUP_NAME_SIMILARITY', 0.6))
+
+# Number of processes clustering the blocks and merging the clusters, 1 runs them in the current process.
+DEDUP_WORKERS = int(os.environ.get('DEDUP_WORKERS', 1))
+
+# Chunks per worker, so the pool can balance blocks and clusters that take longer than expected.
+CHUNKS_PER_WORKER = 4
+
+# Version of the merge logic stored with the cluster state, change it when merged records would change.
+STATE_VERSION = 3
+
+NAME_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STREET_NUMBER_PATTERN = re.compile(r'\s*(\d+)\b')
+
+
+def deduplicate(records: list, schema: dict, typed: bool = False, distance: float = None,
+                name_similarity: float = None, state: dict = None, workers: int = None) -> dict:
     """
     De-deuplicates a list of dictionaries based on the Address, type and name. 
-    Returns a dictionary containing the deduplicated list and the duplicate records removed.
+    Records at the same address, within the distance of each other, or with similar names
+    at the same street number and zip code, with the same type and name RegEx are clustered
+    and each cluster is merged into a single record.
+    The records are first split into independent blocks, see get_blocks. A block whose
+    members are unchanged since the previous run reuses its clusters from the state, so the
+    pairing and clustering only run over the records of the blocks that changed, and with more
+    than one worker the changed blocks are clustered in a pool of processes.
+    Returns a dictionary containing the deduplicated list, the duplicate records removed,
+    the statistics of the name blocking and of the blocks, and the state for the next run.
 
     Args:
         records (list): Initial listing of records to de-duplicate
         schema (dict): JSON Schema
+        typed (bool): The records are already converted to the schema types
+        distance (float): Distance in meters for records at different addresses, defaults to DEDUP_DISTANCE
+        name_similarity (float): Name similarity for records at different addresses, defaults to DEDUP_NAME_SIMILARITY
+        state (dict): Clusters of each block and merged record of each cluster from the previous run
+        workers (int): Number of processes clustering the blocks and merging the clusters, defaults to DEDUP_WORKERS
 
     Returns:
         dict: Dictionary containing the de-duplicated list and duplicate record removed.
     """
-    address_map = {}
-    recs = []
-    dupes = []
-
-    for record in records:
-        maputil.apply_schema_to_record(record, schema)
-        address_value = str(record['address']).lower().replace(',','').replace('.', '')
-        
-        if address_value not in address_map:
-            address_map[address_value] = []
-        address_map[address_value].append(record)
-
-    for address in address_map.keys():
-        address_set = address_map[address]
-        if len(address_set) > 1:
-            # Dedupe the set
-            result = process_duplicates(address_set, schema)
-            recs.extend(result['records'])
-            dupes.extend(result['duplicates'])
+    schema = schemas.compile_schema(schema)
+    distance = DEDUP_DISTANCE if distance is None else distance
+    name_similarity = DEDUP_NAME_SIMILARITY if name_similarity is None else name_similarity
+    workers = DEDUP_WORKERS if workers is None else workers
+
+    coercer = maputil.get_coercer(schema)
+    if not typed:
+        for record in records:
+            maputil.coerce_record(record, coercer)
+
+    state = state or {}
+    previous = state.get('blocks', {})
+    keys = [get_match_key(record) for record in records]
+    hashes = [get_record_hash(record) for record in records]
+    blocks = {}
+    clusters = []
+    changed = []
+    for block in get_blocks(records, keys, distance, name_similarity):
+        block_key = get_block_key([hashes[item] for item in block], distance, name_similarity)
+        restored = restore_clusters(block, hashes, previous[block_key]) if block_key in previous else None
+        if restored is None:
+            changed.append((block_key, block))
         else:
-            # Add the set collection to the records list
-            recs.append(min(address_set))
+            blocks[block_key] = previous[block_key]
+            clusters.extend(restored)
 
-    return {
-        'records': recs,
-        'duplicates': dupes
-    }
+    block_keys = {item: block_key for block_key, block in changed for item in block}
+    for block_key, _ in changed:
+        blocks[block_key] = []
+
+    with get_executor(workers) if workers > 1 else contextlib.nullcontext() as executor:
+        built, blocking = cluster_blocks(records, keys, [block for _, block in changed], distance, name_similarity,
+                                         workers, executor)
+        for members in built:
+            if len(members) > 1:
+                blocks[block_keys[members[0]]].append(sorted(hashes[member] for member in members))
+        clusters.extend(built)
+
+        # Clusters are merged in the order of their first record, as when every record is clustered at once.
+        clusters.sort(key=lambda members: members[0])
+        result = process_clusters(records, clusters, schema, state.get('clusters'), workers, executor)
+
+    result['state'] = {'blocks': blocks, 'clusters': result['state']}
+    result['blocking'] = blocking
+    result['blocks'] = {'blocks': len(blocks), 'rebuilt': len(changed), 'records': len(block_keys)}
+    return result
+
+
+def get_executor(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Returns a pool of processes started with forkserver, or spawn where it is not available.
+    The pipeline runs its stages in threads, and a forked process would copy the locks held
+    by the other threads without the threads that release them.
+
+    Args:
+        workers (int): Number of processes
+
+    Returns:
+        ProcessPoolExecutor: Process pool
+    """
+
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+
+def cluster_blocks(records: list, keys: list, blocks: list, distance: float, name_similarity: float,
+                   workers: int = 1, executor: concurrent.futures.Executor = None) -> tuple:
+    """
+    Clusters the records of blocks. Each block is clustered on its own, so with a pool the
+    blocks are split into chunks of about the same number of records, largest first, and each
+    chunk is clustered in a worker, giving the same clusters for any number of workers.
+
+    Args:
+        records (list): Records
+        keys (list): Match key of each record
+        blocks (list): Record numbers of each block
+        distance (float): Distance in meters for records at different addresses
+        name_similarity (float): Name similarity for records at different addresses
+        workers (int): Number of processes in the pool
+        executor (Executor): Process pool, None clusters the blocks in the current process
+
+    Returns:
+        tuple: Record numbers of each cluster and the statistics of the name blocking
+    """
+
+    labels = {item: index for index, block in enumerate(blocks) for item in block}
+    if executor is None or len(blocks) < 2:
+        items = sorted(labels)
+        built, blocking = cluster_records([records[item] for item in items], [keys[item] for item in items],
+                                          distance, name_similarity, [labels[item] for item in items])
+        return [[items[member] for member in members] for members in built], blocking
+
+    futures = {}
+    for chunk in partition([len(block) for block in blocks], workers * CHUNKS_PER_WORKER):
+        items = sorted(item for index in chunk for item in blocks[index])
+        future = executor.submit(cluster_records, [records[item] for item in items], [keys[item] for item in items],
+                                 distance, name_similarity, [labels[item] for item in items])
+        futures[future] = items
+
+    clusters = []
+    statistics = []
+    for future in concurrent.futures.as_completed(futures):
+        items = futures[future]
+        built, blocking = future.result()
+        clusters.extend([items[member] for member in members] for members in built)
+        statistics.append(blocking)
+    return clusters, combine_blocking(statistics)
+
+
+def combine_blocking(statistics: list) -> dict:
+    """
+    Adds up the name blocking statistics of the chunks clustered separately.
+
+    Args:
+        statistics (list): Statistics of each chunk, see get_name_pairs
+
+    Returns:
+        dict: Combined statistics, empty when the name blocking is off
+    """
+
+    statistics = [blocking for blocking in statistics if blocking]
+    if len(statistics) < 2:
+        return statistics[0] if statistics else {}
+
+    totals = {key: sum(blocking[key] for blocking in statistics) for key in ('records', 'candidates', 'pairs')}
+    seconds = sum(blocking['seconds'] for blocking in statistics)
+    totals['seconds'] = round(seconds, 4)
+    totals['records_per_second'] = round(totals['records'] / seconds) if seconds else 0
+    for key in ('sampled', 'similar_pairs', 'candidate_pairs'):
+        totals[key] = sum(blocking[key] for blocking in statistics)
+    totals['recall'] = totals['candidate_pairs'] / totals['similar_pairs'] if totals['similar_pairs'] else 1.0
+    return totals
+
+
+def cluster_records(records: list, keys: list, distance: float, name_similarity: float, labels: list = None) -> tuple:
+    """
+    Clusters records at the same address, within the distance of each other or with similar names.
+    With block labels, only records of the same block are joined, so the clusters of a block
+    only depend on its own records, whichever other blocks are clustered with it.
+
+    Args:
+        records (list): Records
+        keys (list): Match key of each record
+        distance (float): Distance in meters for records at different addresses
+        name_similarity (float): Name similarity for records at different addresses
+        labels (list): Block of each record, None joins records of any block
+
+    Returns:
+        tuple: Record numbers of each cluster and the statistics of the name blocking
+    """
+
+    address_keys = [(get_address_key(record),) + key for record, key in zip(records, keys)]
+    name_pairs, blocking = get_name_pairs(records, keys, name_similarity)
+    pairs = itertools.chain(cluster.key_pairs(address_keys), get_nearby_pairs(records, keys, distance), name_pairs)
+    if labels is not None:
+        pairs = ((first, second) for first, second in pairs if labels[first] == labels[second])
+    return cluster.build_clusters(len(records), pairs), blocking
+
+
+def get_blocks(records: list, keys: list, distance: float, name_similarity: float) -> list:
+    """
+    Splits records into blocks no pair of duplicates crosses. Records share a block when they
+    have the same match key and the same address, the same zip code and street number, or
+    coordinates in the same or neighbouring cells of a grid as wide as the distance, which
+    covers every pair cluster_records can find. Finding the blocks only compares keys, so it
+    is much cheaper than the pairing itself.
+
+    Args:
+        records (list): Records
+        keys (list): Match key of each record
+        distance (float): Distance in meters for records at different addresses
+        name_similarity (float): Name similarity for records at different addresses
+
+    Returns:
+        list: Record numbers of each block, ordered by their first record
+    """
+
+    address_keys = [(get_address_key(record),) + key for record, key in zip(records, keys)]
+    pairs = [cluster.key_pairs(address_keys)]
+    if name_similarity > 0:
+        street_keys = [(get_zip_key(record), get_street_number(record)) + key for record, key in zip(records, keys)]
+        pairs.append(cluster.key_pairs([key if None not in key[:2] else None for key in street_keys]))
+    if distance > 0:
+        pairs.append(get_cell_pairs(records, keys, distance))
+    return cluster.build_clusters(len(records), itertools.chain(*pairs))
+
+
+def get_cell_pairs(records: list, keys: list, distance: float):
+    """
+    Generates the pairs joining records with the same match key in the same or neighbouring
+    cells of a grid as wide as the distance.
+
+    Args:
+        records (list): Records
+        keys (list): Match key of each record
+        distance (float): Distance in meters
+
+    Returns:
+        generator: Record number pairs
+    """
+
+    grid = spatial.GridIndex(get_points(records), distance)
+    first = {}
+    for cell, items in grid.cells.items():
+        for item in items:
+            cell_key = (cell, keys[item])
+            if cell_key in first:
+                yield (first[cell_key], item)
+            else:
+                first[cell_key] = item
+    for ((column, row), key), item in first.items():
+        for offset_column, offset_row in spatial.NEIGHBOUR_CELLS:
+            other = first.get(((column + offset_column, row + offset_row), key))
+            if other is not None and other != item:
+                yield (item, other)
+
+
+def get_block_key(hashes: list, distance: float, name_similarity: float) -> str:
+    """
+    Returns the key of a block in the state, the hash of its members' hashes and the settings
+    it was clustered with, so a block is only reused when nothing that clusters it changed.
+
+    Args:
+        hashes (list): Record hash of each member
+        distance (float): Distance in meters for records at different addresses
+        name_similarity (float): Name similarity for records at different addresses
+
+    Returns:
+        str: Block key
+    """
+
+    values = [f"{distance}|{name_similarity}"] + sorted(hashes)
+    return hashlib.sha1(';'.join(values).encode('utf-8')).hexdigest()
+
+
+def restore_clusters(block: list, hashes: list, stored: list) -> list:
+    """
+    Rebuilds the clusters of an unchanged block from the record hashes kept in the state.
+
+    Args:
+        block (list): Record numbers of the block
+        hashes (list): Record hash of every record
+        stored (list): Member hashes of each cluster of the block with more than one record
+
+    Returns:
+        list | None: Record numbers of each cluster of the block, including the single record
+        clusters, None when the stored clusters have members outside of the block
+    """
+
+    positions = {}
+    for item in block:
+        positions.setdefault(hashes[item], []).append(item)
+    try:
+        clusters = [sorted(positions[member].pop() for member in members) for members in stored]
+    except (KeyError, IndexError):
+        return None
+    clustered = {item for members in clusters for item in members}
+    return clusters + [[item] for item in block if item not in clustered]
 
 
 def process_duplicates(addresses: list, schema: dict) -> dict:
     """
     Processes a given set and returns a dictionary of items which containing the 
-    duplicates and de-duped records
+    duplicates and de-duped records. Records with the same type and name are joined into
+    clusters and each cluster is merged once, so the result does not depend on the order
+    of the set.
 
     Args:
         addresses (list): address set
+        schema (dict): JSON Schema
 
     Returns:
         dict: Dictionary of results
     """
 
-    records = []
+    keys = [get_match_key(record) for record in addresses]
+    return process_clusters(addresses, cluster.build_clusters(len(addresses), cluster.key_pairs(keys)), schema)
+
+
+def process_clusters(records: list, clusters: list, schema: dict, state: dict = None, workers: int = None,
+                     executor: concurrent.futures.Executor = None) -> dict:
+    """
+    Merges every cluster with more than one record. A cluster whose members are unchanged
+    since the previous run reuses the merged record from the state instead of merging again.
+    The returned state holds the merged record of every cluster, keyed by get_cluster_state_key.
+
+    Args:
+        records (list): Records
+        clusters (list): Record numbers of each cluster
+        schema (dict): JSON Schema
+        state (dict): Merged record of each cluster from the previous run
+        workers (int): Number of processes merging the clusters, defaults to DEDUP_WORKERS
+        executor (Executor): Process pool to merge in, see get_executor
+
+    Returns:
+        dict: Dictionary of results
+    """
+
+    state = state or {}
+    recs = []
     dupes = []
-    while len(addresses) > 0:
-        if len(addresses) >= 2:
-            item1 = addresses.pop()
-            item2 = addresses.pop()
-
-            if item1['type'] == item2['type'] and classification.get_reg_ex(item1['name'], item1['type']) == classification.get_reg_ex(item2['name'], item2['type']):
-                result = merge_records(item1, item2, schema)
-                records.append(result)
-                dupes.append(item1)
-                dupes.append(item2)
-            
-                if len(addresses) % 2 > 0:
-                    addresses.append(result)
-            
+    cluster_keys = []
+    pending = []
+    reused = 0
+    for members in clusters:
+        if len(members) > 1:
+            group = sort_members([records[index] for index in members])
+            cluster_key = get_cluster_state_key(group)
+            cluster_keys.append((len(recs), cluster_key))
+            if cluster_key in state:
+                recs.append(maputil.to_record(state[cluster_key], schema))
+                reused += 1
             else:
-                records.append(item1)
-                records.append(item2)
+                pending.append((len(recs), group))
+                recs.append(None)
+            dupes.extend(group)
         else:
-            records.append(addresses.pop())
-        
+            recs.append(records[members[0]])
+
+    merged = merge_groups([group for _, group in pending], schema, workers, executor)
+    for (position, _), record in zip(pending, merged):
+        recs[position] = record
+
     return {
-        'records': records,
-        'duplicates': dupes
+        'records': recs,
+        'duplicates': dupes,
+        'state': {cluster_key: dict(recs[position]) for position, cluster_key in cluster_keys},
+        'reused': reused
     }
 
+
+def merge_groups(groups: list, schema: dict, workers: int = None, executor: concurrent.futures.Executor = None) -> list:
+    """
+    Merges the sorted members of each cluster, in a pool of processes when more than one
+    worker is requested. The clusters are independent, so the results are the same as
+    merging them in order.
+
+    Args:
+        groups (list): Sorted members of each cluster
+        schema (dict): JSON Schema
+        workers (int): Number of processes, defaults to DEDUP_WORKERS
+        executor (Executor): Process pool, a new one from get_executor when not given
+
+    Returns:
+        list: Merged record of each cluster in the order of the groups
+    """
+
+    workers = DEDUP_WORKERS if workers is None else workers
+    if workers <= 1 or len(groups) < 2:
+        return [merge_cluster(group, schema) for group in groups]
+    if executor is None:
+        with get_executor(workers) as executor:
+            return merge_groups(groups, schema, workers, executor)
+
+    chunks = partition([len(group) for group in groups], workers * CHUNKS_PER_WORKER)
+    merged = [None] * len(groups)
+    # The compiled schema holds generated classes, so the workers compile the plain schema again.
+    plain_schema = dict(schema)
+    futures = {executor.submit(merge_chunk, [groups[index] for index in chunk], plain_schema): chunk for chunk in chunks}
+    for future in concurrent.futures.as_completed(futures):
+        for index, record in zip(futures[future], future.result()):
+            merged[index] = record
+    return merged
+
+
+def merge_chunk(groups: list, schema: dict) -> list:
+    """
+    Merges a chunk of clusters in a worker process.
+
+    Args:
+        groups (list): Sorted members of each cluster
+        schema (dict): JSON Schema
+
+    Returns:
+        list: Merged record of each cluster
+    """
+
+    schema = schemas.compile_schema(schema)
+    return [merge_cluster(group, schema) for group in groups]
+
+
+def partition(sizes: list, count: int) -> list:
+    """
+    Splits items into chunks of about the same total size, assigning the largest item
+    first to the chunk with the smallest total, so a few large clusters do not end up
+    in the same chunk and keep one worker busy after the others finish.
+
+    Args:
+        sizes (list): Size of each item
+        count (int): Number of chunks
+
+    Returns:
+        list: Item numbers of each non-empty chunk, in ascending order
+    """
+
+    chunks = [(0, index, []) for index in range(max(1, min(count, len(sizes))))]
+    heapq.heapify(chunks)
+    for item in sorted(range(len(sizes)), key=lambda item: (-sizes[item], item)):
+        total, index, items = heapq.heappop(chunks)
+        items.append(item)
+        heapq.heappush(chunks, (total + sizes[item], index, items))
+    return [sorted(items) for _, _, items in sorted(chunks, key=lambda chunk: chunk[1]) if items]
+
+
+def get_record_hash(record: dict) -> str:
+    """
+    Returns the hash of every value of a record.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        str: Record hash
+    """
+
+    values = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha1(values.encode('utf-8')).hexdigest()
+
+
+def get_cluster_state_key(records: list) -> str:
+    """
+    Returns the key of a cluster in the state, the hash of its members' hashes, so a cluster
+    is only reused when it has exactly the same members with the same values.
+
+    Args:
+        records (list): Cluster members
+
+    Returns:
+        str: Cluster key
+    """
+
+    hashes = sorted(get_record_hash(record) for record in records)
+    return hashlib.sha1(';'.join(hashes).encode('utf-8')).hexdigest()
+
+
+def get_address_key(record: dict) -> str:
+    """
+    Returns the address used to block records, lower case without commas and periods.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        str: Address key
+    """
+
+    return str(record['address']).lower().replace(',','').replace('.', '')
+
+
+def get_name_tokens(name: str) -> frozenset:
+    """
+    Returns the lower case words and numbers of a name.
+
+    Args:
+        name (str): Location name
+
+    Returns:
+        frozenset: Name tokens
+    """
+
+    return frozenset(NAME_TOKEN_PATTERN.findall(str(name).lower()))
+
+
+def is_similar_name(first: str, second: str) -> bool:
+    """
+    Checks if every word of one name is in the other, e.g. Giant Eagle #63 and Giant Eagle Greenfield 63.
+
+    Args:
+        first (str): Location name
+        second (str): Location name
+
+    Returns:
+        bool: True/False
+    """
+
+    first = get_name_tokens(first)
+    second = get_name_tokens(second)
+    return bool(first and second) and (first <= second or second <= first)
+
+
+def get_nearby_pairs(records: list, keys: list, distance: float):
+    """
+    Generates the pairs of records within the distance of each other that have the same type and name.
+    Besides the RegEx from the classification module, the words of one name must all be in the other,
+    since the RegEx alone matches different stores near each other, e.g. two dollar stores.
+
+    Args:
+        records (list): Records
+        keys (list): Match key of each record
+        distance (float): Distance in meters
+
+    Returns:
+        generator: Record number pairs
+    """
+
+    points = get_points(records)
+    for first, second in spatial.nearby_pairs(points, distance):
+        if keys[first] == keys[second] and is_similar_name(records[first]['name'], records[second]['name']):
+            yield (first, second)
+
+
+def get_points(records: list) -> list:
+    """
+    Returns the coordinates of records.
+
+    Args:
+        records (list): Records
+
+    Returns:
+        list: Latitude and longitude of each record, None for records without coordinates
+    """
+
+    return [
+        (float(record['latitude']), float(record['longitude']))
+        if spatial.has_coordinates(record['latitude'], record['longitude']) else None
+        for record in records
+    ]
+
+
+def get_zip_key(record: dict) -> str | None:
+    """
+    Returns the five digit zip code of a record.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        str: Zip code or None when the record does not have one
+    """
+
+    zip_code = str(record.get('zip_code') or '').strip()[:5]
+    return zip_code if len(zip_code) == 5 and zip_code.isdigit() else None
+
+
+def get_street_number(record: dict) -> str | None:
+    """
+    Returns the street number at the start of the address of a record.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        str: Street number or None when the address does not start with one
+    """
+
+    match = STREET_NUMBER_PATTERN.match(str(record['address']))
+    return match.group(1) if match else None
+
+
+def is_name_match(first: dict, second: dict, shingles: tuple, similarity: float) -> bool:
+    """
+    Checks if two records with similar names in the same zip code are the same location.
+    The street numbers must be equal, as must the numbers in the names, which keeps
+    apart different stores of a chain, e.g. Dollar General 21679 and Dollar General 13352.
+
+    Args:
+        first (dict): Record
+        second (dict): Record
+        shingles (tuple): Name shingles of both records
+        similarity (float): Minimum Jaccard similarity of the name shingles
+
+    Returns:
+        bool: True/False
+    """
+
+    street_number = get_street_number(first)
+    if street_number is None or street_number != get_street_number(second):
+        return False
+    if {token for token in get_name_tokens(first['name']) if token.isdigit()} \
+            != {token for token in get_name_tokens(second['name']) if token.isdigit()}:
+        return False
+    return minhash.jaccard(*shingles) >= similarity
+
+
+def get_name_pairs(records: list, keys: list, similarity: float) -> tuple:
+    """
+    Finds the pairs of records with similar names using MinHash signatures and LSH buckets
+    blocked by zip code, instead of comparing every pair of names. Candidates must also
+    have the same type and name RegEx and pass is_name_match.
+
+    Args:
+        records (list): Records
+        keys (list): Match key of each record
+        similarity (float): Minimum Jaccard similarity of the name shingles, 0 turns it off
+
+    Returns:
+        tuple: List of record number pairs and the blocking statistics
+    """
+
+    if similarity <= 0:
+        return [], {}
+
+    started = time.perf_counter()
+    hasher = minhash.MinHasher()
+    index = minhash.LSHIndex()
+    signatures = {}
+    shingles = []
+    zip_keys = []
+    for item, record in enumerate(records):
+        name = str(record['name'])
+        if name not in signatures:
+            signatures[name] = (minhash.get_shingles(name), None)
+        name_shingles, signature = signatures[name]
+        zip_key = get_zip_key(record)
+        shingles.append(name_shingles)
+        zip_keys.append(zip_key)
+        if zip_key is not None and name_shingles:
+            if signature is None:
+                signature = hasher.signature(name_shingles)
+                signatures[name] = (name_shingles, signature)
+            index.add(item, signature, zip_key)
+
+    candidates = index.pairs()
+    pairs = sorted(
+        (first, second) for first, second in candidates
+        if keys[first] == keys[second]
+        and is_name_match(records[first], records[second], (shingles[first], shingles[second]), similarity)
+    )
+    seconds = time.perf_counter() - started
+
+    blocking = {
+        'records': len(records),
+        'candidates': len(candidates),
+        'pairs': len(pairs),
+        'seconds': round(seconds, 4),
+        'records_per_second': round(len(records) / seconds) if seconds else 0
+    }
+    blocking.update(minhash.estimate_recall(shingles, zip_keys, candidates, similarity))
+    return pairs, blocking
+
+
+def get_match_key(record: dict) -> tuple:
+    """
+    Returns the values two records at the same address must share to be duplicates:
+    the type and the name RegEx from the classification module.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        tuple: Type and name RegEx
+    """
+
+    return (record['type'], classification.get_reg_ex(record['name'], record['type']))
+
+
+def sort_members(records: list) -> list:
+    """
+    Sorts the members of a cluster by descending id, then source and name, so
+    a cluster is always merged in the same order.
+
+    Args:
+        records (list): Cluster members
+
+    Returns:
+        list: Sorted members
+    """
+
+    return sorted(records, reverse=True,
+                  key=lambda record: (record['id'], str(record['source_file']), str(record.get('original_id', '')), str(record['name'])))
+
+
 def get_skip_fields(schema:dict) -> list:
     """
     Retrieves the default skip fields for merge checking.
@@ -150,15 +794,8 @@ def get_skip_fields(schema:dict) -> list:
         list: List of field names
     """
     
-    fields = set()
-    properties = schema.get('properties', [])
-    for property in properties.keys():
-        attributes = properties.get(property, {})
-        prop_type = attributes.get('type')
-        if 'boolean' in prop_type or 'integer' in prop_type or 'number' in prop_type:
-            fields.add(property)
-    return list(fields)
-    
+    return schemas.compile_schema(schema).skip_fields
+
 
 def merge_records(source: dict, target: dict, schema: dict) -> dict:
     """
@@ -173,38 +810,83 @@ def merge_records(source: dict, target: dict, schema: dict) -> dict:
     Returns:
         dict: Result with the Record and the Duplicate
     """
-    skip_fields = get_skip_fields(schema)
+
+    return merge_cluster([source, target], schema)
+
+
+def merge_cluster(records: list, schema: dict) -> dict:
+    """
+    Merges the records of a cluster into a single record, resolving every field, the
+    coordinates and the flags across all of the records in one pass. The merged record
+    is validated and has the global rules applied once.
+
+    Args:
+        records (list): Cluster members, sorted with sort_members
+        schema (dict): JSON Schema
+
+    Returns:
+        dict: Merged Record
+    """
+
+    schema = schemas.compile_schema(schema)
+    skip_fields = schema.skip_fields
+    first = records[0]
 
     record = maputil.new_record(schema)
-    for key in source.keys():
+    for key in first.keys():
         if key not in skip_fields:
-            record[key] = merge_value(source, target, key)
+            # The longest value wins, the earliest record on a tie.
+            record[key] = max([member[key] for member in records], key=len)
 
-    coordinates = get_coordinates(source, target)
+    coordinates = get_cluster_coordinates(records)
     record['longitude'] = coordinates['longitude']
     record['latitude'] = coordinates['latitude']
 
-    record['wic'] = bool(get_flag_value(source, target, 'wic'))
-    record['snap'] = bool(get_flag_value(source, target, 'snap'))
-    record['food_bucks'] = bool(get_flag_value(source, target, 'food_bucks'))
-    record['fmnp'] = bool(get_flag_value(source, target, 'fmnp'))
-    record['free_distribution'] = bool(get_flag_value(
-        source, target, 'free_distribution'))
-    record['fresh_produce'] = bool(get_flag_value(source, target, 'fresh_produce'))
-    record['food_rx'] = bool(get_flag_value(source, target, 'food_rx'))
+    flags.from_mask(flags.resolve_all([
+        (flags.to_mask(member), FLAG_PRIORITIES.get(member['source_file'], DEFAULT_FLAG_PRIORITIES))
+        for member in records
+    ]), record)
     record['merged_record'] = True
-    record['group_id'] = f"{source['id']};{target['id']}"
-    record['original_id'] = str(uuid4())
-    record['id'] = 0
-
-    validation_result = validation.validate(schema, record)
-    if validation_result['valid']:
-        record['in_error'] = False
-        return RulesEngine(record).apply_global_rules().commit()
-    else:
-        record['in_error'] = True
-        record['data_issues'] = validation_result.get('errors', '')
-        return RulesEngine(record).apply_global_rules().commit()
+    record['group_id'] = ';'.join(str(member['id']) for member in records)
+    record['id'], record['original_id'] = identity.cluster_id(records)
+
+    # The first record was validated when it was created, so only the fields that differ from it are validated again.
+    record['data_issues'] = first.get('data_issues', '')
+    changed = [key for key in record if key not in first or record[key] != first[key]]
+    validation.validate_record(schema, record, changed)
+    return RulesEngine(record).apply_global_rules().commit()
+
+
+def get_cluster_coordinates(records: list) -> dict:
+    """
+    Returns the Coordinates for a merged cluster in a single pass over its records, applying
+    the rules of get_coordinates to each record in turn: the coordinates found so far are kept
+    when they come from a source with a better coordinates priority and differ in both
+    longitude and latitude, otherwise any record with coordinates replaces them.
+
+    Args:
+        records (list): Cluster members
+
+    Returns:
+        dict: Longitude and Latitude
+    """
+
+    best = records[0]
+    best_priority = COORDINATE_PRIORITIES.get(best['source_file'], DEFAULT_PRIORITY)
+    for member in records[1:]:
+        priority = COORDINATE_PRIORITIES.get(member['source_file'], DEFAULT_PRIORITY)
+        if best['source_file'] != member['source_file'] and best['longitude'] != member['longitude'] \
+                and best['latitude'] != member['latitude'] and best_priority < priority \
+                and best['longitude'] != 0 and best['latitude'] != 0:
+            continue
+        if member['longitude'] != 0 and member['latitude'] != 0:
+            best = member
+            best_priority = priority
+
+    return {
+        'longitude': float(best['longitude']),
+        'latitude': float(best['latitude'])
+    }
 
 
 def merge_value(source: dict, target: dict, field:str) -> int|float|str|bool:
@@ -240,12 +922,32 @@ def get_flag_value(source: dict, target: dict, field: str) -> bool:
         bool: flag Value
     """
 
-    if source['source_file'] != target['source_file']:
-        if SOURCE_HIERARCHY.get(source['source_file'], {}).get(field, 100) < SOURCE_HIERARCHY.get(target['source_file'], {}).get(field, 100):
-            return source.get(field, False)
-        elif SOURCE_HIERARCHY.get(source['source_file'], {}).get(field, 100) > SOURCE_HIERARCHY.get(target['source_file'], {}).get(field, 100):
-            return target.get(field, False)
-    return source.get(field, False) is True or target.get(field, False) is True
+    return bool(resolve_flags(source, target) & flags.FLAG_BITS[field])
+
+
+def resolve_flags(source: dict, target: dict) -> int:
+    """
+    Resolves every flag for two records that need merged in a single pass.
+    The record from the source with the lower hierarchy value wins the flag,
+    when neither source outranks the other the flag is set if either record has it set.
+
+    Args:
+        source (dict): Source Record
+        target (dict): Target Record
+
+    Returns:
+        int: Flag mask for the merged record
+    """
+
+    source_mask = flags.to_mask(source)
+    target_mask = flags.to_mask(target)
+    if source['source_file'] == target['source_file']:
+        return source_mask | target_mask
+
+    source_key = source['source_file'] if source['source_file'] in SOURCE_HIERARCHY else None
+    target_key = target['source_file'] if target['source_file'] in SOURCE_HIERARCHY else None
+    source_wins, target_wins = FLAG_PRIORITY_MASKS[(source_key, target_key)]
+    return flags.resolve(source_mask, target_mask, source_wins, target_wins)
 
 
 def get_coordinates(source: dict, target: dict) -> dict:
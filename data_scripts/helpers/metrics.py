@@ -0,0 +1,312 @@
+"""
+Run metrics of the pipeline. Stages record timing spans for their steps, fetching, mapping,
+classifying, geocoding, validating and writing, along with counters such as the records in
+and out, errors, bytes downloaded and written and cache hits. The figures are grouped by the
+stage running in the current thread, so stages running at the same time are kept apart, and
+outside of a stage by the name of the running script.
+
+Spans can nest: the map span of a source covers the classify, geocode and validate spans of
+its records, and the geocode span covers the fetch of its request.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+from time import perf_counter
+
+FETCH = 'fetch'
+MAP = 'map'
+CLASSIFY = 'classify'
+GEOCODE = 'geocode'
+VALIDATE = 'validate'
+WRITE = 'write'
+
+RECORDS_IN = 'records_in'
+RECORDS_OUT = 'records_out'
+ERRORS = 'errors'
+BYTES_DOWNLOADED = 'bytes_downloaded'
+BYTES_WRITTEN = 'bytes_written'
+CACHE_HITS = 'cache_hits'
+CACHE_MISSES = 'cache_misses'
+
+_current_stage = contextvars.ContextVar('metrics_stage', default=None)
+
+
+def get_script_name() -> str:
+    """
+    Returns the name of the running script.
+
+    Returns:
+        str: Script name
+    """
+
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'interactive'))[0]
+
+
+def get_current_stage() -> str | None:
+    """
+    Returns the stage running in the current thread.
+
+    Returns:
+        str | None: Stage name, None outside of a stage
+    """
+
+    return _current_stage.get()
+
+
+def get_stage_name() -> str:
+    """
+    Returns the name the metrics of the current thread are grouped by.
+
+    Returns:
+        str: Stage name, the script name outside of a stage
+    """
+
+    return _current_stage.get() or get_script_name()
+
+
+class RunMetrics(object):
+    """
+    Spans and counters of a run, keyed by stage and name. Stages record into it from several
+    threads; a new key is added under a lock, while the values of a key are only updated by
+    the thread running its stage, so recording takes no lock.
+    """
+
+    spans: dict
+    counters: dict
+
+    def __init__(self) -> None:
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, step: str, seconds: float, stage: str = None) -> None:
+        """
+        Records a call of a step.
+
+        Args:
+            step (str): Step name
+            seconds (float): Time spent in the step
+            stage (str): Stage name, defaults to the stage of the current thread
+        """
+
+        key = (stage or get_stage_name(), step)
+        span = self.spans.get(key)
+        if span is None:
+            with self._lock:
+                span = self.spans.setdefault(key, [0, 0.0])
+        span[0] += 1
+        span[1] += seconds
+
+    def add(self, counter: str, value: int = 1, stage: str = None) -> None:
+        """
+        Adds to a counter.
+
+        Args:
+            counter (str): Counter name
+            value (int): Value added
+            stage (str): Stage name, defaults to the stage of the current thread
+        """
+
+        key = (stage or get_stage_name(), counter)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def get_stage(self, stage: str) -> dict:
+        """
+        Returns the spans and counters of a stage.
+
+        Args:
+            stage (str): Stage name
+
+        Returns:
+            dict: Spans with their calls and seconds, and counters
+        """
+
+        with self._lock:
+            spans = {step: {'calls': calls, 'seconds': round(seconds, 6)}
+                     for (name, step), (calls, seconds) in sorted(self.spans.items()) if name == stage}
+            counters = {counter: value for (name, counter), value in sorted(self.counters.items()) if name == stage}
+        return {'spans': spans, 'counters': counters}
+
+    def get_totals(self) -> dict:
+        """
+        Returns the counters and span calls summed over every stage.
+
+        Returns:
+            dict: Totals by counter name, and by step name for the span calls
+        """
+
+        totals = {}
+        with self._lock:
+            for (_, counter), value in self.counters.items():
+                totals[counter] = totals.get(counter, 0) + value
+            for (_, step), (calls, _) in self.spans.items():
+                totals[f"{step}_calls"] = totals.get(f"{step}_calls", 0) + calls
+        return dict(sorted(totals.items()))
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics() -> RunMetrics:
+    """
+    Returns the metrics of the current run.
+
+    Returns:
+        RunMetrics: Run metrics
+    """
+
+    return _metrics
+
+
+def reset() -> RunMetrics:
+    """
+    Starts the metrics of a new run.
+
+    Returns:
+        RunMetrics: Run metrics
+    """
+
+    global _metrics
+    _metrics = RunMetrics()
+    return _metrics
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Groups the metrics recorded by the current thread under a stage.
+
+    Args:
+        name (str): Stage name
+    """
+
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def bind(name: str, function):
+    """
+    Returns a function calling another function within a stage, for functions run in
+    worker threads.
+
+    Args:
+        name (str): Stage name
+        function (callable): Function
+
+    Returns:
+        callable: Function grouping its metrics under the stage
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def span(step: str):
+    """
+    Times a step of the current stage.
+
+    Args:
+        step (str): Step name
+    """
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.add_time(step, perf_counter() - started)
+
+
+def timed(step: str):
+    """
+    Decorates a function to time every call as a step of the current stage.
+
+    Args:
+        step (str): Step name
+
+    Returns:
+        callable: Decorator
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _metrics.add_time(step, perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+
+def count(counter: str, value: int = 1) -> None:
+    """
+    Adds to a counter of the current stage.
+
+    Args:
+        counter (str): Counter name
+        value (int): Value added
+    """
+
+    _metrics.add(counter, value)
+
+
+def get_file_sizes(paths) -> int:
+    """
+    Returns the total size of the files that exist.
+
+    Args:
+        paths (iterable): File paths
+
+    Returns:
+        int: Bytes
+    """
+
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+def write_report(path: str, report: dict) -> None:
+    """
+    Writes a run report as JSON.
+
+    Args:
+        path (str): Report path
+        report (dict): Run report
+    """
+
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(path, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=2)
+
+
+def append_trend(path: str, entry: dict) -> None:
+    """
+    Appends the summary of a run to the trend file, one JSON object per line.
+
+    Args:
+        path (str): Trend file path
+        entry (dict): Run summary
+    """
+
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(path, 'a', encoding='utf-8') as output_file:
+        output_file.write(json.dumps(entry, separators=(',', ':')) + '\n')
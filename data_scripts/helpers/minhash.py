@@ -0,0 +1,214 @@
+"""
+MinHash signatures and locality sensitive hashing (LSH) for finding similar names
+without comparing every pair. Each name is broken into character shingles, the signature
+keeps the minimum of several hash functions over the shingles, and names whose signatures
+agree on every row of at least one band land in the same bucket and become candidates.
+
+With BANDS bands of ROWS rows, two names with a shingle Jaccard similarity of s are
+candidates with a probability of 1 - (1 - s ** ROWS) ** BANDS, about 0.99 at 0.6.
+"""
+
+import random
+import re
+import zlib
+
+SHINGLE_SIZE = 3
+BANDS = 20
+ROWS = 3
+SEED = 1
+
+# Mersenne prime larger than any 32 bit shingle hash.
+PRIME = (1 << 61) - 1
+
+NORMALIZE_PATTERN = re.compile(r'[^a-z0-9]+')
+
+
+def get_shingles(text: str, size: int = SHINGLE_SIZE) -> frozenset:
+    """
+    Returns the character shingles of a text, lower case with punctuation collapsed to a space.
+
+    Args:
+        text (str): Text
+        size (int): Shingle length
+
+    Returns:
+        frozenset: Shingles, empty when the text has no letters or digits
+    """
+
+    text = NORMALIZE_PATTERN.sub(' ', str(text).lower()).strip()
+    if not text:
+        return frozenset()
+    text = f" {text} "
+    if len(text) <= size:
+        return frozenset([text])
+    return frozenset(text[index:index + size] for index in range(len(text) - size + 1))
+
+
+def jaccard(first: frozenset, second: frozenset) -> float:
+    """
+    Returns the Jaccard similarity of two sets.
+
+    Args:
+        first (frozenset): Set
+        second (frozenset): Set
+
+    Returns:
+        float: Similarity from 0 to 1
+    """
+
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher(object):
+    """
+    Builds MinHash signatures with a fixed family of hash functions, so signatures
+    are the same in every process and every run.
+    """
+
+    coefficients: list
+    shingle_hashes: dict
+
+    def __init__(self, size: int = BANDS * ROWS, seed: int = SEED) -> None:
+        generator = random.Random(seed)
+        self.coefficients = [(generator.randrange(1, PRIME), generator.randrange(0, PRIME)) for _ in range(size)]
+        self.shingle_hashes = {}
+
+    def hash_shingle(self, shingle: str) -> tuple:
+        """
+        Returns the value of every hash function for a shingle. Names share most of their
+        shingles, so the values are computed once per shingle.
+
+        Args:
+            shingle (str): Shingle
+
+        Returns:
+            tuple: Hash values
+        """
+
+        hashes = self.shingle_hashes.get(shingle)
+        if hashes is None:
+            value = zlib.crc32(shingle.encode('utf-8'))
+            hashes = tuple((a * value + b) % PRIME for a, b in self.coefficients)
+            self.shingle_hashes[shingle] = hashes
+        return hashes
+
+    def signature(self, shingles: frozenset) -> tuple:
+        """
+        Returns the signature of a set of shingles.
+
+        Args:
+            shingles (frozenset): Shingles
+
+        Returns:
+            tuple: Minimum hash for each hash function, empty when there are no shingles
+        """
+
+        if not shingles:
+            return ()
+        return tuple(map(min, zip(*[self.hash_shingle(shingle) for shingle in shingles])))
+
+
+class LSHIndex(object):
+    """
+    Buckets of signature bands. Items are only paired with items having the same block key,
+    so a bucket never mixes, for example, different zip codes.
+    """
+
+    bands: int
+    rows: int
+    buckets: dict
+
+    def __init__(self, bands: int = BANDS, rows: int = ROWS) -> None:
+        self.bands = bands
+        self.rows = rows
+        self.buckets = {}
+
+    def add(self, item: int, signature: tuple, key=None) -> None:
+        """
+        Adds an item to the bucket of each of its bands.
+
+        Args:
+            item (int): Item number
+            signature (tuple): MinHash signature with bands * rows values
+            key (hashable): Block key
+        """
+
+        if not signature:
+            return
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            self.buckets.setdefault((key, band, values), []).append(item)
+
+    def pairs(self) -> set:
+        """
+        Returns the candidate pairs, each once with the lower item first.
+
+        Returns:
+            set: Item number pairs
+        """
+
+        pairs = set()
+        for items in self.buckets.values():
+            for index, first in enumerate(items):
+                for second in items[index + 1:]:
+                    pairs.add((first, second) if first < second else (second, first))
+        return pairs
+
+
+def candidate_probability(similarity: float, bands: int = BANDS, rows: int = ROWS) -> float:
+    """
+    Returns the probability two sets with a similarity become candidates.
+
+    Args:
+        similarity (float): Jaccard similarity
+        bands (int): Number of bands
+        rows (int): Rows per band
+
+    Returns:
+        float: Probability from 0 to 1
+    """
+
+    return 1 - (1 - similarity ** rows) ** bands
+
+
+def estimate_recall(shingles: list, keys: list, candidates: set, threshold: float,
+                    sample_size: int = 200, seed: int = SEED) -> dict:
+    """
+    Estimates the share of the similar pairs that became candidates. A sample of items is
+    compared exactly against every other item with the same block key.
+
+    Args:
+        shingles (list): Shingles of each item
+        keys (list): Block key of each item, None for items that are not indexed
+        candidates (set): Candidate pairs
+        threshold (float): Jaccard similarity of a similar pair
+        sample_size (int): Number of items sampled
+        seed (int): Random seed of the sample
+
+    Returns:
+        dict: Sampled items, similar pairs found, pairs that were candidates and the recall
+    """
+
+    blocks = {}
+    for item, key in enumerate(keys):
+        if key is not None and shingles[item]:
+            blocks.setdefault(key, []).append(item)
+
+    items = [item for block in blocks.values() for item in block]
+    sample = random.Random(seed).sample(items, min(sample_size, len(items)))
+
+    similar = set()
+    for item in sample:
+        for other in blocks[keys[item]]:
+            if other != item and jaccard(shingles[item], shingles[other]) >= threshold:
+                similar.add((item, other) if item < other else (other, item))
+
+    found = len(similar & candidates)
+    return {
+        'sampled': len(sample),
+        'similar_pairs': len(similar),
+        'candidate_pairs': found,
+        'recall': found / len(similar) if similar else 1.0
+    }
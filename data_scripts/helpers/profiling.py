@@ -0,0 +1,263 @@
+"""
+Opt-in instrumentation for the Rules Engine. When enabled every rule method records
+the number of calls, the number of fields it changed and the time spent in it for the
+source running it: the pipeline stage of the current thread, like the run metrics, or the
+running source script. The report is written as JSON when the run ends.
+
+Profiling is enabled by setting the RULES_PROFILE environment variable to the report path.
+When disabled the rule methods are left untouched so there is no overhead.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+from time import perf_counter
+
+from helpers import metrics
+
+PROFILE_ENV = 'RULES_PROFILE'
+
+_engine_classes = []
+_original_methods = {}
+_profiler = None
+
+
+class RulesProfiler(object):
+    """
+    Statistics of the rules, keyed by source and rule. Sources running at the same time
+    record from several threads, so every update is made under a lock.
+    """
+
+    source: str
+    stats: dict
+
+    def __init__(self, source: str) -> None:
+        """
+        Args:
+            source (str): Source the statistics recorded outside of a pipeline stage are grouped under
+        """
+
+        self.source = source
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, rule: str, changed: int, seconds: float, source: str = None) -> None:
+        """
+        Records a single invocation of a rule.
+
+        Args:
+            rule (str): Rule method name
+            changed (int): Number of fields the rule changed
+            seconds (float): Time spent in the rule
+            source (str): Source running the rule, defaults to the stage of the current thread
+        """
+
+        key = (source or metrics.get_current_stage() or self.source, rule)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = [0, 0, 0.0]
+            stats[0] += 1
+            stats[1] += changed
+            stats[2] += seconds
+
+    def to_dict(self) -> dict:
+        """
+        Returns the collected statistics of every source.
+
+        Returns:
+            dict: Source mapped to each rule name's calls, changed and seconds
+        """
+
+        report = {}
+        with self._lock:
+            for (source, rule), (calls, changed, seconds) in sorted(self.stats.items()):
+                report.setdefault(source, {})[rule] = {
+                    'calls': calls, 'changed': changed, 'seconds': round(seconds, 6)}
+        return report
+
+    def write(self, path: str) -> None:
+        """
+        Writes the statistics to the JSON report, keeping the entries of other sources.
+
+        Args:
+            path (str): Report path
+        """
+
+        report = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as input_file:
+                try:
+                    report = json.load(input_file)
+                except json.JSONDecodeError:
+                    report = {}
+
+        report.update(self.to_dict())
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, separators=(',', ':'), sort_keys=True)
+
+
+def take_snapshot(engine) -> tuple:
+    """
+    Captures the values a rule may change on an engine.
+
+    Args:
+        engine (RulesEngine|BatchRulesEngine): Engine being profiled
+
+    Returns:
+        tuple: Snapshot
+    """
+
+    if hasattr(engine, 'batch'):
+        batch = engine.batch
+        return (dict(batch.flags), batch.active, batch.active_rows, list(batch.column('open_to_spec_group')))
+    return (dict(engine.record), engine.flags)
+
+
+def count_changes(engine, snapshot: tuple) -> int:
+    """
+    Counts the fields changed on an engine since the snapshot was taken.
+    Batches count every changed field of every row.
+
+    Args:
+        engine (RulesEngine|BatchRulesEngine): Engine being profiled
+        snapshot (tuple): Snapshot taken before the rule
+
+    Returns:
+        int: Number of changed fields
+    """
+
+    if hasattr(engine, 'batch'):
+        batch = engine.batch
+        flags_before, active, active_rows, groups = snapshot
+        changed = sum(bin(bits ^ flags_before[bit]).count('1') for bit, bits in batch.flags.items())
+        changed += bin((batch.active ^ active) | (batch.active_rows & ~active_rows)).count('1')
+        changed += sum(1 for before, after in zip(groups, batch.column('open_to_spec_group')) if before != after)
+        return changed
+
+    record, mask = snapshot
+    changed = bin(engine.flags ^ mask).count('1')
+    for key, value in engine.record.items():
+        if key not in record or record[key] != value:
+            changed += 1
+    return changed
+
+
+def instrument(rule):
+    """
+    Wraps a rule method to record its statistics with the active profiler.
+
+    Args:
+        rule (callable): Rule method
+
+    Returns:
+        callable: Wrapped rule method
+    """
+
+    name = rule.__name__
+
+    @functools.wraps(rule)
+    def wrapper(engine, *args, **kwargs):
+        profiler = _profiler
+        if profiler is None:
+            return rule(engine, *args, **kwargs)
+
+        snapshot = take_snapshot(engine)
+        start = perf_counter()
+        result = rule(engine, *args, **kwargs)
+        elapsed = perf_counter() - start
+        profiler.record(name, count_changes(engine, snapshot), elapsed)
+        return result
+
+    return wrapper
+
+
+def register(*classes) -> None:
+    """
+    Registers the engine classes whose rule methods are profiled.
+    Profiling is enabled when the RULES_PROFILE environment variable is set.
+
+    Args:
+        classes (type): Engine classes
+    """
+
+    for engine_class in classes:
+        if engine_class not in _engine_classes:
+            _engine_classes.append(engine_class)
+            if _profiler is not None:
+                wrap_rules(engine_class)
+
+    if _profiler is None and os.environ.get(PROFILE_ENV):
+        enable(os.environ[PROFILE_ENV])
+
+
+def wrap_rules(engine_class: type) -> None:
+    """
+    Replaces the rule methods of an engine class with instrumented versions.
+
+    Args:
+        engine_class (type): Engine class
+    """
+
+    for name, method in list(vars(engine_class).items()):
+        if isinstance(method, (staticmethod, classmethod)) or not callable(method):
+            continue
+        if name.startswith('apply_') and (engine_class, name) not in _original_methods:
+            _original_methods[(engine_class, name)] = method
+            setattr(engine_class, name, instrument(method))
+
+
+def enable(path: str | None = None, source: str | None = None) -> RulesProfiler:
+    """
+    Enables profiling of the registered engines. When a path is provided the report
+    is written there when the interpreter exits.
+
+    Args:
+        path (str): Report path
+        source (str): Name the statistics recorded outside of a pipeline stage are grouped
+            under, defaults to the script name
+
+    Returns:
+        RulesProfiler: Active profiler
+    """
+
+    global _profiler
+    _profiler = RulesProfiler(source or metrics.get_script_name())
+    for engine_class in _engine_classes:
+        wrap_rules(engine_class)
+    if path:
+        atexit.register(_profiler.write, path)
+    return _profiler
+
+
+def disable() -> RulesProfiler | None:
+    """
+    Disables profiling and restores the original rule methods.
+
+    Returns:
+        RulesProfiler: Profiler that was active
+    """
+
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    for (engine_class, name), method in _original_methods.items():
+        setattr(engine_class, name, method)
+    _original_methods.clear()
+    return profiler
+
+
+def get_profiler() -> RulesProfiler | None:
+    """
+    Returns the active profiler.
+
+    Returns:
+        RulesProfiler: Active profiler or None when profiling is disabled
+    """
+
+    return _profiler
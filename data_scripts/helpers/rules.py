@@ -4,6 +4,11 @@ Rules Engine with Fluent Interface to applie business rules and transformations
 
 from datetime import datetime
 
+from helpers import flags, profiling
+from helpers.context import (BLOOMFIELD_SEASON, FARMERS_MARKET_SEASON,
+                             SUMMER_MEAL_SEASON, RunContext, get_run_context)
+from helpers.batch import RecordBatch, from_bits, rows_to_bits
+
 FARMERS_MARKET = "farmer's market"
 SUPERMARKET = 'supermarket'
 FRESH_ACCESS = 'fresh access'
@@ -17,18 +22,38 @@ JUST_HARVEST_SOURCE = 'Just Harvest'
 class RulesEngine(object):
 
     record: dict
+    flags: int
+    context: RunContext
 
-    def __init__(self, record: dict) -> None:
+    def __init__(self, record: dict, context: RunContext = None) -> None:
         self.record = record
+        self.flags = flags.to_mask(record)
+        self.context = context or get_run_context()
+
+    @staticmethod
+    def apply_batch(batch: list | RecordBatch, context: RunContext = None):
+        """
+        Creates a Rules Engine for a batch of records.
+        The batch engine provides the same rule methods and applies each of them
+        to every record at once.
+
+        Args:
+            batch (list|RecordBatch): Records or column batch to apply the rules to
+            context (RunContext): Run context, defaults to the current run
+
+        Returns:
+            BatchRulesEngine: Batch Rules Engine
+        """
+        return BatchRulesEngine(batch, context)
 
     def get_current_date(self) -> datetime:
         """
-        Returns the current UTC DateTime
+        Returns the UTC DateTime the current run is evaluated at.
 
         Returns:
-            datetime: current utc datetime
+            datetime: run evaluation datetime
         """
-        return datetime.utcnow()
+        return self.context.evaluated_at
 
     def apply_global_rules(self):
         """
@@ -38,37 +63,35 @@ class RulesEngine(object):
             _type_: RulesEngine
         """
 
-        if self.record['type'] == FARMERS_MARKET or self.record['type'] == SUPERMARKET or self.record['source_file'] == 'Just Harvest Fresh Corner Stores.xlsx':
-            self.record['fresh_produce'] = True
+        record_type = self.record['type']
+        source_file = self.record['source_file']
 
-        if self.record['source_file'] == 'Just Harvest - Fresh Access Markets.xlsx':
-            self.record['food_bucks'] = True
-            self.record['fresh_produce'] = True
+        if record_type == FARMERS_MARKET or record_type == SUPERMARKET or source_file == 'Just Harvest Fresh Corner Stores.xlsx':
+            self.flags |= flags.FRESH_PRODUCE
 
-        if self.record['source_file'] == 'Allegheny_County_WIC_Vendor_Locations.xlsx':
-            self.record['wic'] = True
+        if source_file == 'Just Harvest - Fresh Access Markets.xlsx':
+            self.flags |= flags.FOOD_BUCKS | flags.FRESH_PRODUCE
 
-        if self.record['source_file'] == 'GPCFB - Green Grocer.xlsx' or self.record['type'] == FARMERS_MARKET:
-            self.record['fmnp'] = True
+        if source_file == 'Allegheny_County_WIC_Vendor_Locations.xlsx':
+            self.flags |= flags.WIC
 
-        if self.record['source_file'] == 'Greater Pittsburgh Community Food Bank':
-            self.record['free_distribution'] = True
+        if source_file == 'GPCFB - Green Grocer.xlsx' or record_type == FARMERS_MARKET:
+            self.flags |= flags.FMNP
 
-        if self.record['source_file'] == 'PA.xlsx':
-            self.record['food_bucks'] = True
-            self.record['snap'] = True
+        if source_file == 'Greater Pittsburgh Community Food Bank':
+            self.flags |= flags.FREE_DISTRIBUTION
 
-        if self.record['type'] == 'summer food site':
+        if source_file == 'PA.xlsx':
+            self.flags |= flags.FOOD_BUCKS | flags.SNAP
+
+        if record_type == 'summer food site':
             self.record['open_to_spec_group'] = 'children and teens 18 and younger'
 
-        if self.record['food_bucks'] is True:
-            self.record['snap'] = True
+        if self.flags & flags.FOOD_BUCKS:
+            self.flags |= flags.SNAP
 
-        if self.record['free_distribution']:
-            self.record['snap'] = False
-            self.record['wic'] = False
-            self.record['fmnp'] = False
-            self.record['food_bucks'] = False
+        if self.flags & flags.FREE_DISTRIBUTION:
+            self.flags &= ~flags.PAYMENT_FLAGS
 
         self.record['active_record'] = True
         return self
@@ -80,25 +103,16 @@ class RulesEngine(object):
         Returns:
             _type_: RulesEngine
         """
-        current_date = self.get_current_date()
-        start_date = datetime(current_date.year, 6, 1)
-        end_date = datetime(current_date.year, 8, 31)
-
-        bloomfield_start = datetime(current_date.year, 5, 1)
-        bloomfield_end = datetime(current_date.year, 11, 30)
-
         if self.record.get('type', 'other') == FARMERS_MARKET:
-            self.record['snap'] = True
+            self.flags |= flags.SNAP | flags.FOOD_BUCKS | flags.FMNP
+            self.flags &= ~flags.FREE_DISTRIBUTION
             if 'green grocer' not in str(self.record['name']).lower():
-                self.record['wic'] = True
-            self.record['food_bucks'] = True
-            self.record['fmnp'] = True
-            self.record['free_distribution'] = False
+                self.flags |= flags.WIC
 
             if 'bloomfield' in self.record.get('name', '').lower():
-                self.record['active_record'] = current_date >= bloomfield_start and current_date <= bloomfield_end
+                self.record['active_record'] = self.context.in_season(BLOOMFIELD_SEASON, self.get_current_date())
             else:
-                self.record['active_record'] = current_date >= start_date and current_date <= end_date
+                self.record['active_record'] = self.context.in_season(FARMERS_MARKET_SEASON, self.get_current_date())
 
         return self
 
@@ -110,12 +124,8 @@ class RulesEngine(object):
             _type_: Rules Engine
         """
         if self.record['source_org'] == JUST_HARVEST_SOURCE:
-            self.record['snap'] = True
-            self.record['wic'] = True
-            self.record['fmnp'] = True
-            self.record['fresh_produce'] = True
-            self.record['food_bucks'] = True
-            self.record['free_distribution'] = False
+            self.flags |= flags.PAYMENT_FLAGS | flags.FRESH_PRODUCE
+            self.flags &= ~flags.FREE_DISTRIBUTION
         return self
 
     def apply_fresh_corners_rules(self):
@@ -125,9 +135,9 @@ class RulesEngine(object):
         Returns:
             _type_: Rules Engine
         """
-        if self.record['type'] == CONVENIENCE_STORE and self.record['snap'] is True:
-            self.record['food_bucks'] = True
-        self.record['fresh_produce'] = True
+        if self.record['type'] == CONVENIENCE_STORE and self.flags & flags.SNAP:
+            self.flags |= flags.FOOD_BUCKS
+        self.flags |= flags.FRESH_PRODUCE
 
         return self
 
@@ -140,7 +150,7 @@ class RulesEngine(object):
         """
 
         if 'fresh produce' in str(self.record.get('location_description', '')).lower():
-            self.record['fresh_produce'] = True
+            self.flags |= flags.FRESH_PRODUCE
         return self
 
     def apply_food_bank_rules(self):
@@ -152,16 +162,13 @@ class RulesEngine(object):
         """
 
         if self.record['type'] == FOOD_BANK:
-            self.record['snap'] = False
-            self.record['wic'] = False
-            self.record['fmnp'] = False
-            self.record['food_bucks'] = False
-            self.record['free_distribution'] = True
+            self.flags &= ~flags.PAYMENT_FLAGS
+            self.flags |= flags.FREE_DISTRIBUTION
 
             desc = self.record.get('location_description', None)
             name = self.record.get('name', None)
-            if (name or desc) and ('grocer' in str(desc).lower() or 'fresh' in str(desc).lower() or 'produce' in str(desc).lower() or 'green grocer' in str(name).lower()):
-                self.record['fresh_produce'] = True
+            if is_food_bank_produce(name, desc):
+                self.flags |= flags.FRESH_PRODUCE
 
         return self
 
@@ -173,18 +180,11 @@ class RulesEngine(object):
             _type_: Rules Engine
         """
 
-        current_date = self.get_current_date()
-        start_date = datetime(current_date.year, 6, 1)
-        end_date = datetime(current_date.year, 8, 30)
-
         if self.record['type'] == SUMMER_FOOOD:
-            self.record['snap'] = False
-            self.record['wic'] = False
-            self.record['fmnp'] = False
-            self.record['food_bucks'] = False
-            self.record['free_distribution'] = True
+            self.flags &= ~flags.PAYMENT_FLAGS
+            self.flags |= flags.FREE_DISTRIBUTION
             self.record['open_to_spec_group'] = 'children and teens 18 and younger'
-            self.record['active_record'] = current_date >= start_date and current_date <= end_date
+            self.record['active_record'] = self.context.in_season(SUMMER_MEAL_SEASON, self.get_current_date())
 
         return self
 
@@ -197,20 +197,217 @@ class RulesEngine(object):
         """
 
         if self.record['type'] == GROW_PGH:
-            self.record['snap'] = False
-            self.record['wic'] = False
-            self.record['fmnp'] = False
-            self.record['fresh_produce'] = True
-            self.record['food_bucks'] = False
-            self.record['free_distribution'] = False
+            self.flags &= ~(flags.PAYMENT_FLAGS | flags.FREE_DISTRIBUTION)
+            self.flags |= flags.FRESH_PRODUCE
 
         return self
 
     def commit(self) -> dict:
         """
         Returns the record with the rules applied.
+        The flag mask is unpacked back onto the record fields.
 
         Returns:
             dict: Updated Record
         """
-        return self.record
+        return flags.from_mask(self.flags, self.record)
+
+
+def is_food_bank_produce(name: str, desc: str) -> bool:
+    """
+    Checks if a food bank site provides fresh produce from the name and description.
+
+    Args:
+        name (str): Location name
+        desc (str): Location description
+
+    Returns:
+        bool: True/False
+    """
+
+    return bool((name or desc) and ('grocer' in str(desc).lower() or 'fresh' in str(desc).lower() or 'produce' in str(desc).lower() or 'green grocer' in str(name).lower()))
+
+
+class BatchRulesEngine(object):
+    """
+    Applies the Rules Engine rules to a column oriented batch of records.
+    Every rule is evaluated as bit set operations over all of the rows and
+    produces the same result as applying the rule to each record.
+    """
+
+    batch: RecordBatch
+    context: RunContext
+
+    def __init__(self, batch: list | RecordBatch, context: RunContext = None) -> None:
+        self.batch = batch if isinstance(batch, RecordBatch) else RecordBatch(batch)
+        self.context = context or get_run_context()
+
+    def get_current_date(self) -> datetime:
+        """
+        Returns the UTC DateTime the current run is evaluated at.
+
+        Returns:
+            datetime: run evaluation datetime
+        """
+        return self.context.evaluated_at
+
+    def apply_global_rules(self):
+        """
+        Applies the global rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        batch = self.batch
+        farmers_market = batch.equals('type', FARMERS_MARKET)
+
+        batch.set_flags(farmers_market | batch.equals('type', SUPERMARKET) | batch.equals(
+            'source_file', 'Just Harvest Fresh Corner Stores.xlsx'), flags.FRESH_PRODUCE)
+        batch.set_flags(batch.equals('source_file', 'Just Harvest - Fresh Access Markets.xlsx'),
+                        flags.FOOD_BUCKS | flags.FRESH_PRODUCE)
+        batch.set_flags(batch.equals('source_file', 'Allegheny_County_WIC_Vendor_Locations.xlsx'), flags.WIC)
+        batch.set_flags(batch.equals('source_file', 'GPCFB - Green Grocer.xlsx') | farmers_market, flags.FMNP)
+        batch.set_flags(batch.equals('source_file', 'Greater Pittsburgh Community Food Bank'), flags.FREE_DISTRIBUTION)
+        batch.set_flags(batch.equals('source_file', 'PA.xlsx'), flags.FOOD_BUCKS | flags.SNAP)
+        batch.set_value(batch.equals('type', 'summer food site'),
+                        'open_to_spec_group', 'children and teens 18 and younger')
+        batch.set_flags(batch.flags[flags.FOOD_BUCKS], flags.SNAP)
+        batch.clear_flags(batch.flags[flags.FREE_DISTRIBUTION], flags.PAYMENT_FLAGS)
+        batch.set_active(batch.all_rows, batch.all_rows)
+        return self
+
+    def apply_farmer_market_rules(self):
+        """
+        Applies the Farmer's Market rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        batch = self.batch
+        markets = batch.equals('type', FARMERS_MARKET)
+        if not markets:
+            return self
+
+        batch.set_flags(markets, flags.SNAP | flags.FOOD_BUCKS | flags.FMNP)
+        batch.clear_flags(markets, flags.FREE_DISTRIBUTION)
+        batch.set_flags(batch.where('name', lambda value: 'green grocer' not in str(value).lower(), markets), flags.WIC)
+
+        bloomfield = batch.where('name', lambda value: 'bloomfield' in (value or '').lower(), markets)
+        current_date = self.get_current_date()
+        active = 0
+        if self.context.in_season(BLOOMFIELD_SEASON, current_date):
+            active |= bloomfield
+        if self.context.in_season(FARMERS_MARKET_SEASON, current_date):
+            active |= batch.all_rows & ~bloomfield
+        batch.set_active(markets, active)
+        return self
+
+    def apply_fresh_access_rules(self):
+        """
+        Applies the Fresh Access rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        rows = self.batch.equals('source_org', JUST_HARVEST_SOURCE)
+        self.batch.set_flags(rows, flags.PAYMENT_FLAGS | flags.FRESH_PRODUCE)
+        self.batch.clear_flags(rows, flags.FREE_DISTRIBUTION)
+        return self
+
+    def apply_fresh_corners_rules(self):
+        """
+        Applies the Fresh Corners rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        batch = self.batch
+        batch.set_flags(batch.equals('type', CONVENIENCE_STORE) & batch.flags[flags.SNAP], flags.FOOD_BUCKS)
+        batch.set_flags(batch.all_rows, flags.FRESH_PRODUCE)
+        return self
+
+    def apply_bridgeway_rules(self):
+        """
+        Applies the Bridgeway rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        rows = self.batch.where('location_description', lambda value: 'fresh produce' in str(
+            '' if value is None else value).lower())
+        self.batch.set_flags(rows, flags.FRESH_PRODUCE)
+        return self
+
+    def apply_food_bank_rules(self):
+        """
+        Applies the Food Bank rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        batch = self.batch
+        rows = batch.equals('type', FOOD_BANK)
+        if not rows:
+            return self
+
+        batch.clear_flags(rows, flags.PAYMENT_FLAGS)
+        batch.set_flags(rows, flags.FREE_DISTRIBUTION)
+        selected = from_bits(rows, batch.size)
+        produce = rows_to_bits([row for row, (name, desc) in enumerate(zip(batch.column('name'), batch.column('location_description')))
+                                if selected[row] and is_food_bank_produce(name, desc)], batch.size)
+        batch.set_flags(produce, flags.FRESH_PRODUCE)
+        return self
+
+    def apply_summer_meal_rules(self):
+        """
+        Applies the Summer Meal rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        batch = self.batch
+        rows = batch.equals('type', SUMMER_FOOOD)
+        if not rows:
+            return self
+
+        batch.clear_flags(rows, flags.PAYMENT_FLAGS)
+        batch.set_flags(rows, flags.FREE_DISTRIBUTION)
+        batch.set_value(rows, 'open_to_spec_group', 'children and teens 18 and younger')
+        batch.set_active(rows, batch.all_rows if self.context.in_season(
+            SUMMER_MEAL_SEASON, self.get_current_date()) else 0)
+        return self
+
+    def apply_grow_pgh_rules(self):
+        """
+        Applies the Grow PGH rules to the batch.
+
+        Returns:
+            _type_: BatchRulesEngine
+        """
+
+        rows = self.batch.equals('type', GROW_PGH)
+        self.batch.clear_flags(rows, flags.PAYMENT_FLAGS | flags.FREE_DISTRIBUTION)
+        self.batch.set_flags(rows, flags.FRESH_PRODUCE)
+        return self
+
+    def commit(self) -> list | RecordBatch:
+        """
+        Returns the records with the rules applied.
+        A batch created from columns is returned as the updated batch.
+
+        Returns:
+            list|RecordBatch: Updated Records
+        """
+        if self.batch.records is None:
+            return self.batch
+        return self.batch.to_records()
+
+
+profiling.register(RulesEngine, BatchRulesEngine)
@@ -0,0 +1,607 @@
+"""
+Parses the free text schedules of the sources into structured recurring schedules.
+A schedule is a date range, a set of weekdays and the opening hours on those days.
+
+Each record stores its schedules as a compact open hours index: one entry per date range
+holding the weekdays and the opening hours of each day, which decode to a bit for every
+15 minutes of the week the site is open. Checking if a site is open at a given time is a
+bit lookup instead of parsing the schedule text again. Schedules on ordinal weekdays, such
+as the 2nd Saturday of every month, are written as one entry per date they fall on.
+"""
+
+import calendar
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import NamedTuple
+
+from helpers import context
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+ALL_WEEKDAYS = 0b1111111
+FULL_DAY = (0, 24 * 60)
+YEAR_START = (1, 1)
+YEAR_END = (12, 31)
+
+ENTRY_SEPARATOR = ','
+GROUP_SEPARATOR = ';'
+RUN_SEPARATOR = '+'
+
+MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): index for index, name in enumerate(calendar.month_abbr) if name})
+MONTHS['sept'] = 9
+
+WEEKDAYS = {name.lower(): index for index, name in enumerate(calendar.day_name)}
+WEEKDAYS.update({name.lower(): index for index, name in enumerate(calendar.day_abbr)})
+WEEKDAYS.update({'tues': 1, 'weds': 2, 'thur': 3, 'thurs': 3})
+
+ORDINALS = {'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5, 'last': -1}
+
+CONNECTORS = {'-', '–', 'to', 'through', 'thru', 'until'}
+
+TOKEN_PATTERN = re.compile(
+    r"(?P<always>24/7|24 hours|7 days)"
+    r"|\b(?P<month>" + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r")\b\.?"
+    r"(?:\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?\b(?!\s*(?::|[ap]\.?m\b)))?"
+    r"|\b(?P<ordinal>[1-5](?:st|nd|rd|th)|" + '|'.join(ORDINALS) + r")\b"
+    r"|(?P<time>\b\d{1,2}(?::\d{2})?(?:\s*[ap]\.?m\b\.?)?(?![\w/:])|\bnoon\b|\bmidnight\b)"
+    r"|(?P<word>[a-z]+)"
+    r"|(?P<dash>[-–])"
+)
+TIME_PATTERN = re.compile(r"(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?:(?P<suffix>[ap])\.?m\.?)?")
+
+
+class Schedule(NamedTuple):
+    """
+    A recurring schedule. Months and days are (month, day) tuples where the day may be None,
+    weekdays is a bit mask with bit 0 for Monday and hours holds (open, close) minute pairs.
+    Occurrences limits the weekdays to their nth occurrence in the month, -1 for the last,
+    and is empty for weekly schedules.
+    """
+
+    start: tuple | None
+    end: tuple | None
+    weekdays: int
+    hours: tuple
+    occurrences: tuple = ()
+
+
+def tokenize(text: str) -> list:
+    """
+    Splits schedule text into month, ordinal, weekday, time, connector and always tokens.
+
+    Args:
+        text (str): Schedule text
+
+    Returns:
+        list: Tokens as tuples of the kind followed by its values
+    """
+
+    text = str(text or '').lower().replace('<br/>', ' ')
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        if match['always']:
+            tokens.append(('always',))
+        elif match['time']:
+            time = parse_time(match['time'])
+            if time is not None:
+                tokens.append(('time',) + time)
+        elif match['month']:
+            day = int(match['day']) if match['day'] else None
+            tokens.append(('month', MONTHS[match['month']], day))
+        elif match['ordinal']:
+            ordinal = match['ordinal']
+            tokens.append(('ordinal', ORDINALS.get(ordinal) or int(ordinal[0])))
+        elif match['dash']:
+            tokens.append(('dash',))
+        else:
+            word = match['word']
+            if word in WEEKDAYS or (word.endswith('s') and word[:-1] in WEEKDAYS):
+                tokens.append(('weekday', WEEKDAYS.get(word, WEEKDAYS.get(word[:-1]))))
+            elif word in CONNECTORS:
+                tokens.append(('dash',))
+    return tokens
+
+
+def parse_time(value: str) -> tuple | None:
+    """
+    Parses a time of day.
+
+    Args:
+        value (str): Time such as 9, 9:30, 9:30am, noon or midnight
+
+    Returns:
+        tuple: Minutes after midnight and the am/pm suffix or None when not known,
+        or None when the value is not a time
+    """
+
+    if value == 'noon':
+        return (12 * 60, 'p')
+    if value == 'midnight':
+        return (0, 'a')
+
+    match = TIME_PATTERN.fullmatch(value.strip())
+    if match is None:
+        return None
+    hour = int(match['hour'])
+    minute = int(match['minute'] or 0)
+    if hour > 24 or minute >= 60:
+        return None
+    return (hour * 60 + minute, match['suffix'])
+
+
+def apply_suffix(minutes: int, suffix: str | None) -> int:
+    """
+    Converts a 12 hour time to minutes after midnight.
+
+    Args:
+        minutes (int): Minutes as written
+        suffix (str): a, p or None
+
+    Returns:
+        int: Minutes after midnight
+    """
+
+    if suffix is None or minutes >= 13 * 60:
+        return minutes
+    hour, minute = divmod(minutes, 60)
+    hour = hour % 12 + (12 if suffix == 'p' else 0)
+    return hour * 60 + minute
+
+
+def resolve_hours(start: tuple, end: tuple) -> tuple:
+    """
+    Resolves the opening and closing minutes of a time range. A missing am/pm suffix
+    is taken from the other end of the range, ranges starting before 7 without any
+    suffix are in the afternoon and the close is always after the open.
+
+    Args:
+        start (tuple): Minutes and suffix of the opening time
+        end (tuple): Minutes and suffix of the closing time
+
+    Returns:
+        tuple: Opening and closing minutes after midnight
+    """
+
+    (start_minutes, start_suffix), (end_minutes, end_suffix) = start, end
+
+    if start_suffix is None and end_suffix is not None:
+        opens = apply_suffix(start_minutes, end_suffix)
+        closes = apply_suffix(end_minutes, end_suffix)
+        if opens > closes:
+            opens = apply_suffix(start_minutes, 'a')
+    elif start_suffix is not None and end_suffix is None:
+        opens = apply_suffix(start_minutes, start_suffix)
+        closes = apply_suffix(end_minutes, start_suffix)
+    elif start_suffix is None and end_suffix is None:
+        opens = start_minutes + 12 * 60 if 60 <= start_minutes < 7 * 60 else start_minutes
+        closes = end_minutes
+    else:
+        opens = apply_suffix(start_minutes, start_suffix)
+        closes = apply_suffix(end_minutes, end_suffix)
+
+    if closes == 0:
+        closes = 24 * 60
+    while closes <= opens and closes < 24 * 60:
+        closes = min(closes + 12 * 60, 24 * 60)
+    return (opens, closes)
+
+
+def weekday_range(first: int, last: int) -> int:
+    """
+    Returns the weekday mask for a range of days, wrapping past Sunday.
+
+    Args:
+        first (int): First weekday, 0 for Monday
+        last (int): Last weekday
+
+    Returns:
+        int: Weekday mask
+    """
+
+    mask = 0
+    day = first
+    while True:
+        mask |= 1 << day
+        if day == last:
+            return mask
+        day = (day + 1) % 7
+
+
+@lru_cache(maxsize=None)
+def parse_schedule(text: str) -> tuple:
+    """
+    Parses schedule text into structured schedules. Results are memoized by the raw text.
+    A new schedule starts when a date range or weekday follows the hours of the previous one.
+    Ordinals before a weekday, as in "1st and 3rd Saturday", limit the schedule to those
+    weekdays of the month.
+
+    Args:
+        text (str): Schedule text
+
+    Returns:
+        tuple: Schedules found in the text, empty when nothing could be parsed
+    """
+
+    tokens = tokenize(text)
+    schedules = []
+    state = {'start': None, 'end': None, 'weekdays': 0, 'hours': [], 'always': False, 'occurrences': set()}
+    ordinals = []
+
+    def has_days():
+        return state['weekdays'] or state['hours'] or state['always']
+
+    def flush(keep_dates: bool):
+        if state['start'] or has_days():
+            hours = list(state['hours'])
+            if state['always'] and not hours:
+                hours.append(FULL_DAY)
+            schedule = Schedule(state['start'], state['end'], state['weekdays'] or ALL_WEEKDAYS, tuple(hours),
+                                tuple(sorted(state['occurrences'])))
+            # Days mentioned again without hours repeat the previous schedule, and with an ordinal,
+            # e.g. "Saturdays 10-12, 2nd Saturday of every month", limit it to those weekdays.
+            previous = schedules[-1] if schedules else None
+            repeated = previous is not None and not hours and previous[:2] == schedule[:2] \
+                and not schedule.weekdays & ~previous.weekdays
+            if not repeated:
+                schedules.append(schedule)
+            elif schedule.occurrences:
+                occurrences = tuple(sorted(set(previous.occurrences) | set(schedule.occurrences)))
+                limited = previous._replace(weekdays=schedule.weekdays, occurrences=occurrences)
+                others = previous.weekdays & ~schedule.weekdays
+                schedules[-1:] = ([previous._replace(weekdays=others)] if others else []) + [limited]
+        state.update({'weekdays': 0, 'hours': [], 'always': False, 'occurrences': set()})
+        if not keep_dates:
+            state.update({'start': None, 'end': None})
+
+    def followed_by(index, kind):
+        return index + 2 < len(tokens) and tokens[index + 1][0] == 'dash' and tokens[index + 2][0] == kind
+
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        kind = token[0]
+        if kind not in ('ordinal', 'weekday'):
+            ordinals.clear()
+        if kind == 'month':
+            if has_days() or state['start']:
+                flush(False)
+            state['start'] = token[1:]
+            if followed_by(index, 'month'):
+                state['end'] = tokens[index + 2][1:]
+                index += 2
+        elif kind == 'weekday':
+            if state['hours']:
+                flush(True)
+            state['occurrences'].update(ordinals)
+            ordinals.clear()
+            if followed_by(index, 'weekday'):
+                state['weekdays'] |= weekday_range(token[1], tokens[index + 2][1])
+                index += 2
+            else:
+                state['weekdays'] |= 1 << token[1]
+        elif kind == 'time' and followed_by(index, 'time'):
+            state['hours'].append(resolve_hours(token[1:], tokens[index + 2][1:]))
+            index += 2
+        elif kind == 'ordinal':
+            ordinals.append(token[1])
+        elif kind == 'always':
+            state['always'] = True
+            if not state['weekdays']:
+                state['weekdays'] = ALL_WEEKDAYS
+        index += 1
+
+    flush(False)
+    return tuple(schedules)
+
+
+def get_day_mask(schedule: Schedule) -> int:
+    """
+    Builds the open slots of a schedule on one of its days, with a bit for every 15 minutes
+    starting at midnight. Schedules without hours are open the whole day.
+
+    Args:
+        schedule (Schedule): Schedule
+
+    Returns:
+        int: Daily slot mask
+    """
+
+    day_mask = 0
+    for opens, closes in schedule.hours or (FULL_DAY,):
+        first = opens // SLOT_MINUTES
+        last = -(-closes // SLOT_MINUTES)
+        day_mask |= ((1 << (last - first)) - 1) << first
+    return day_mask
+
+
+def get_week_mask(schedule: Schedule) -> int:
+    """
+    Builds the weekly open slots of a schedule, with a bit for every 15 minutes of the week
+    starting on Monday.
+
+    Args:
+        schedule (Schedule): Schedule
+
+    Returns:
+        int: Weekly slot mask
+    """
+
+    day_mask = get_day_mask(schedule)
+    mask = 0
+    for day in range(7):
+        if schedule.weekdays & (1 << day):
+            mask |= day_mask << (day * SLOTS_PER_DAY)
+    return mask
+
+
+def get_window(schedule: Schedule, default: tuple = None) -> tuple:
+    """
+    Returns the date range of a schedule as month/day numbers such as 601 for June 1.
+    Months without a day start on the first and end on the last day of the month, and
+    a schedule with only a start month runs to the end of the year.
+
+    Args:
+        schedule (Schedule): Schedule
+        default (tuple): Start and end (month, day) used when the schedule has no months
+
+    Returns:
+        tuple: Start and end month/day numbers
+    """
+
+    start, end = schedule.start, schedule.end
+    if start is None:
+        start, end = default or (YEAR_START, YEAR_END)
+    if end is None:
+        end = YEAR_END
+
+    start_day = start[1] or 1
+    end_day = end[1] or calendar.monthrange(2024, end[0])[1]
+    return (start[0] * 100 + start_day, end[0] * 100 + end_day)
+
+
+def get_occurrence_dates(schedule: Schedule, window: tuple, year: int) -> list:
+    """
+    Returns the dates an ordinal weekday schedule falls on within its date range.
+
+    Args:
+        schedule (Schedule): Schedule with occurrences
+        window (tuple): Start and end month/day numbers
+        year (int): Year of the calendar
+
+    Returns:
+        list: Month/day number and weekday of each date
+    """
+
+    dates = []
+    for month in range(1, 13):
+        month_start = date(year, month, 1).weekday()
+        month_days = calendar.monthrange(year, month)[1]
+        for weekday in range(7):
+            if not schedule.weekdays & (1 << weekday):
+                continue
+            days = range((weekday - month_start) % 7 + 1, month_days + 1, 7)
+            for occurrence in schedule.occurrences:
+                if occurrence <= len(days):
+                    month_day = month * 100 + days[occurrence - 1 if occurrence > 0 else occurrence]
+                    if in_window(*window, month_day):
+                        dates.append((month_day, weekday))
+    return dates
+
+
+def format_minutes(slot: int) -> str:
+    """
+    Formats the start of a slot as HHMM.
+
+    Args:
+        slot (int): Slot of the day
+
+    Returns:
+        str: Time such as 0930
+    """
+
+    return '%02d%02d' % divmod(slot * SLOT_MINUTES, 60)
+
+
+def encode_week_mask(mask: int) -> str:
+    """
+    Encodes a weekly slot mask as groups of the weekdays sharing the same hours, the weekday
+    bits in hex followed by the open HHMM-HHMM ranges, e.g. 1f/0900-1700 for Monday to Friday
+    9am to 5pm. The plain hex mask is used when it is shorter.
+
+    Args:
+        mask (int): Weekly slot mask
+
+    Returns:
+        str: Encoded mask
+    """
+
+    groups = {}
+    for day in range(7):
+        day_mask = mask >> (day * SLOTS_PER_DAY) & DAY_MASK
+        if day_mask:
+            groups[day_mask] = groups.get(day_mask, 0) | 1 << day
+
+    encoded = []
+    for day_mask, weekdays in groups.items():
+        runs = []
+        slot = 0
+        while slot < SLOTS_PER_DAY:
+            if day_mask >> slot & 1:
+                first = slot
+                while slot < SLOTS_PER_DAY and day_mask >> slot & 1:
+                    slot += 1
+                runs.append(f"{format_minutes(first)}-{format_minutes(slot)}")
+            slot += 1
+        encoded.append(f"{weekdays:x}/{RUN_SEPARATOR.join(runs)}")
+
+    compact = GROUP_SEPARATOR.join(encoded)
+    plain = f"{mask:x}"
+    return compact if len(compact) < len(plain) else plain
+
+
+def decode_week_mask(value: str) -> int:
+    """
+    Decodes a weekly slot mask written by encode_week_mask.
+
+    Args:
+        value (str): Encoded mask
+
+    Returns:
+        int: Weekly slot mask
+    """
+
+    if '/' not in value:
+        return int(value, 16)
+
+    mask = 0
+    for group in value.split(GROUP_SEPARATOR):
+        weekdays, runs = group.split('/')
+        day_mask = 0
+        for run in runs.split(RUN_SEPARATOR):
+            opens, closes = run.split('-')
+            first = (int(opens[:2]) * 60 + int(opens[2:])) // SLOT_MINUTES
+            last = (int(closes[:2]) * 60 + int(closes[2:])) // SLOT_MINUTES
+            day_mask |= ((1 << (last - first)) - 1) << first
+        weekdays = int(weekdays, 16)
+        for day in range(7):
+            if weekdays & (1 << day):
+                mask |= day_mask << (day * SLOTS_PER_DAY)
+    return mask
+
+
+def encode_open_hours(schedules, default: tuple = None, year: int = None) -> str:
+    """
+    Encodes schedules to the open hours index stored on the record.
+    Each entry is the date range followed by the encoded weekly slot mask,
+    e.g. 0601-0831:2/0900-1300, and schedules sharing a date range are combined.
+    Ordinal weekday schedules add a one day entry for every date they fall on.
+
+    Args:
+        schedules (iterable): Schedules
+        default (tuple): Start and end (month, day) used for schedules without months
+        year (int): Year the ordinal weekdays are placed in, defaults to the year of the run
+
+    Returns:
+        str: Open hours index, empty when there are no schedules
+    """
+
+    windows = {}
+    for schedule in schedules:
+        window = get_window(schedule, default)
+        if not schedule.occurrences:
+            windows[window] = windows.get(window, 0) | get_week_mask(schedule)
+            continue
+        year = year or context.get_run_context().evaluated_at.year
+        day_mask = get_day_mask(schedule)
+        for month_day, weekday in get_occurrence_dates(schedule, window, year):
+            windows[(month_day, month_day)] = windows.get((month_day, month_day), 0) \
+                | day_mask << (weekday * SLOTS_PER_DAY)
+    return ENTRY_SEPARATOR.join(f"{start:04d}-{end:04d}:{encode_week_mask(mask)}"
+                                for (start, end), mask in windows.items())
+
+
+@lru_cache(maxsize=4096)
+def decode_open_hours(value: str) -> tuple:
+    """
+    Decodes an open hours index.
+
+    Args:
+        value (str): Open hours index
+
+    Returns:
+        tuple: Start, end and weekly slot mask of each entry
+    """
+
+    entries = []
+    for entry in str(value or '').split(ENTRY_SEPARATOR):
+        if entry:
+            window, mask = entry.split(':')
+            start, end = window.split('-')
+            entries.append((int(start), int(end), decode_week_mask(mask)))
+    return tuple(entries)
+
+
+def in_window(start: int, end: int, month_day: int) -> bool:
+    """
+    Checks if a month/day number is inside a date range, which may wrap past the end of the year.
+
+    Args:
+        start (int): Start month/day
+        end (int): End month/day
+        month_day (int): Month/day to check
+
+    Returns:
+        bool: True/False
+    """
+
+    if start <= end:
+        return start <= month_day <= end
+    return month_day >= start or month_day <= end
+
+
+def is_open(value: str, when: datetime) -> bool | None:
+    """
+    Checks if a record's open hours index is open at a given time.
+
+    Args:
+        value (str): Open hours index
+        when (datetime): Time to check
+
+    Returns:
+        bool: True/False or None when the record has no open hours
+    """
+
+    entries = decode_open_hours(value)
+    if not entries:
+        return None
+
+    month_day = when.month * 100 + when.day
+    slot = when.weekday() * SLOTS_PER_DAY + (when.hour * 60 + when.minute) // SLOT_MINUTES
+    return any(in_window(start, end, month_day) and mask >> slot & 1 for start, end, mask in entries)
+
+
+def is_open_this_week(value: str, when: datetime) -> bool | None:
+    """
+    Checks if a record's open hours index is open on any day in the seven days from a given time.
+
+    Args:
+        value (str): Open hours index
+        when (datetime): Start of the week
+
+    Returns:
+        bool: True/False or None when the record has no open hours
+    """
+
+    entries = decode_open_hours(value)
+    if not entries:
+        return None
+
+    for offset in range(7):
+        day = when + timedelta(days=offset)
+        month_day = day.month * 100 + day.day
+        shift = day.weekday() * SLOTS_PER_DAY
+        if any(in_window(start, end, month_day) and mask >> shift & DAY_MASK for start, end, mask in entries):
+            return True
+    return False
+
+
+def set_open_hours(record: dict, texts: list, default: tuple = None, year: int = None) -> dict:
+    """
+    Parses the schedule texts of a record and stores the open hours index in open_hours.
+
+    Args:
+        record (dict): Common Record
+        texts (list): Schedule texts
+        default (tuple): Start and end (month, day) used for schedules without months
+        year (int): Year the ordinal weekdays are placed in, defaults to the year of the run
+
+    Returns:
+        dict: Updated Record
+    """
+
+    schedules = [schedule for text in texts or [] for schedule in parse_schedule(str(text))]
+    record['open_hours'] = encode_open_hours(schedules, default, year)
+    return record
@@ -0,0 +1,231 @@
+"""
+Compiled form of a JSON Schema built once per process and shared by every stage.
+The values derived from the schema are kept in memory keyed by the schema hash, so
+every copy of the same schema is only scanned once.
+"""
+
+import json
+import os
+
+from helpers import codegen, maputil, validation
+
+MAX_CACHED_SCHEMAS = 32
+
+# Types of the fields the merge does not combine.
+SKIP_TYPES = ('boolean', 'integer', 'number')
+
+_compiled = {}
+_loaded = {}
+_metadata = {}
+
+
+def get_skip_fields(properties: dict) -> list:
+    """
+    Returns the number, integer and boolean properties, which are not merged as text.
+
+    Args:
+        properties (dict): Schema properties
+
+    Returns:
+        list: List of field names
+    """
+
+    fields = []
+    for key, attributes in properties.items():
+        prop_type = attributes.get('type') or ''
+        if any(skip_type in prop_type for skip_type in SKIP_TYPES):
+            fields.append(key)
+    return fields
+
+
+def build_metadata(schema: dict) -> dict:
+    """
+    Derives the values the stages need from the schema.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        dict: Columns, defaults, types, skip fields and required fields
+    """
+
+    columns, defaults = maputil.get_record_defaults(schema)
+    return {
+        'columns': list(columns),
+        'defaults': list(defaults),
+        'types': maputil.get_field_types(schema),
+        'skip_fields': get_skip_fields(schema.get('properties', {})),
+        'required': list(schema.get('required', []))
+    }
+
+
+def load_metadata(schema: dict, digest: str) -> dict:
+    """
+    Returns the derived values for the schema hash, building them the first time the
+    hash is seen.
+
+    Args:
+        schema (dict): JSON Schema
+        digest (str): Schema hash
+
+    Returns:
+        dict: Derived values
+    """
+
+    metadata = _metadata.get(digest)
+    if metadata is None:
+        metadata = build_metadata(schema)
+        if len(_metadata) >= MAX_CACHED_SCHEMAS:
+            _metadata.clear()
+        _metadata[digest] = metadata
+    return metadata
+
+
+class CompiledSchema(dict):
+    """
+    A JSON Schema with the values every stage derives from it computed once.
+    It is still the schema dictionary, so it can be passed to any helper expecting
+    a schema, and it should not be changed after it has been compiled.
+    """
+
+    digest: str
+    columns: list
+    defaults: tuple
+    template: dict
+    types: dict
+    converters: dict
+    coercer: tuple
+    skip_fields: list
+    required: list
+
+    def __init__(self, schema: dict) -> None:
+        super().__init__(schema)
+        self.digest = codegen.schema_hash(schema)
+        metadata = load_metadata(schema, self.digest)
+        self.columns = list(metadata['columns'])
+        self.defaults = tuple(metadata['defaults'])
+        self.template = dict(zip(self.columns, self.defaults))
+        self.types = metadata['types']
+        self.coercer = maputil.build_coercer(self.types)
+        self.converters = dict(self.coercer)
+        self.skip_fields = metadata['skip_fields']
+        self.required = metadata['required']
+
+    @property
+    def validator(self):
+        """
+        Returns the compiled jsonschema validator for the schema.
+
+        Returns:
+            Validator: Compiled JSON Schema validator
+        """
+
+        return validation.get_validator(self)
+
+    def is_valid(self, record: dict) -> bool:
+        """
+        Checks if a record is valid using the fastest available validator.
+
+        Args:
+            record (dict): Record to validate
+
+        Returns:
+            bool: True/False
+        """
+
+        return validation.is_valid(self, record)
+
+    def new_record(self) -> dict:
+        """
+        Creates an empty record with the default values.
+
+        Returns:
+            dict: Empty Record
+        """
+
+        return dict(self.template)
+
+    def convert(self, record: dict) -> dict:
+        """
+        Converts the values of a record read from a file to the schema types.
+
+        Args:
+            record (dict): Record
+
+        Returns:
+            dict: Record
+        """
+
+        maputil.coerce_record(record, self.coercer)
+        return record
+
+    def normalize(self, record: dict) -> dict:
+        """
+        Converts the values of a record handed to the next stage in memory to the values it
+        would have after being written to a CSV file and read back: missing strings and
+        booleans become empty strings and False, and every other value is converted to the
+        schema type.
+
+        Args:
+            record (dict): Record
+
+        Returns:
+            dict: Record
+        """
+
+        for key, converter in self.coercer:
+            if key not in record:
+                continue
+            value = record[key]
+            if value is None:
+                if converter is str:
+                    record[key] = ''
+                elif converter is maputil.convert_boolean:
+                    record[key] = False
+            elif type(value) is not str or converter is not str:
+                record[key] = converter(value)
+        return record
+
+
+def compile_schema(schema: dict) -> CompiledSchema:
+    """
+    Returns the compiled form of a schema. Compiled schemas are returned unchanged and
+    every other schema is compiled once for each schema object.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        CompiledSchema: Compiled Schema
+    """
+
+    if isinstance(schema, CompiledSchema):
+        return schema
+
+    cached = _compiled.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    compiled = CompiledSchema(schema)
+    if len(_compiled) >= MAX_CACHED_SCHEMAS:
+        _compiled.clear()
+    _compiled[id(schema)] = (schema, compiled)
+    return compiled
+
+
+def load_schema(path: str) -> CompiledSchema:
+    """
+    Loads and compiles the schema file. The file is only read again when it changes.
+
+    Args:
+        path (str): Schema File path
+
+    Returns:
+        CompiledSchema: Compiled Schema
+    """
+
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    if key not in _loaded:
+        with open(path, 'r', encoding='utf-8') as input_file:
+            _loaded[key] = CompiledSchema(json.loads(input_file.read()))
+    return _loaded[key]
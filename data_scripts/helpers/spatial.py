@@ -0,0 +1,173 @@
+"""
+Grid index over record coordinates for finding records within a distance of each other.
+Coordinates are projected to meters at the latitude furthest from the equator, which never
+places two points further apart than they are. Each record is placed in a square cell as wide
+as the search distance, so only the records in the same and the eight neighbouring cells
+have to be compared, and the candidates are confirmed with the great circle distance, so
+whether two records are paired does not depend on the other records in the index.
+"""
+
+import math
+
+EARTH_RADIUS = 6371008.8
+
+NEIGHBOUR_CELLS = tuple((x, y) for x in (-1, 0, 1) for y in (-1, 0, 1))
+
+
+def has_coordinates(latitude, longitude) -> bool:
+    """
+    Checks if a latitude and longitude are usable, treating 0 as missing.
+
+    Args:
+        latitude (float): Latitude
+        longitude (float): Longitude
+
+    Returns:
+        bool: True/False
+    """
+
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return False
+    return latitude != 0 and longitude != 0 and -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+def distance(first: tuple, second: tuple) -> float:
+    """
+    Returns the great circle distance between two latitude/longitude points.
+
+    Args:
+        first (tuple): Latitude and longitude
+        second (tuple): Latitude and longitude
+
+    Returns:
+        float: Distance in meters
+    """
+
+    latitude_1, longitude_1 = map(math.radians, first)
+    latitude_2, longitude_2 = map(math.radians, second)
+    value = math.sin((latitude_2 - latitude_1) / 2) ** 2 \
+        + math.cos(latitude_1) * math.cos(latitude_2) * math.sin((longitude_2 - longitude_1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(value)))
+
+
+def get_scale(points: list) -> float:
+    """
+    Returns the scale of the longitudes in the projection, the cosine of the latitude furthest
+    from the equator, so projected distances are at most the great circle distance.
+
+    Args:
+        points (list): Latitude and longitude of each item, None for items without coordinates
+
+    Returns:
+        float: Cosine of the latitude
+    """
+
+    latitudes = [abs(point[0]) for point in points if point is not None]
+    return math.cos(math.radians(max(latitudes))) if latitudes else 1.0
+
+
+class GridIndex(object):
+    """
+    Grid of square cells holding the projected position of each point.
+    """
+
+    cell_size: float
+    coordinates: list
+    points: list
+    cells: dict
+
+    def __init__(self, points: list, cell_size: float) -> None:
+        """
+        Args:
+            points (list): Latitude and longitude of each item, None for items without coordinates
+            cell_size (float): Cell width in meters
+        """
+
+        self.cell_size = cell_size
+        self.coordinates = points
+        scale = get_scale(points)
+        self.points = [None if point is None else self.project(point, scale) for point in points]
+        self.cells = {}
+        for item, point in enumerate(self.points):
+            if point is not None:
+                self.cells.setdefault(self.get_cell(point), []).append(item)
+
+    @staticmethod
+    def project(point: tuple, scale: float) -> tuple:
+        """
+        Projects a latitude/longitude to meters with an equirectangular projection.
+
+        Args:
+            point (tuple): Latitude and longitude
+            scale (float): Cosine of the reference latitude
+
+        Returns:
+            tuple: x and y in meters
+        """
+
+        return (math.radians(point[1]) * EARTH_RADIUS * scale, math.radians(point[0]) * EARTH_RADIUS)
+
+    def get_cell(self, point: tuple) -> tuple:
+        """
+        Returns the cell containing a projected point.
+
+        Args:
+            point (tuple): x and y in meters
+
+        Returns:
+            tuple: Cell column and row
+        """
+
+        return (math.floor(point[0] / self.cell_size), math.floor(point[1] / self.cell_size))
+
+    def pairs(self, max_distance: float = None):
+        """
+        Generates every pair of items within the great circle distance of each other,
+        each pair once with the lower item first.
+
+        Args:
+            max_distance (float): Distance in meters, defaults to the cell size
+
+        Returns:
+            generator: Item number pairs
+        """
+
+        max_distance = self.cell_size if max_distance is None else max_distance
+        limit = max_distance * max_distance
+        points = self.points
+        coordinates = self.coordinates
+        for (column, row), items in self.cells.items():
+            for offset_column, offset_row in NEIGHBOUR_CELLS:
+                others = self.cells.get((column + offset_column, row + offset_row))
+                if not others:
+                    continue
+                for item in items:
+                    x, y = points[item]
+                    for other in others:
+                        if other <= item:
+                            continue
+                        dx = points[other][0] - x
+                        dy = points[other][1] - y
+                        # The projected distance is at most the great circle distance, so it only drops pairs that are too far.
+                        if dx * dx + dy * dy <= limit and distance(coordinates[item], coordinates[other]) <= max_distance:
+                            yield (item, other)
+
+
+def nearby_pairs(points: list, max_distance: float):
+    """
+    Generates the pairs of points within a distance of each other.
+
+    Args:
+        points (list): Latitude and longitude of each item, None for items without coordinates
+        max_distance (float): Distance in meters
+
+    Returns:
+        generator: Item number pairs
+    """
+
+    if max_distance <= 0:
+        return iter(())
+    return GridIndex(points, max_distance).pairs()
@@ -2,16 +2,100 @@
 Helper that leverages JSON Schema to validate Records
 """
 
-import jsonschema
-from jsonschema.exceptions import ValidationError
+from jsonschema import validators
+from jsonschema.exceptions import best_match
+
+from helpers import codegen, metrics
+
+MAX_CACHED_VALIDATORS = 32
+
+# Error codes are stored in data_issues as field:rule separated by semi-colons.
+ISSUE_SEPARATOR = ';'
+RECORD_FIELD = 'record'
+COORDINATES_ERROR = 'coordinates:region'
+COORDINATE_FIELDS = {'latitude', 'longitude'}
+
+# Compiled validators keyed by the id of the schema object they were built from.
+_validators = {}
+_fast_validators = {}
+_field_validators = {}
+
+
+def get_validator(schema: dict):
+    """
+    Returns the compiled validator for a schema. The schema is checked and the
+    validator built once for each schema object, so the schema should not be
+    changed after it has been used for validation.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        Validator: Compiled JSON Schema validator
+    """
+
+    cached = _validators.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    validator_class = validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    validator = validator_class(schema)
+
+    if len(_validators) >= MAX_CACHED_VALIDATORS:
+        _validators.clear()
+    _validators[id(schema)] = (schema, validator)
+    return validator
+
+
+def get_fast_validator(schema: dict):
+    """
+    Returns the fastest available function for checking if a record is valid.
+    Schemas supported by the code generator use the generated function, any
+    other schema uses the compiled jsonschema validator.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        callable: Function accepting a record and returning True/False
+    """
+
+    cached = _fast_validators.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    validator = get_validator(schema)
+    check = codegen.get_validator(schema) or validator.is_valid
+
+    if len(_fast_validators) >= MAX_CACHED_VALIDATORS:
+        _fast_validators.clear()
+    _fast_validators[id(schema)] = (schema, check)
+    return check
+
+
+def is_valid(schema: dict, record: dict) -> bool:
+    """
+    Checks if a record is valid without building any error messages.
+
+    Args:
+        schema (dict): JSON Schema
+        record (dict): Record to validate
+
+    Returns:
+        bool: True/False
+    """
+
+    return get_fast_validator(schema)(record)
 
 
 def validate(schema: dict, record: dict) -> dict:
     """
     Validates a provided record against a JSON Schema.
+    Error messages are only built for invalid records.
 
     Args:
-        schema_path (dict): JSON Schema
+        schema (dict): JSON Schema
         record (dict): Record to validate
 
     Returns:
@@ -19,17 +103,174 @@ def validate(schema: dict, record: dict) -> dict:
         Error Messages.
     """
 
-    try:
-        jsonschema.validate(record, schema)
+    if get_fast_validator(schema)(record):
         return {
             'valid': True,
             'errors': ''
         }
-    except ValidationError as e:
-        return {
-            'valid': False,
-            'errors': f"{e.json_path} is invalid: {e.message}"
-        }
+
+    error = best_match(get_validator(schema).iter_errors(record))
+    return {
+        'valid': False,
+        'errors': f"{error.json_path} is invalid: {error.message}"
+    }
+
+
+def get_field_validators(schema: dict) -> dict:
+    """
+    Returns a compiled validator for the value of each property in the schema.
+
+    Args:
+        schema (dict): JSON Schema
+
+    Returns:
+        dict: Property name mapped to the validator of its value
+    """
+
+    cached = _field_validators.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+
+    validator_class = validators.validator_for(schema)
+    field_validators = {
+        field: validator_class(attributes)
+        for field, attributes in schema.get('properties', {}).items()
+    }
+
+    if len(_field_validators) >= MAX_CACHED_VALIDATORS:
+        _field_validators.clear()
+    _field_validators[id(schema)] = (schema, field_validators)
+    return field_validators
+
+
+def get_error_codes(schema: dict, record: dict) -> set:
+    """
+    Returns the error code of every schema rule the record breaks.
+
+    Args:
+        schema (dict): JSON Schema
+        record (dict): Record to validate
+
+    Returns:
+        set: Error codes as field:rule
+    """
+
+    codes = set()
+    for error in get_validator(schema).iter_errors(record):
+        if error.path:
+            codes.add(f"{error.path[0]}:{error.validator}")
+        elif error.validator == 'required' and isinstance(record, dict):
+            codes.update(f"{field}:required" for field in error.validator_value if field not in record)
+        else:
+            codes.add(f"{RECORD_FIELD}:{error.validator}")
+    return codes
+
+
+def get_field_error_codes(schema: dict, record: dict, field: str) -> set:
+    """
+    Returns the error codes for a single field of the record.
+
+    Args:
+        schema (dict): JSON Schema
+        record (dict): Record to validate
+        field (str): Field to validate
+
+    Returns:
+        set: Error codes as field:rule
+    """
+
+    if field not in record:
+        return {f"{field}:required"} if field in schema.get('required', []) else set()
+
+    validator = get_field_validators(schema).get(field)
+    if validator is None or validator.is_valid(record[field]):
+        return set()
+    return {f"{field}:{error.validator}" for error in validator.iter_errors(record[field])}
+
+
+def get_coordinate_codes(record: dict) -> set:
+    """
+    Returns the coordinates error code when numeric coordinates are outside the service area.
+
+    Args:
+        record (dict): Record to validate
+
+    Returns:
+        set: Error codes
+    """
+
+    latitude = record.get('latitude')
+    longitude = record.get('longitude')
+    for value in (latitude, longitude):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return set()
+    if validate_latitude(latitude) and validate_longitude(longitude):
+        return set()
+    return {COORDINATES_ERROR}
+
+
+def get_issue_codes(record: dict) -> set:
+    """
+    Returns the error codes carried in the data_issues of a record.
+
+    Args:
+        record (dict): Record
+
+    Returns:
+        set: Error codes
+    """
+
+    issues = record.get('data_issues') or ''
+    return {code.strip() for code in str(issues).split(ISSUE_SEPARATOR) if code.strip()}
+
+
+def set_issue_codes(record: dict, codes: set) -> dict:
+    """
+    Stores the validation result on the record, setting in_error when there are error codes.
+
+    Args:
+        record (dict): Record
+        codes (set): Error codes
+
+    Returns:
+        dict: Record
+    """
+
+    record['in_error'] = bool(codes)
+    record['data_issues'] = ISSUE_SEPARATOR.join(sorted(codes))
+    return record
+
+
+@metrics.timed(metrics.VALIDATE)
+def validate_record(schema: dict, record: dict, fields: list = None) -> bool:
+    """
+    Validates a record and stores the result on it as the in_error flag and the
+    error codes in data_issues. When fields are provided only those fields are
+    validated again and the codes carried for every other field are kept.
+
+    Args:
+        schema (dict): JSON Schema
+        record (dict): Record to validate
+        fields (list): Fields changed since the record was last validated
+
+    Returns:
+        bool: True/False
+    """
+
+    if fields is None:
+        codes = set() if is_valid(schema, record) else get_error_codes(schema, record)
+        codes.update(get_coordinate_codes(record))
+    else:
+        fields = set(fields)
+        codes = {code for code in get_issue_codes(record) if code.split(':')[0] not in fields}
+        for field in fields:
+            codes.update(get_field_error_codes(schema, record, field))
+        if fields & COORDINATE_FIELDS:
+            codes.discard(COORDINATES_ERROR)
+            codes.update(get_coordinate_codes(record))
+
+    set_issue_codes(record, codes)
+    return not codes
 
 
 def validate_longitude(longitude: float) -> bool:
@@ -0,0 +1,56 @@
+"""
+Shared HTTP session for the web services and geocoder. Reusing one session keeps the
+connections to each host open between requests, and lets a pipeline run in one process
+share them across every source. Every request gets a timeout, so a service that stops
+answering fails the request instead of holding up the run.
+"""
+
+import os
+
+import requests
+
+from helpers import metrics
+
+REQUEST_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 120))
+
+_session = None
+
+
+class TimeoutSession(requests.Session):
+    """
+    Session passing REQUEST_TIMEOUT to every request made without a timeout, and recording
+    every request as a fetch of the running stage with the bytes it downloaded.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        with metrics.span(metrics.FETCH):
+            response = super().request(method, url, **kwargs)
+            if not kwargs.get('stream'):
+                metrics.count(metrics.BYTES_DOWNLOADED, len(response.content))
+        return response
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared session, creating it on first use.
+
+    Returns:
+        Session: HTTP session
+    """
+
+    global _session
+    if _session is None:
+        _session = TimeoutSession()
+    return _session
+
+
+def close_session() -> None:
+    """
+    Closes the shared session and its connections.
+    """
+
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
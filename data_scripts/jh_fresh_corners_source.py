@@ -4,11 +4,10 @@ Google Docs.
 """
 
 import csv
-import json
 import logging
 import os
 
-from helpers import gis, maputil, validation, mapbox
+from helpers import gis, maputil, validation, mapbox, schemas, identity, columnar, metrics
 from helpers.rules import RulesEngine
 
 RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
@@ -22,20 +21,6 @@ DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
 def get_coordinates(mapped_record: dict) -> dict:
     """
     Retrieves the Latitude and Longitude from the address.
@@ -50,12 +35,13 @@ def get_coordinates(mapped_record: dict) -> dict:
     return mapbox.get_coordinates(MAPBOX_KEY, address)
 
 
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output.
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file.
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -67,6 +53,7 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
 
 
 def map_record(record: dict, schema: dict) -> dict:
@@ -107,41 +94,53 @@ def map_record(record: dict, schema: dict) -> dict:
     return RulesEngine(mapped_record).apply_global_rules().apply_fresh_corners_rules().commit()
 
 
-def main():
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the Fresh Corners Stores from the Google Sheet
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the Fresh Corners Stores from the Google Sheet
     logging.info(f"RETRIVING FRESH CORNERS STORES FROM GOOGLE SHEET...")
     stores = gis.get_google_sheet_csv(
         '1QwWXDMzNc7X-krErCwuzTHgXfiru-U99jJeJ6nk9hko', '0')
-    schema = load_schema(SCHEMA_FILE)
     logging.info(f"RETRIEVED {len(stores)} ENTRIES TO CONVERT.")
     records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for store in stores:
-        # Map the Record
-        mapped_record = map_record(store, schema)
-
-        # Add the Id
-        mapped_record['id'] = row_number
-
-        # Validate the record
-        result = validation.validate(schema, mapped_record)
-        if not result.get('valid', True):
-            mapped_record['in_error'] = True
-            mapped_record['data_issues'] = result.get('errors', '')
-            error_records = error_records + 1
-
-        # Add it to the Collection
-        records.append(mapped_record)
-        row_number = row_number + 1
+    metrics.count(metrics.RECORDS_IN, len(stores))
+    with metrics.span(metrics.MAP):
+        for store in stores:
+            # Map the Record
+            mapped_record = map_record(store, schema)
+
+            # Add the Id
+            mapped_record['id'] = ids.next_id(mapped_record)
+
+            # Validate the record
+            validation.validate_record(schema, mapped_record)
+
+            # Add it to the Collection
+            records.append(mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING FRESH CORNERS STORES FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info('DONE PROCESSING RAW FRESH CORNERS STORES SOURCE INFORMATION')
 
 
@@ -2,12 +2,14 @@
 Merges the cleaned prep csv files to a single Source file for the Web Site.
 """
 
+import contextlib
 import csv
-import json
 import logging
 import os
+import shutil
+import tempfile
 
-from helpers import validation
+from helpers import columnar, errors, identity, merge, validation, schemas
 
 logging.basicConfig(level=logging.INFO)
 
@@ -17,104 +19,333 @@ INPUT_DIRECTORY = 'food-data/raw-sources'
 OUTPUT_DIRECTORY = 'food-data/merged-data'
 OUTPUT_FILE = 'merged-raw-sources.csv'
 INVALID_FILE = 'invalid-raw-sources.csv'
+ERROR_INDEX_FILE = 'error-index.json'
 
 DELIMITER = '|'
 
+# Processes reading raw files, a single process reads the files in turn.
+MERGE_WORKERS = int(os.environ.get('MERGE_WORKERS', 1))
 
-def get_schema(path: str) -> dict:
+
+def validate_coordinates(record: dict):
+    """
+    Validates that the coordinates are in the correct range.
+
+    Args:
+        record (dict): Sets the Latitude and Longitude to 0 if not valid.
+    """
+
+    codes = validation.get_issue_codes(record)
+    if validation.COORDINATES_ERROR in codes or not validation.validate_latitude(float(record.get('latitude', 0))) or not validation.validate_longitude(float(record.get('longitude', 0))):
+        codes.add(validation.COORDINATES_ERROR)
+        validation.set_issue_codes(record, codes)
+        record['longitude'] = 0
+        record['latitude'] = 0
+
+
+def is_mergeable(record: dict) -> bool:
+    """
+    Checks if a record has coordinates and is active, so it is merged instead of being output as invalid.
+
+    Args:
+        record (dict): Raw Record
+
+    Returns:
+        bool: True/False
     """
-    Loads the JSON Schema from the file.
+
+    return record.get('longitude', 0) != 0 and record.get('latitude', 0) != 0 and str(record.get('active_record', False)) == 'True'
+
+
+def get_input_files(files: list, typed: bool = False) -> list:
+    """
+    Returns the raw files to read in name order. Typed columnar files are read instead
+    of the CSV file with the same name when typed is set, and never read otherwise.
 
     Args:
-        path (str): path to the schema
+        files (list): Names of the files in the raw files directory
+        typed (bool): Read the typed columnar files
 
     Returns:
-        dict: Dictionary of Schema
+        list: Raw file names
     """
 
+    selected = {}
+    for file in files:
+        if columnar.is_columnar(file) and not typed:
+            continue
+        name = columnar.get_export_name(file)
+        if name not in selected or columnar.is_columnar(file):
+            selected[name] = file
+    return [selected[name] for name in sorted(selected)]
+
+
+def read_file(path: str):
+    """
+    Reads the records of a raw file one row at a time.
+
+    Args:
+        path (str): Raw file path
+
+    Returns:
+        generator: Records
+    """
+
+    if columnar.is_columnar(path):
+        yield from columnar.read_records(path)
+        return
     with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
+        yield from csv.DictReader(input_file, delimiter=DELIMITER)
 
 
-def get_columns(schema: dict) -> list:
+def stream_records(directory: str, files: list, error_index: errors.ErrorIndex):
     """
-    Creates a column list from the schema.
+    Streams the records of the raw files through the id assignment, coordinate validation
+    and error index.
 
     Args:
-        schema (dict): JSON Schema
+        directory (str): Raw files directory
+        files (list): Raw file names, in the order they are read
+        error_index (ErrorIndex): Index the error codes are added to
 
     Returns:
-        list: list of columns names
+        generator: Record and whether it is merged
     """
 
-    properties = schema.get('properties', {})
-    columns = []
-    for key in properties.keys():
-        columns.append(key)
-    return columns
+    batches = ((columnar.get_export_name(file), read_file(os.path.join(directory, file))) for file in files)
+    return stream_batches(batches, error_index)
 
 
-def validate_coordinates(record: dict):
+def stream_batches(batches, error_index: errors.ErrorIndex):
     """
-    Validates that the coordinates are in the correct range.
+    Streams batches of raw records, read from a file or handed over in memory, through the
+    id assignment, coordinate validation and error index. Every record gets its deterministic
+    id, so the same raw records always produce the same merged records. Several sources share
+    a source_file or source URL, so the raw file name is part of every key, and one assigner
+    numbers the records of every batch so the ids are unique across the run.
 
     Args:
-        record (dict): Sets the Latitude and Longitude to 0 if not valid.
+        batches (iterable): Raw file name and the records of each source, in the order they are merged
+        error_index (ErrorIndex): Index the error codes are added to, under the raw file name
+
+    Returns:
+        generator: Record and whether it is merged
     """
 
-    if not validation.validate_latitude(float(record.get('latitude', 0))) or not validation.validate_longitude(float(record.get('longitude', 0))):
-        data_issues = f"{record.get('data_issues', '')};Invalid Lat/Long:{record.get('latitude')}/{record.get('longitude')}"
-        record['data_issues'] = data_issues
-        record['longitude'] = 0
-        record['latitude'] = 0
-        record['in_error'] = True
+    ids = identity.IdAssigner()
+    for name, records in batches:
+        logging.info(f"MERGING FILE {name}")
+        for record in records:
+            record['id'] = ids.next_id(record, name)
+            validate_coordinates(record)
+            error_index.add_record(record, name)
+            yield record, is_mergeable(record)
+
+
+class RecordWriter(object):
+    """
+    Writes records to a pipe delimited file as they arrive. The file is only created when
+    the first record is written, so an existing file is kept when there is nothing to write.
+    """
+
+    path: str
+    columns: list
+    count: int
+
+    def __init__(self, path: str, columns: list) -> None:
+        self.path = path
+        self.columns = columns
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """
+        Creates the file and writes the header, unless the file is already open.
+        """
+
+        if self._writer is None:
+            logging.info(f"OUTPUTING {self.path}")
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=self.columns, delimiter=DELIMITER)
+            self._writer.writeheader()
+
+    def write(self, record: dict) -> None:
+        """
+        Writes a record, creating the file for the first one.
+
+        Args:
+            record (dict): Record
+        """
+
+        self.open()
+        self._writer.writerow(record)
+        self.count += 1
+
+    def append(self, path: str, count: int) -> None:
+        """
+        Appends the rows of a file written with the same columns, without parsing them again.
+
+        Args:
+            path (str): File path
+            count (int): Number of records in the file
+        """
+
+        if not count:
+            return
+        self.open()
+        with open(path, 'r', newline='', encoding='utf-8') as part_file:
+            part_file.readline()
+            shutil.copyfileobj(part_file, self._file)
+        self.count += count
+
+    def close(self) -> None:
+        """
+        Closes the file.
+        """
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+def open_writers(stack: contextlib.ExitStack, directory: str, types: dict, typed: bool = False) -> dict:
+    """
+    Opens the writers of the merged and invalid records, and of the typed copy of the
+    merged records when typed is set. The files are only created once they get a record.
+
+    Args:
+        stack (ExitStack): Stack closing the writers
+        directory (str): Output directory
+        types (dict): Column name mapped to the schema type
+        typed (bool): Write the typed columnar copy of the merged records
+
+    Returns:
+        dict: Writers by kind
+    """
+
+    columns = list(types)
+    writers = {
+        'merged': stack.enter_context(RecordWriter(os.path.join(directory, OUTPUT_FILE), columns)),
+        'invalid': stack.enter_context(RecordWriter(os.path.join(directory, INVALID_FILE), columns))
+    }
+    if typed:
+        writers['typed'] = stack.enter_context(
+            columnar.ColumnarWriter(os.path.join(directory, columnar.get_typed_name(OUTPUT_FILE)), types))
+    return writers
+
+
+def write_record(writers: dict, record: dict, mergeable: bool) -> None:
+    """
+    Writes a record to the open writers of the merged or invalid records.
+
+    Args:
+        writers (dict): Writers by kind
+        record (dict): Record
+        mergeable (bool): Whether the record is merged
+    """
+
+    for kind in (('merged', 'typed') if mergeable else ('invalid',)):
+        if kind in writers:
+            writers[kind].write(record)
+
+
+def ingest_file(directory: str, file: str, spool_directory: str, types: dict, typed: bool) -> dict:
+    """
+    Reads a single raw file into its own part files, in a worker process.
+
+    Args:
+        directory (str): Raw files directory
+        file (str): Raw file name
+        spool_directory (str): Directory the part files are written to
+        types (dict): Column name mapped to the schema type
+        typed (bool): Write the typed columnar copy of the merged records
+
+    Returns:
+        dict: Path and record count of each part, and the file's error index entries
+    """
+
+    part_directory = os.path.join(spool_directory, file)
+    os.makedirs(part_directory)
+    error_index = errors.ErrorIndex()
+    with contextlib.ExitStack() as stack:
+        writers = open_writers(stack, part_directory, types, typed)
+        for record, mergeable in stream_records(directory, [file], error_index):
+            write_record(writers, record, mergeable)
+
+    return {
+        'parts': {kind: (writer.path, writer.count) for kind, writer in writers.items()},
+        'errors': error_index.to_dict()
+    }
+
+
+def ingest_parallel(directory: str, files: list, writers: dict, error_index: errors.ErrorIndex,
+                    types: dict, workers: int) -> None:
+    """
+    Reads the raw files in a pool of processes. Every file is parsed and validated on its own,
+    and the parts are appended in the order of the files, so the output is the same as reading
+    the files in turn. The raw file name is part of every id key, so ids assigned in different
+    processes do not repeat keys of another file. The pool starts its workers the same way as
+    the de-duplication pool, without forking the threads of the pipeline.
+
+    Args:
+        directory (str): Raw files directory
+        files (list): Raw file names, in the order they are read
+        writers (dict): Writers by kind
+        error_index (ErrorIndex): Index the error codes are added to
+        types (dict): Column name mapped to the schema type
+        workers (int): Number of processes
+    """
+
+    count = len(files)
+    typed = 'typed' in writers
+    with tempfile.TemporaryDirectory() as spool_directory, \
+            merge.get_executor(workers) as executor:
+        results = executor.map(ingest_file, [directory] * count, files, [spool_directory] * count,
+                               [types] * count, [typed] * count)
+        for result in results:
+            for kind, (path, records) in result['parts'].items():
+                writers[kind].append(path, records)
+            error_index.update(result['errors'])
 
 
 def main():
     """
-    Merges the files together into a single raw file.
+    Merges the files together into a single raw file. Records are streamed from the raw
+    files straight to the merged and invalid files, so memory does not grow with the input.
     """
 
     logging.info(f"MERGING RAW FILES IN {INPUT_DIRECTORY}")
     logging.info(f"LOADING SCHEMA: {SCHEMA_FILE}")
 
-    schema = get_schema(SCHEMA_FILE)
-    columns = get_columns(schema)
-
-    csv.register_dialect('input', delimiter=DELIMITER)
+    schema = schemas.load_schema(SCHEMA_FILE)
+    types = dict(schema.types)
+    typed = columnar.ENABLED
 
     if not os.path.exists(OUTPUT_DIRECTORY):
         os.makedirs(OUTPUT_DIRECTORY)
 
-    files = os.listdir(INPUT_DIRECTORY)
-    records = []
-    invalid_records = []
-    for file in files:
-        path = os.path.join(INPUT_DIRECTORY, file)
-        logging.info(f"MERGING FILE {file}")
-        with open(path, 'r', encoding='utf-8') as input_file:
-            reader = csv.DictReader(input_file, dialect='input')
-            for record in reader:
-                validate_coordinates(record)
-                if record.get('longitude', 0) != 0 and record.get('latitude', 0) != 0 and record.get('active_record', 'False') == 'True':
-                    records.append(record)
-                else:
-                    invalid_records.append(record)
-
-    if invalid_records:
-        logging.info(f"OUTPUTING INVALID RAW RECORDS {INVALID_FILE}")
-        with open(os.path.join(OUTPUT_DIRECTORY, INVALID_FILE), 'w', newline='', encoding='utf-8') as output_file:
-            writer = csv.DictWriter(
-                output_file, fieldnames=columns, dialect='input')
-            writer.writeheader()
-            writer.writerows(invalid_records)
-    if records:
-        logging.info(f"OUTPUTING MERGED RAW FILE {OUTPUT_FILE}")
-        with open(os.path.join(OUTPUT_DIRECTORY, OUTPUT_FILE), 'w', newline='', encoding='utf-8') as output_file:
-            writer = csv.DictWriter(
-                output_file, fieldnames=columns, dialect='input')
-            writer.writeheader()
-            writer.writerows(records)
+    files = get_input_files(os.listdir(INPUT_DIRECTORY), typed)
+    error_index = errors.ErrorIndex()
+    with contextlib.ExitStack() as stack:
+        writers = open_writers(stack, OUTPUT_DIRECTORY, types, typed)
+        if MERGE_WORKERS > 1 and len(files) > 1:
+            logging.info(f"READING {len(files)} FILES WITH {MERGE_WORKERS} WORKERS")
+            ingest_parallel(INPUT_DIRECTORY, files, writers, error_index, types, MERGE_WORKERS)
+        else:
+            for record, mergeable in stream_records(INPUT_DIRECTORY, files, error_index):
+                write_record(writers, record, mergeable)
+
+    logging.info(f"MERGED {writers['merged'].count} RECORDS, {writers['invalid'].count} INVALID RECORDS")
+    logging.info(f"OUTPUTING ERROR INDEX {ERROR_INDEX_FILE} WITH {error_index.total()} ERRORS")
+    error_index.write(os.path.join(OUTPUT_DIRECTORY, ERROR_INDEX_FILE), replace=True)
 
     logging.info('DONE')
 
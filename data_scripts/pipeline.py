@@ -0,0 +1,558 @@
+"""
+Runs the whole data pipeline in a single process: every source, the merge, the de-duplication
+and the staging of the files. The stages share one interpreter, so the modules, the compiled
+schema, the HTTP session and the memoized parsers are only loaded once, and the records of
+each stage are handed to the next in memory instead of through the raw and merged CSV files.
+
+The stages form a graph run by the dag helper: the sources do not depend on each other and
+run at the same time, the merge waits for all of them, and the de-duplication and staging
+follow in turn. Sources that fail are retried, and the run logs its critical path.
+
+Runs are incremental: the fingerprints of every stage are kept in a manifest next to the
+merged data, and a stage whose code, schema and input records have not changed since the last
+run reuses its previous output. The web sources always run, as their data can only be known by
+fetching it, but sources reading files in the repository, the merge, the de-duplication and the
+staging are skipped when nothing they read changed. Setting INCREMENTAL to 0 runs every stage.
+
+Every run writes a report with the timings, record counts, errors, bytes and cache hits of each
+stage next to the merged data, and appends a summary of the run to a trend file.
+
+Every source that returns records writes its raw file, so a source failing to return records
+in a later run falls back to its latest data. Setting the WRITE_INTERMEDIATES environment
+variable also writes the merged file, for debugging.
+"""
+
+import contextlib
+import logging
+import os
+from datetime import datetime, timezone
+
+import de_duplication
+import fmnp_source
+import gpcfb_source
+import grow_pgh_source
+import jh_bridgeway_capital_source
+import jh_fresh_access_source
+import jh_fresh_corners_source
+import manual_source
+import merge_data
+import snap_source
+import stage_files
+import summer_meal_source
+import wic_source
+from helpers import columnar, context, dag, errors, fingerprint, merge, metrics, schedule, schemas, web
+
+logging.basicConfig(level=logging.INFO)
+
+SCHEMA_FILE = 'food-data/schema/map-data-schema.json'
+
+WRITE_INTERMEDIATES = os.environ.get('WRITE_INTERMEDIATES', '').lower() in ('1', 'true', 'yes')
+INCREMENTAL = os.environ.get('INCREMENTAL', '1').lower() in ('1', 'true', 'yes')
+
+FINGERPRINT_FILE = os.path.join(merge_data.OUTPUT_DIRECTORY, 'pipeline-fingerprints.json')
+REPORT_FILE = os.path.join(merge_data.OUTPUT_DIRECTORY, 'run-report.json')
+TREND_FILE = os.path.join(merge_data.OUTPUT_DIRECTORY, 'run-trend.ndjson')
+CODE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Sources in the order the workflow ran them.
+SOURCES = (
+    fmnp_source,
+    gpcfb_source,
+    grow_pgh_source,
+    jh_fresh_access_source,
+    jh_fresh_corners_source,
+    jh_bridgeway_capital_source,
+    snap_source,
+    summer_meal_source,
+    wic_source,
+    manual_source
+)
+
+# Stages run at the same time, enough for every source by default.
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', len(SOURCES)))
+SOURCE_RETRIES = int(os.environ.get('SOURCE_RETRIES', 2))
+SOURCE_TIMEOUT = float(os.environ.get('SOURCE_TIMEOUT', 900))
+
+MERGE_STAGE = 'merge'
+DEDUPLICATION_STAGE = 'deduplicate'
+STAGE_FILES_STAGE = 'stage_files'
+
+
+class Session(object):
+    """
+    State shared by the stages of a run.
+    """
+
+    schema: schemas.CompiledSchema
+    write_intermediates: bool
+    incremental: bool
+    run_context: context.RunContext
+
+    def __init__(self, schema_file: str = SCHEMA_FILE, write_intermediates: bool = None,
+                 incremental: bool = None) -> None:
+        """
+        Args:
+            schema_file (str): Schema file path
+            write_intermediates (bool): Write the merged file, defaults to WRITE_INTERMEDIATES
+            incremental (bool): Reuse the output of unchanged stages, defaults to INCREMENTAL
+        """
+
+        self.schema = schemas.load_schema(schema_file)
+        self.write_intermediates = WRITE_INTERMEDIATES if write_intermediates is None else write_intermediates
+        self.incremental = INCREMENTAL if incremental is None else incremental
+        # Every source of the run evaluates the seasons at the instant the run started.
+        self.run_context = context.set_run_context(context.RunContext())
+
+    @property
+    def http(self):
+        """
+        Returns the HTTP session shared by the sources.
+
+        Returns:
+            Session: HTTP session
+        """
+
+        return web.get_session()
+
+    def close(self) -> None:
+        """
+        Closes the HTTP session and ends the run context.
+        """
+
+        web.close_session()
+        if context.get_run_context() is self.run_context:
+            context.set_run_context(None)
+
+
+def has_static_inputs(source) -> bool:
+    """
+    Checks if a source only reads files in the repository, listed in its INPUT_FILES, so
+    its output only changes when those files or the code change.
+
+    Args:
+        source (module): Source script
+
+    Returns:
+        bool: True/False
+    """
+
+    return bool(getattr(source, 'INPUT_FILES', ()))
+
+
+def get_raw_path(source) -> str:
+    """
+    Returns the path of the raw file of a source, the typed file when the columnar format
+    is enabled and the file exists.
+
+    Args:
+        source (module): Source script
+
+    Returns:
+        str: Raw file path
+    """
+
+    path = os.path.join(source.RAW_OUTPUT_FOLDER, source.RAW_OUTPUT_FILE)
+    typed_path = columnar.get_typed_name(path)
+    if columnar.ENABLED and os.path.exists(typed_path):
+        return typed_path
+    return path
+
+
+def load_previous(source) -> list:
+    """
+    Loads the last raw file written by a source.
+
+    Args:
+        source (module): Source script
+
+    Returns:
+        list: Raw records, empty when the source never wrote a file
+    """
+
+    path = get_raw_path(source)
+    if not os.path.exists(path):
+        return []
+    logging.info(f"NO NEW ENTRIES, USING THE PREVIOUS FILE {path}")
+    return list(merge_data.read_file(path))
+
+
+def run_source(session: Session, source) -> tuple:
+    """
+    Runs a source and converts its records to the values the merge reads from a raw file.
+    The records are always written to the source's raw file, so a source without records
+    falls back to its latest raw file, like the merge of the separate scripts did.
+
+    Args:
+        session (Session): Run session
+        source (module): Source script
+
+    Returns:
+        tuple: Raw file name and records
+    """
+
+    records = source.get_records(session.schema)
+    if records:
+        with metrics.span(metrics.WRITE):
+            source.write_output(records, session.schema)
+        raw_path = os.path.join(source.RAW_OUTPUT_FOLDER, source.RAW_OUTPUT_FILE)
+        metrics.count(metrics.BYTES_WRITTEN, metrics.get_file_sizes([raw_path, columnar.get_typed_name(raw_path)]))
+    if not records:
+        records = load_previous(source)
+    for record in records:
+        session.schema.normalize(record)
+    metrics.count(metrics.RECORDS_OUT, len(records))
+    metrics.count(metrics.ERRORS, count_errors(records))
+    return source.RAW_OUTPUT_FILE, records
+
+
+def count_errors(records: list) -> int:
+    """
+    Counts the records with validation errors.
+
+    Args:
+        records (list): Records
+
+    Returns:
+        int: Number of records in error
+    """
+
+    return sum(1 for record in records if str(record.get('in_error', False)) == 'True')
+
+
+def reuse_source(session: Session, source) -> tuple:
+    """
+    Loads the raw file a source wrote in the last run.
+
+    Args:
+        session (Session): Run session
+        source (module): Source script
+
+    Returns:
+        tuple: Raw file name and records
+
+    Raises:
+        FileNotFoundError: When the source did not write a raw file
+    """
+
+    records = list(merge_data.read_file(get_raw_path(source)))
+    for record in records:
+        session.schema.normalize(record)
+    return source.RAW_OUTPUT_FILE, records
+
+
+def run_merge(session: Session, batches: list) -> list:
+    """
+    Merges the records of the sources in the order of their raw file names, the same order
+    the merge script reads the files in. Invalid records and the error index are always
+    written, the merged file only with the intermediates or when runs are incremental, so
+    the next run can reuse it.
+
+    Args:
+        session (Session): Run session
+        batches (list): Raw file name and records of each source
+
+    Returns:
+        list: Merged records
+    """
+
+    directory = merge_data.OUTPUT_DIRECTORY
+    os.makedirs(directory, exist_ok=True)
+
+    merged = []
+    error_index = errors.ErrorIndex()
+    with contextlib.ExitStack() as stack:
+        if session.write_intermediates or session.incremental:
+            writers = merge_data.open_writers(stack, directory, session.schema.types, columnar.ENABLED)
+        else:
+            writers = {'invalid': stack.enter_context(
+                merge_data.RecordWriter(os.path.join(directory, merge_data.INVALID_FILE), session.schema.columns))}
+        for record, mergeable in merge_data.stream_batches(sorted(batches, key=lambda batch: batch[0]), error_index):
+            if mergeable:
+                merged.append(record)
+            merge_data.write_record(writers, record, mergeable)
+
+    logging.info(f"MERGED {len(merged)} RECORDS, {writers['invalid'].count} INVALID RECORDS")
+    with metrics.span(metrics.WRITE):
+        error_index.write(os.path.join(directory, merge_data.ERROR_INDEX_FILE), replace=True)
+    metrics.count(metrics.RECORDS_IN, sum(len(records) for _, records in batches))
+    metrics.count(metrics.RECORDS_OUT, len(merged))
+    metrics.count(metrics.ERRORS, writers['invalid'].count)
+    metrics.count(metrics.BYTES_WRITTEN, metrics.get_file_sizes(
+        os.path.join(directory, name) for name in (merge_data.OUTPUT_FILE, columnar.get_typed_name(merge_data.OUTPUT_FILE),
+                                                   merge_data.INVALID_FILE, merge_data.ERROR_INDEX_FILE)))
+    return merged
+
+
+def reuse_merge(session: Session) -> list:
+    """
+    Loads the merged file written by the last run.
+
+    Args:
+        session (Session): Run session
+
+    Returns:
+        list: Merged records
+
+    Raises:
+        FileNotFoundError: When the merged file does not exist
+    """
+
+    path = os.path.join(merge_data.OUTPUT_DIRECTORY, merge_data.OUTPUT_FILE)
+    typed_path = columnar.get_typed_name(path)
+    if columnar.ENABLED and os.path.exists(typed_path):
+        path = typed_path
+    return de_duplication.load_file(path, session.schema)
+
+
+def run_deduplication(session: Session, records: list) -> dict | None:
+    """
+    De-duplicates the merged records and outputs the de-duplicated files.
+
+    Args:
+        session (Session): Run session
+        records (list): Merged records
+
+    Returns:
+        dict | None: Dictionary of results, None without records
+    """
+
+    metrics.count(metrics.RECORDS_IN, len(records))
+    if not records:
+        return None
+    result = de_duplication.deduplicate(records, session.schema)
+    with metrics.span(metrics.WRITE):
+        de_duplication.output_files(result, session.schema)
+    metrics.count(metrics.RECORDS_OUT, len(result.get('records', [])))
+    metrics.count(metrics.ERRORS, count_errors(result.get('records', [])))
+    metrics.count(metrics.CACHE_HITS, result.get('reused', 0))
+    metrics.count(metrics.CACHE_MISSES, len(result.get('state', {}).get('clusters', {})) - result.get('reused', 0))
+    metrics.count(metrics.BYTES_WRITTEN, metrics.get_file_sizes(get_deduplication_files()))
+    return result
+
+
+def get_stage_name(source) -> str:
+    """
+    Returns the stage name of a source, the name of its script.
+
+    Args:
+        source (module): Source script
+
+    Returns:
+        str: Stage name
+    """
+
+    return source.__name__.split('.')[-1]
+
+
+def get_deduplication_files() -> list:
+    """
+    Returns the files written by the de-duplication, including the error index the merge
+    errors are added to.
+
+    Returns:
+        list: File paths
+    """
+
+    return [de_duplication.OUTPUT_FILE, de_duplication.NDJSON_FILE, de_duplication.DUPLICATE_FILE,
+            de_duplication.STATE_FILE, de_duplication.ERROR_INDEX_FILE]
+
+
+def get_staged_files() -> list:
+    """
+    Returns the files written by the staging.
+
+    Returns:
+        list: File paths
+    """
+
+    return [stage_files.OUTPUT_FILE, stage_files.NDJSON_OUTPUT_FILE]
+
+
+def run_staging() -> None:
+    """
+    Stages the de-duplicated files.
+    """
+
+    with metrics.span(metrics.WRITE):
+        stage_files.main()
+    metrics.count(metrics.BYTES_WRITTEN, metrics.get_file_sizes(get_staged_files()))
+
+
+def get_settings() -> dict:
+    """
+    Returns the environment settings that change the output of a stage without changing
+    its code: the de-duplication thresholds, the intermediate format and whether the
+    sources can geocode addresses. The value of the Mapbox key is not included.
+
+    Returns:
+        dict: Settings
+    """
+
+    return {
+        'dedup_distance': merge.DEDUP_DISTANCE,
+        'dedup_name_similarity': merge.DEDUP_NAME_SIMILARITY,
+        'columnar': columnar.ENABLED,
+        'mapbox_key': manual_source.MAPBOX_KEY.lower() not in ('', 'none')
+    }
+
+
+def build_stages(session: Session, sources=SOURCES) -> list:
+    """
+    Builds the graph of stages of a run. Every stage is versioned by the code, the schema
+    and the settings that change its output, and the sources reading files in the
+    repository also by those files. The output of the
+    sources and the merge is fingerprinted by their records, and the output of the
+    de-duplication and staging by the files they write.
+
+    Args:
+        session (Session): Run session
+        sources (iterable): Source scripts
+
+    Returns:
+        list: Stages
+    """
+
+    version = fingerprint.combine(fingerprint.get_code_version(CODE_DIRECTORY), session.schema.digest,
+                                  fingerprint.hash_value(get_settings()))
+    columns = session.schema.columns
+
+    def digest_records(records: list) -> str:
+        return fingerprint.hash_records(records, columns)
+
+    def digest_source(result: tuple) -> str:
+        return fingerprint.hash_records(result[1], columns)
+
+    names = [get_stage_name(source) for source in sources]
+    stages = []
+    for name, source in zip(names, sources):
+        if has_static_inputs(source):
+            stages.append(dag.Stage(name, lambda inputs, source=source: run_source(session, source),
+                                    retries=SOURCE_RETRIES, timeout=SOURCE_TIMEOUT,
+                                    version=fingerprint.combine(version, fingerprint.hash_files(source.INPUT_FILES)),
+                                    reuse=lambda source=source: reuse_source(session, source), digest=digest_source))
+        else:
+            stages.append(dag.Stage(name, lambda inputs, source=source: run_source(session, source),
+                                    retries=SOURCE_RETRIES, timeout=SOURCE_TIMEOUT, version=version,
+                                    digest=digest_source))
+    stages.append(dag.Stage(MERGE_STAGE, lambda inputs: run_merge(session, [inputs[name] for name in names]),
+                            depends=names, version=version, reuse=lambda: reuse_merge(session),
+                            digest=digest_records))
+    stages.append(dag.Stage(DEDUPLICATION_STAGE, lambda inputs: run_deduplication(session, inputs[MERGE_STAGE]),
+                            depends=[MERGE_STAGE], version=version, reuse=lambda: None,
+                            digest=lambda result: fingerprint.hash_files(get_deduplication_files())))
+    stages.append(dag.Stage(STAGE_FILES_STAGE, lambda inputs: run_staging(), depends=[DEDUPLICATION_STAGE],
+                            version=version, reuse=lambda: None,
+                            digest=lambda result: fingerprint.hash_files(get_staged_files())))
+    for stage in stages:
+        stage.function = metrics.bind(stage.name, stage.function)
+    return stages
+
+
+def log_report(report: dict) -> None:
+    """
+    Logs the timings of a run.
+
+    Args:
+        report (dict): Run report of the dag helper
+    """
+
+    for name, timing in report.get('stages', {}).items():
+        logging.info(f"STAGE {name}: {timing['status'].upper()} IN {timing['seconds']:.2f}s, {timing['attempts']} ATTEMPTS")
+    logging.info(f"RAN {report['stage_seconds']:.2f}s OF STAGES IN {report['seconds']:.2f}s")
+    logging.info(f"CRITICAL PATH {' -> '.join(report['critical_path'])}: {report['critical_path_seconds']:.2f}s")
+
+
+def build_run_report(started: str, report: dict) -> dict:
+    """
+    Builds the run report from the scheduler report and the run metrics.
+
+    Args:
+        started (str): Time the run started, in ISO format
+        report (dict): Run report of the dag helper
+
+    Returns:
+        dict: Run report
+    """
+
+    run_metrics = metrics.get_metrics()
+    stages = {name: {**timing, **run_metrics.get_stage(name)} for name, timing in report.get('stages', {}).items()}
+    schedules = schedule.parse_schedule.cache_info()
+    return {
+        'started': started,
+        'seconds': report.get('seconds'),
+        'stage_seconds': report.get('stage_seconds'),
+        'critical_path': report.get('critical_path', []),
+        'critical_path_seconds': report.get('critical_path_seconds'),
+        'stages': stages,
+        'totals': run_metrics.get_totals(),
+        'caches': {
+            'stages_reused': sum(1 for timing in stages.values() if timing['status'] == dag.REUSED),
+            'parse_schedule': {'hits': schedules.hits, 'misses': schedules.misses}
+        }
+    }
+
+
+def get_trend_entry(run_report: dict) -> dict:
+    """
+    Returns the summary of a run appended to the trend file.
+
+    Args:
+        run_report (dict): Run report
+
+    Returns:
+        dict: Run summary
+    """
+
+    stages = run_report['stages']
+    return {
+        'started': run_report['started'],
+        'seconds': round(run_report['seconds'] or 0.0, 3),
+        'stage_seconds': round(run_report['stage_seconds'] or 0.0, 3),
+        'critical_path_seconds': round(run_report['critical_path_seconds'] or 0.0, 3),
+        'failed': [name for name, timing in stages.items() if timing['status'] == dag.FAILED],
+        'reused': [name for name, timing in stages.items() if timing['status'] == dag.REUSED],
+        'stages': {name: round(timing.get('seconds', 0.0), 3) for name, timing in stages.items()},
+        'totals': run_report['totals']
+    }
+
+
+def write_run_report(started: str, report: dict) -> None:
+    """
+    Writes the run report and appends the run to the trend file.
+
+    Args:
+        started (str): Time the run started, in ISO format
+        report (dict): Run report of the dag helper
+    """
+
+    run_report = build_run_report(started, report)
+    metrics.write_report(REPORT_FILE, run_report)
+    metrics.append_trend(TREND_FILE, get_trend_entry(run_report))
+    logging.info(f"WROTE THE RUN REPORT {REPORT_FILE}")
+
+
+def main():
+    """
+    Runs every stage of the pipeline.
+    """
+
+    logging.info('RUNNING THE DATA PIPELINE...')
+    started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    metrics.reset()
+    session = Session()
+    try:
+        manifest = fingerprint.Manifest(FINGERPRINT_FILE) if session.incremental else None
+        scheduler = dag.Scheduler(build_stages(session), PIPELINE_WORKERS, manifest)
+        try:
+            scheduler.run()
+        finally:
+            if scheduler.report:
+                log_report(scheduler.report)
+                write_run_report(started, scheduler.report)
+    finally:
+        session.close()
+    logging.info('DONE')
+
+
+if __name__ == '__main__':
+    main()
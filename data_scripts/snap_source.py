@@ -4,11 +4,10 @@ from the ARC GIS Web Services.
 """
 
 import csv
-import json
 import logging
 import os
 
-from helpers import gis, maputil, validation, classification
+from helpers import gis, maputil, validation, classification, schemas, identity, columnar, metrics
 from helpers.rules import RulesEngine
 
 RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
@@ -21,26 +20,13 @@ DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output.
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file.
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -52,14 +38,34 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
+
+
+def apply_rules(engine):
+    """
+    Applies the SNAP rules with a Rules Engine for a single record or a batch.
+
+    Args:
+        engine (RulesEngine|BatchRulesEngine): Rules Engine
+
+    Returns:
+        dict|list: Updated Record or Records
+    """
+
+    return engine\
+        .apply_global_rules()\
+        .apply_farmer_market_rules()\
+        .apply_food_bank_rules()\
+        .commit()
 
 
-def map_record(record: dict, schema: dict) -> dict:
+def map_record(record: dict, schema: dict, rules: bool = True) -> dict:
     """
     Maps the Provided Record to the Schema
 
     Args:
         record (dict): GIS Record
+        rules (bool): Apply the rules, unset when the rules are applied to the whole batch
 
     Returns:
         dict: Mapped Record
@@ -82,47 +88,55 @@ def map_record(record: dict, schema: dict) -> dict:
     mapped_record['snap'] = True
     mapped_record['food_bucks'] = True
     mapped_record['file_name'] = SOURCE
-        
-    return RulesEngine(mapped_record)\
-        .apply_global_rules()\
-        .apply_farmer_market_rules()\
-        .apply_food_bank_rules()\
-        .commit()
 
-def main():
+    if not rules:
+        return mapped_record
+    return apply_rules(RulesEngine(mapped_record))
+
+
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the SNAP Locations from the ARC GIS Web Services
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the SNAP Locations from the ARC GIS Web Services
     logging.info(f"RETRIEVING SNAP LOCATIONS FROM WEB SERVICES...")
     locations = gis.get_snap_sites()
-    schema = load_schema(SCHEMA_FILE)
     logging.info(f"RETRIEVED {len(locations)} ENTRIES TO CONVERT.")
-    records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for location in locations:
-        # Map the Record
-        mapped_record = map_record(location, schema)
-
-        # Add the Id
-        mapped_record['id'] = row_number
-        
-        # Validate the record
-        result = validation.validate(schema, mapped_record)
-        if not result.get('valid', True):
-            mapped_record['in_error'] = True
-            mapped_record['data_issues'] = result.get('errors', '')
-            error_records = error_records + 1
-
-        # Add it to the Collection
-        records.append(mapped_record)
-        row_number = row_number + 1
+    metrics.count(metrics.RECORDS_IN, len(locations))
+    with metrics.span(metrics.MAP):
+        # Map the Records and apply the rules to all of them at once
+        records = [map_record(location, schema, rules=False) for location in locations]
+        records = apply_rules(RulesEngine.apply_batch(records))
+
+        for mapped_record in records:
+            # Add the Id
+            mapped_record['id'] = ids.next_id(mapped_record)
+
+            # Validate the record
+            validation.validate_record(schema, mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING SNAP LOCATIONS FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info('DONE PROCESSING RAW SNAP LOCATIONS SOURCE INFORMATION')
 
 
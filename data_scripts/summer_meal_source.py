@@ -4,12 +4,11 @@ Nutrition Program from the ARC GIS File.
 """
 
 import csv
-import json
 import logging
 import datetime
 import os
 
-from helpers import gis, maputil, validation
+from helpers import gis, maputil, validation, schemas, schedule, identity, columnar, metrics
 from helpers.rules import RulesEngine
 
 RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
@@ -22,26 +21,13 @@ DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output.
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file.
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -53,6 +39,7 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
 
 
 def map_record(record: dict, schema: dict) -> dict:
@@ -108,46 +95,66 @@ def map_record(record: dict, schema: dict) -> dict:
     
     if record.get('End_Date', None):
         mapped_record['date_to'] = datetime.datetime.fromtimestamp(record.get('End_Date')/1000).strftime('%B %d, %Y')
+
+    # Site Hours do not contain dates, so the schedule uses the Start and End dates of the site.
+    season = None
+    if record.get('Start_Date', None) and record.get('End_Date', None):
+        start = datetime.datetime.fromtimestamp(record.get('Start_Date')/1000)
+        end = datetime.datetime.fromtimestamp(record.get('End_Date')/1000)
+        season = ((start.month, start.day), (end.month, end.day))
+    schedule.set_open_hours(mapped_record, [record.get('Site_Hours', '')], season)
     
     return RulesEngine(mapped_record)\
         .apply_global_rules()\
         .apply_summer_meal_rules()\
         .commit()
 
-def main():
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the Summer Meal Sites from the ARC GIS Web Services
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the Summer Meal Sites from the ARC GIS Web Services
     logging.info(f"RETRIVING SUMMER MEAL SITES FROM WEB SERVICES...")
     sites = gis.get_summer_meal_sites()
-    schema = load_schema(SCHEMA_FILE)
     logging.info(f"RETRIEVED {len(sites)} ENTRIES TO CONVERT.")
     records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for site in sites:
-        # Map the Record
-        mapped_record = map_record(site, schema)
+    metrics.count(metrics.RECORDS_IN, len(sites))
+    with metrics.span(metrics.MAP):
+        for site in sites:
+            # Map the Record
+            mapped_record = map_record(site, schema)
         
-        # Add the Id
-        mapped_record['id'] = row_number
+            # Add the Id
+            mapped_record['id'] = ids.next_id(mapped_record)
         
-        # Validate the record
-        result = validation.validate(schema, mapped_record)
-        if not result.get('valid', True):
-            mapped_record['in_error'] = True
-            mapped_record['data_issues'] = result.get('errors', '')
-            error_records = error_records + 1
-
-        # Add it to the Collection
-        records.append(mapped_record)
-        row_number = row_number + 1
+            # Validate the record
+            validation.validate_record(schema, mapped_record)
+
+            # Add it to the Collection
+            records.append(mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING SUMMER MEAL SITE FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info('DONE PROCESSING RAW SUMMER MEAL SITE SOURCE INFORMATION')
 
 
@@ -0,0 +1,130 @@
+"""
+Benchmarks record validation against the merged raw sources file.
+Compares the compiled jsonschema validator and the generated validator to calling
+jsonschema.validate for every record.
+"""
+
+import csv
+import logging
+import timeit
+
+import jsonschema
+
+from helpers import maputil, validation, schemas
+
+MERGE_FILE = 'food-data/merged-data/merged-raw-sources.csv'
+SCHEMA_FILE = 'food-data/schema/map-data-schema.json'
+REPEAT = 3
+
+DELIMITER = '|'
+
+logging.basicConfig(level=logging.INFO)
+
+
+def load_records(path: str, schema: dict) -> list:
+    """
+    Loads the merged raw sources and applies the schema types.
+
+    Args:
+        path (str): CSV path
+        schema (dict): JSON Schema
+
+    Returns:
+        list: Typed records
+    """
+
+    csv.register_dialect('input', delimiter=DELIMITER)
+    with open(path, 'r', encoding='utf-8') as input_file:
+        records = list(csv.DictReader(input_file, dialect='input'))
+    maputil.apply_schema(records, schema)
+    return records
+
+
+def legacy_validate(schema: dict, records: list) -> int:
+    """
+    Validates every record with jsonschema.validate.
+
+    Args:
+        schema (dict): JSON Schema
+        records (list): Records to validate
+
+    Returns:
+        int: Number of invalid records
+    """
+
+    invalid = 0
+    for record in records:
+        try:
+            jsonschema.validate(record, schema)
+        except jsonschema.ValidationError:
+            invalid = invalid + 1
+    return invalid
+
+
+def compiled_validate(schema: dict, records: list) -> int:
+    """
+    Validates every record with the compiled jsonschema validator.
+
+    Args:
+        schema (dict): JSON Schema
+        records (list): Records to validate
+
+    Returns:
+        int: Number of invalid records
+    """
+
+    validator = validation.get_validator(schema)
+    invalid = 0
+    for record in records:
+        if not validator.is_valid(record):
+            invalid = invalid + 1
+    return invalid
+
+
+def generated_validate(schema: dict, records: list) -> int:
+    """
+    Validates every record with validation.validate, which uses the generated validator.
+
+    Args:
+        schema (dict): JSON Schema
+        records (list): Records to validate
+
+    Returns:
+        int: Number of invalid records
+    """
+
+    invalid = 0
+    for record in records:
+        if not validation.validate(schema, record)['valid']:
+            invalid = invalid + 1
+    return invalid
+
+
+def main():
+    """
+    Runs the validation benchmark.
+    """
+
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = load_records(MERGE_FILE, schema)
+    logging.info(f"BENCHMARKING VALIDATION OF {len(records)} RECORDS FROM {MERGE_FILE}")
+
+    legacy_invalid = legacy_validate(schema, records)
+    compiled_invalid = compiled_validate(schema, records)
+    generated_invalid = generated_validate(schema, records)
+    if not legacy_invalid == compiled_invalid == generated_invalid:
+        raise ValueError(f"INVALID COUNTS DIFFER: {legacy_invalid} != {compiled_invalid} != {generated_invalid}")
+
+    legacy = min(timeit.repeat(lambda: legacy_validate(schema, records), number=1, repeat=REPEAT))
+    compiled = min(timeit.repeat(lambda: compiled_validate(schema, records), number=1, repeat=REPEAT))
+    generated = min(timeit.repeat(lambda: generated_validate(schema, records), number=1, repeat=REPEAT))
+
+    logging.info(f"JSONSCHEMA.VALIDATE: {legacy:.4f}s ({legacy / len(records) * 1000000:.1f}us PER RECORD)")
+    logging.info(f"COMPILED VALIDATOR: {compiled:.4f}s ({compiled / len(records) * 1000000:.1f}us PER RECORD)")
+    logging.info(f"GENERATED VALIDATOR: {generated:.4f}s ({generated / len(records) * 1000000:.1f}us PER RECORD)")
+    logging.info(f"SPEEDUP: {legacy / compiled:.1f}x COMPILED, {legacy / generated:.1f}x GENERATED "
+                 f"WITH {generated_invalid} INVALID RECORDS")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,11 @@ Retrieves the WIC Locations from the PA WIC Service.
 """
 
 import csv
-import json
 import logging
 import os
 
 
-from helpers import gis, maputil, validation, mapbox, classification
+from helpers import gis, maputil, validation, mapbox, classification, schemas, identity, columnar, metrics
 from helpers.rules import RulesEngine
 
 RAW_OUTPUT_FOLDER = 'food-data/raw-sources'
@@ -22,20 +21,6 @@ DELIMITER = '|'
 logging.basicConfig(level=logging.INFO)
 
 
-def load_schema(path: str) -> dict:
-    """
-    Loads the Schema file to a Dictionary.
-
-    Args:
-        path (str): Schema File path
-
-    Returns:
-        dict: Schema Dictionary
-    """
-    with open(path, 'r', encoding='utf-8') as input_file:
-        return json.loads(input_file.read())
-
-
 def get_coordinates(mapped_record: dict) -> dict:
     """
     Retrieves the Latitude and Longitude from the address or cross street
@@ -50,12 +35,13 @@ def get_coordinates(mapped_record: dict) -> dict:
     return mapbox.get_coordinates(MAPBOX_KEY, search)
 
 
-def write_output(records: list):
+def write_output(records: list, schema: dict = None):
     """
     Outputs the converted records to a CSV.
 
     Args:
         records (list): List of Dictionaries to output.
+        schema (dict): Compiled JSON Schema, used for the typed copy of the file.
     """
     
     if not os.path.exists(RAW_OUTPUT_FOLDER):
@@ -67,6 +53,7 @@ def write_output(records: list):
             output_file, fieldnames=records[0].keys(), dialect='output')
         writer.writeheader()
         writer.writerows(records)
+    columnar.write_typed(os.path.join(RAW_OUTPUT_FOLDER, RAW_OUTPUT_FILE), records, schema)
 
 
 def map_record(record: dict, schema: dict) -> dict:
@@ -112,40 +99,52 @@ def map_record(record: dict, schema: dict) -> dict:
         .commit()
 
 
-def main():
+def get_records(schema: dict) -> list:
     """
-    Main Function for Processing
+    Retrieves the WIC Locations from PA WIC
+    and converts them to the common record definition.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+
+    Returns:
+        list: Converted records
     """
     # Retrieve the WIC Locations from PA WIC
     logging.info(f"RETRIVING WIC LOCATIONS FROM PA WIC SERVICES...")
     locations = gis.get_wic_sites()
-    schema = load_schema(SCHEMA_FILE)
     logging.info(f"RETRIEVED {len(locations)} ENTRIES TO CONVERT.")
     records = []
-    error_records = 0
-    row_number = 0
+    ids = identity.IdAssigner()
     logging.info('CONVERTING ENTRIES TO COMMON RECORD DEFINITION...')
-    for location in locations:
-        # Map the Record
-        mapped_record = map_record(location, schema)
-
-        # Add the Id
-        mapped_record['id'] = row_number
-
-        # Validate the record
-        result = validation.validate(schema, mapped_record)
-        if not result.get('valid', True):
-            mapped_record['in_error'] = True
-            mapped_record['data_issues'] = result.get('errors', '')
-            error_records = error_records + 1
+    metrics.count(metrics.RECORDS_IN, len(locations))
+    with metrics.span(metrics.MAP):
+        for location in locations:
+            # Map the Record
+            mapped_record = map_record(location, schema)
+
+            # Add the Id
+            mapped_record['id'] = ids.next_id(mapped_record)
+
+            # Validate the record
+            validation.validate_record(schema, mapped_record)
                     
-        # Add it to the Collection
-        records.append(mapped_record)
-        row_number = row_number + 1
+            # Add it to the Collection
+            records.append(mapped_record)
+    return records
+
+
+def main():
+    """
+    Main Function for Processing
+    """
+    schema = schemas.load_schema(SCHEMA_FILE)
+    records = get_records(schema)
+    error_records = sum(1 for record in records if record.get('in_error'))
     if records:
         logging.info(
             f"OUTPUTING WIC LOCATIONS FILE: {RAW_OUTPUT_FILE} WITH {error_records} ERRORS.")
-        write_output(records)
+        write_output(records, schema)
     logging.info(
         'DONE PROCESSING RAW WIC LOCATIONS SOURCE INFORMATION')
 
@@ -0,0 +1,39 @@
+"""
+Unit tests for the De-Duplication script.
+"""
+
+import pytest
+from assertpy import assert_that
+
+from data_scripts import de_duplication
+from data_scripts.helpers import schemas
+
+SCHEMA_FILE = 'food-data/schema/map-data-schema.json'
+
+
+def test_load_file_blank_lines(tmp_path):
+    """
+    Tests blank lines are skipped instead of truncating every column.
+    """
+
+    path = tmp_path / 'merged-raw-sources.csv'
+    path.write_text('name|latitude|snap\nMarket|40.5|True\n\nGarden|40.4|False\n\n', encoding='utf-8')
+
+    records = de_duplication.load_file(str(path), schemas.load_schema(SCHEMA_FILE))
+
+    assert_that([record['name'] for record in records]).is_equal_to(['Market', 'Garden'])
+    assert_that(records[1]['latitude']).is_equal_to(40.4)
+
+
+def test_load_file_short_row(tmp_path):
+    """
+    Tests a row missing values is rejected instead of dropping columns from every record.
+    """
+
+    path = tmp_path / 'merged-raw-sources.csv'
+    path.write_text('name|latitude|snap\nMarket|40.5|True\nGarden|40.4\n', encoding='utf-8')
+
+    with pytest.raises(ValueError) as error:
+        de_duplication.load_file(str(path), schemas.load_schema(SCHEMA_FILE))
+
+    assert_that(str(error.value)).contains('line 3 has 2 values for 3 columns')
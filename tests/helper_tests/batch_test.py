@@ -0,0 +1,69 @@
+"""
+Tests for the column oriented record batches.
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import batch, flags
+
+
+def test_to_bits():
+    """
+    Tests packing truth values into a bit set.
+    """
+
+    assert_that(batch.to_bits([True, False, True, True])).is_equal_to(0b1101)
+    assert_that(batch.to_bits([])).is_zero()
+
+
+def test_from_bits():
+    """
+    Tests unpacking a bit set into booleans.
+    """
+
+    assert_that(batch.from_bits(0b1101, 5)).is_equal_to([True, False, True, True, False])
+    assert_that(batch.from_bits(0, 0)).is_empty()
+
+
+def test_record_batch_round_trip():
+    """
+    Tests the flags and columns are written back onto the records.
+    """
+
+    records = [
+        {'type': 'supermarket', 'snap': True, 'wic': False, 'open_to_spec_group': ''},
+        {'type': 'other', 'snap': False, 'wic': True, 'open_to_spec_group': ''}
+    ]
+
+    record_batch = batch.RecordBatch(records)
+    rows = record_batch.equals('type', 'other')
+    record_batch.set_flags(rows, flags.FMNP)
+    record_batch.clear_flags(record_batch.all_rows, flags.SNAP)
+    record_batch.set_value(rows, 'open_to_spec_group', 'seniors')
+    result = record_batch.to_records()
+
+    assert_that(result[0])\
+        .contains_entry({'snap': False})\
+        .contains_entry({'fmnp': False})\
+        .contains_entry({'open_to_spec_group': ''})\
+        .does_not_contain_key('active_record')
+    assert_that(result[1])\
+        .contains_entry({'wic': True})\
+        .contains_entry({'fmnp': True})\
+        .contains_entry({'open_to_spec_group': 'seniors'})
+
+
+def test_record_batch_file_values():
+    """
+    Tests flags read from a file are set the same as in the Rules Engine.
+    """
+
+    records = [{'snap': 'True', 'wic': 1, 'fmnp': 'False', 'food_bucks': '', 'active_record': 'True'}]
+
+    record_batch = batch.RecordBatch(records)
+
+    assert_that(record_batch.flags[flags.SNAP]).is_equal_to(1)
+    assert_that(record_batch.flags[flags.WIC]).is_equal_to(1)
+    assert_that(record_batch.flags[flags.FMNP]).is_zero()
+    assert_that(record_batch.flags[flags.FOOD_BUCKS]).is_zero()
+    assert_that(record_batch.active).is_equal_to(1)
@@ -0,0 +1,57 @@
+"""
+Tests for the Disjoint-set clustering.
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import cluster
+
+
+def test_union_find():
+    """
+    Tests joining sets and finding their roots.
+    """
+
+    disjoint_set = cluster.DisjointSet(5)
+
+    assert_that(disjoint_set.union(0, 1)).is_true()
+    assert_that(disjoint_set.union(3, 1)).is_true()
+    assert_that(disjoint_set.union(0, 3)).is_false()
+    assert_that(disjoint_set.connected(0, 3)).is_true()
+    assert_that(disjoint_set.connected(0, 2)).is_false()
+    assert_that(disjoint_set.groups()).is_equal_to([[0, 1, 3], [2], [4]])
+
+
+def test_add():
+    """
+    Tests adding items to an existing set.
+    """
+
+    disjoint_set = cluster.DisjointSet(2)
+    item = disjoint_set.add()
+    disjoint_set.union(0, item)
+
+    assert_that(item).is_equal_to(2)
+    assert_that(disjoint_set).is_length(3)
+    assert_that(disjoint_set.groups()).is_equal_to([[0, 2], [1]])
+
+
+def test_build_clusters_transitive():
+    """
+    Tests items joined through a chain of pairs end up in one cluster regardless of the pair order.
+    """
+
+    pairs = [(0, 1), (1, 2), (4, 5)]
+
+    assert_that(cluster.build_clusters(6, pairs)).is_equal_to([[0, 1, 2], [3], [4, 5]])
+    assert_that(cluster.build_clusters(6, reversed(pairs))).is_equal_to([[0, 1, 2], [3], [4, 5]])
+
+
+def test_key_pairs():
+    """
+    Tests items with equal keys are paired with the first item having the key.
+    """
+
+    pairs = list(cluster.key_pairs(['a', 'b', 'a', None, 'a', None]))
+
+    assert_that(pairs).is_equal_to([(0, 2), (0, 4)])
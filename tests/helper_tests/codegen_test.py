@@ -0,0 +1,139 @@
+"""
+Tests for the generated schema validators.
+"""
+
+import json
+import os
+
+import jsonschema
+from assertpy import assert_that
+
+from data_scripts.helpers import codegen
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'food-data', 'schema', 'map-data-schema.json')
+
+
+def get_schema():
+
+    return {
+        "$schema": "https://json-schema.org/draft/2020-12/schema",
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "name": {"type": "string", "minLength": 1},
+            "latitude": {"type": "number", "minimum": -90, "maximum": 90},
+            "snap": {"type": "boolean"},
+            "phone": {"type": ["string", "null"]}
+        },
+        "required": ["id", "name"]
+    }
+
+
+def get_records():
+
+    return [
+        {'id': 1, 'name': 'Market'},
+        {'id': 1.0, 'name': 'Market'},
+        {'id': 1.5, 'name': 'Market'},
+        {'id': True, 'name': 'Market'},
+        {'id': '1', 'name': 'Market'},
+        {'id': 1, 'name': ''},
+        {'id': 1, 'name': None},
+        {'id': 1},
+        {'name': 'Market'},
+        {'id': 1, 'name': 'Market', 'latitude': 40.4},
+        {'id': 1, 'name': 'Market', 'latitude': 91},
+        {'id': 1, 'name': 'Market', 'latitude': -90},
+        {'id': 1, 'name': 'Market', 'latitude': False},
+        {'id': 1, 'name': 'Market', 'snap': 1},
+        {'id': 1, 'name': 'Market', 'snap': False},
+        {'id': 1, 'name': 'Market', 'phone': None},
+        {'id': 1, 'name': 'Market', 'phone': 4125551234},
+        {'id': 1, 'name': 'Market', 'extra': object()},
+        [],
+        'record'
+    ]
+
+
+def test_matches_jsonschema():
+    """
+    Tests the generated validator agrees with jsonschema.
+    """
+
+    schema = get_schema()
+    is_valid = codegen.get_validator(schema)
+    validator = jsonschema.Draft202012Validator(schema)
+
+    for record in get_records():
+        assert_that(is_valid(record)).described_as(repr(record)).is_equal_to(validator.is_valid(record))
+
+
+def test_matches_jsonschema_map_schema():
+    """
+    Tests the generated validator agrees with jsonschema on the map data schema.
+    """
+
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as input_file:
+        schema = json.load(input_file)
+    is_valid = codegen.get_validator(schema)
+    validator = jsonschema.validators.validator_for(schema)(schema)
+
+    record = {key: None for key in schema['properties']}
+    record.update({'id': 1, 'name': 'Market', 'latitude': 40.4, 'longitude': -79.9})
+    candidates = [record]
+    for key, attributes in schema['properties'].items():
+        for value in [None, '', 'text', 0, 1.5, True, 200, -200]:
+            candidate = dict(record)
+            candidate[key] = value
+            candidates.append(candidate)
+    for key in schema.get('required', []):
+        candidate = dict(record)
+        del candidate[key]
+        candidates.append(candidate)
+
+    for candidate in candidates:
+        assert_that(is_valid(candidate)).described_as(repr(candidate)).is_equal_to(validator.is_valid(candidate))
+
+
+def test_cached_in_memory():
+    """
+    Tests the validator is generated once for each version of the schema.
+    """
+
+    schema = get_schema()
+    is_valid = codegen.get_validator(schema)
+
+    assert_that(codegen.get_validator(get_schema())).is_same_as(is_valid)
+
+    schema['properties']['name']['minLength'] = 2
+    assert_that(codegen.get_validator(schema)).is_not_same_as(is_valid)
+
+
+def test_unsupported_schema():
+    """
+    Tests schemas using keywords the generator does not know are not generated.
+    """
+
+    schema = get_schema()
+    schema['properties']['name']['pattern'] = '^[A-Z]'
+
+    assert_that(codegen.is_supported(schema)).is_false()
+    assert_that(codegen.get_validator(schema)).is_none()
+
+
+def test_unsupported_draft():
+    """
+    Tests schemas from drafts with a different meaning of the keywords are not generated.
+    """
+
+    schema = get_schema()
+    schema['$schema'] = 'http://json-schema.org/draft-04/schema#'
+    schema['properties']['latitude'].update({'minimum': -90, 'exclusiveMinimum': True})
+
+    assert_that(codegen.is_supported(schema)).is_false()
+
+    schema['$schema'] = 'http://json-schema.org/draft-07/schema#'
+    assert_that(codegen.is_supported(schema)).is_false()
+
+    schema['properties']['latitude']['exclusiveMinimum'] = -90
+    assert_that(codegen.is_supported(schema)).is_true()
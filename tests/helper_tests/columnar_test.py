@@ -0,0 +1,204 @@
+"""
+Tests for the typed columnar intermediate files.
+"""
+
+import csv
+
+from assertpy import assert_that
+
+from data_scripts.helpers import columnar
+
+TYPES = {
+    'id': 'integer',
+    'name': 'string',
+    'address': 'string',
+    'latitude': 'number',
+    'snap': 'boolean'
+}
+
+
+def build_records(count: int) -> list:
+    """
+    Creates records for testing.
+
+    Args:
+        count (int): Number of records
+
+    Returns:
+        list: Records
+    """
+
+    return [{
+        'id': index,
+        'name': f"Market {index} é",
+        'address': None if index % 3 == 0 else f"{index} Main St",
+        'latitude': 40.4406 + index / 1000,
+        'snap': index % 2 == 0
+    } for index in range(count)]
+
+
+def test_round_trip(tmp_path):
+    """
+    Tests values are read back with their types, across several row groups.
+    """
+
+    path = str(tmp_path / 'records.col')
+    records = build_records(25)
+    with columnar.ColumnarWriter(path, TYPES, row_group_size=10) as writer:
+        writer.write_records(records)
+
+    result = list(columnar.read_records(path))
+
+    assert_that(writer.count).is_equal_to(25)
+    assert_that(list(columnar.read_row_groups(path))).is_length(3)
+    assert_that(result).is_length(25)
+    assert_that(result[1]).is_equal_to(records[1])
+    assert_that(result[3]['address']).is_equal_to('')
+    assert_that(result[5]['latitude']).is_instance_of(float).is_equal_to(records[5]['latitude'])
+    assert_that(result[4]['snap']).is_true()
+
+
+def test_convert_and_null(tmp_path):
+    """
+    Tests values are converted to the column type and missing numbers stay missing.
+    """
+
+    path = str(tmp_path / 'records.col')
+    columnar.write_records(path, [
+        {'id': '7', 'name': 12, 'address': 'A', 'latitude': '40.5', 'snap': 'True'},
+        {'id': None, 'name': 'B', 'address': 'B', 'latitude': None, 'snap': 'False'}
+    ], TYPES)
+
+    columns = columnar.read_columns(path)
+
+    assert_that(columns['id']).is_equal_to([7, None])
+    assert_that(columns['name']).is_equal_to(['12', 'B'])
+    assert_that(columns['latitude']).is_equal_to([40.5, None])
+    assert_that(columns['snap']).is_equal_to([True, False])
+
+
+def test_empty_values_missing(tmp_path):
+    """
+    Tests empty strings in number, integer and boolean columns are stored as missing values.
+    """
+
+    path = str(tmp_path / 'records.col')
+    columnar.write_records(path, [
+        {'id': '', 'name': '', 'address': 'A', 'latitude': '', 'snap': ''},
+        {'id': 3, 'name': 'B', 'address': '', 'latitude': 40.5, 'snap': True}
+    ], TYPES)
+
+    columns = columnar.read_columns(path)
+
+    assert_that(columns['id']).is_equal_to([None, 3])
+    assert_that(columns['name']).is_equal_to(['', 'B'])
+    assert_that(columns['address']).is_equal_to(['A', ''])
+    assert_that(columns['latitude']).is_equal_to([None, 40.5])
+    assert_that(columns['snap']).is_equal_to([None, True])
+
+
+def test_read_selected_columns(tmp_path):
+    """
+    Tests only the requested columns are read.
+    """
+
+    path = str(tmp_path / 'records.col')
+    columnar.write_records(path, build_records(5), TYPES)
+
+    columns = columnar.read_columns(path, ['id', 'snap'])
+
+    assert_that(columns).is_equal_to({'id': [0, 1, 2, 3, 4], 'snap': [True, False, True, False, True]})
+
+
+def test_append(tmp_path):
+    """
+    Tests appending the row groups of another file.
+    """
+
+    part_path = str(tmp_path / 'part.col')
+    path = str(tmp_path / 'records.col')
+    records = build_records(6)
+    columnar.write_records(part_path, records[3:], TYPES)
+    with columnar.ColumnarWriter(path, TYPES) as writer:
+        writer.write_records(records[:3])
+        writer.append(part_path, 3)
+
+    assert_that(writer.count).is_equal_to(6)
+    assert_that(columnar.read_columns(path)['id']).is_equal_to(list(range(6)))
+
+
+def test_append_different_columns(tmp_path):
+    """
+    Tests appending a file with other columns is refused.
+    """
+
+    part_path = str(tmp_path / 'part.col')
+    columnar.write_records(part_path, [{'id': 1}], {'id': 'integer'})
+
+    with columnar.ColumnarWriter(str(tmp_path / 'records.col'), TYPES) as writer:
+        assert_that(writer.append).raises(ValueError).when_called_with(part_path, 1)
+
+
+def test_empty_writer(tmp_path):
+    """
+    Tests no file is created without records.
+    """
+
+    path = tmp_path / 'records.col'
+    with columnar.ColumnarWriter(str(path), TYPES):
+        pass
+
+    assert_that(path.exists()).is_false()
+
+
+def test_not_columnar(tmp_path):
+    """
+    Tests reading a file that is not a columnar file.
+    """
+
+    path = tmp_path / 'records.col'
+    path.write_text('id|name\n1|A\n')
+
+    assert_that(columnar.read_columns).raises(ValueError).when_called_with(str(path))
+
+
+def test_names():
+    """
+    Tests the names of the typed files and their CSV exports.
+    """
+
+    assert_that(columnar.get_typed_name('food-data/raw-sources/snap-raw.csv')).is_equal_to('food-data/raw-sources/snap-raw.col')
+    assert_that(columnar.get_export_name('snap-raw.col')).is_equal_to('snap-raw.csv')
+    assert_that(columnar.get_export_name('snap-raw.csv')).is_equal_to('snap-raw.csv')
+
+
+def test_export_csv(tmp_path):
+    """
+    Tests exporting a columnar file to CSV.
+    """
+
+    path = str(tmp_path / 'records.col')
+    columnar.write_records(path, build_records(2), TYPES)
+
+    csv_path = columnar.export_csv(path)
+    with open(csv_path, encoding='utf-8') as csv_file:
+        rows = list(csv.DictReader(csv_file, delimiter='|'))
+
+    assert_that(csv_path).ends_with('records.csv')
+    assert_that(rows[1]).is_equal_to({'id': '1', 'name': 'Market 1 é', 'address': '1 Main St', 'latitude': '40.4416', 'snap': 'False'})
+
+
+def test_write_typed_disabled(tmp_path, monkeypatch):
+    """
+    Tests the typed copy is only written when the format is enabled.
+    """
+
+    csv_path = str(tmp_path / 'snap-raw.csv')
+    schema = {'properties': {'id': {'type': 'integer'}}}
+
+    monkeypatch.setattr(columnar, 'ENABLED', False)
+    assert_that(columnar.write_typed(csv_path, [{'id': 1}], schema)).is_none()
+
+    monkeypatch.setattr(columnar, 'ENABLED', True)
+    path = columnar.write_typed(csv_path, [{'id': 1}], schema)
+    assert_that(columnar.read_columns(path)).is_equal_to({'id': [1]})
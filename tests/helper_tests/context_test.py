@@ -0,0 +1,59 @@
+"""
+Tests for the Run Context.
+"""
+
+from datetime import datetime
+
+from assertpy import assert_that
+
+from data_scripts.helpers import context
+from data_scripts.helpers.context import RunContext
+
+
+def test_season_windows_in_season():
+    """
+    Tests the season flags are precomputed for the evaluation instant.
+    """
+
+    run = RunContext(datetime(2023, 7, 1))
+
+    assert_that(run.in_season(context.FARMERS_MARKET_SEASON)).is_true()
+    assert_that(run.in_season(context.BLOOMFIELD_SEASON)).is_true()
+    assert_that(run.in_season(context.SUMMER_MEAL_SEASON)).is_true()
+
+
+def test_season_windows_end_dates():
+    """
+    Tests the end of the summer meal and farmer's market seasons differ by a day.
+    """
+
+    run = RunContext(datetime(2023, 8, 31))
+
+    assert_that(run.in_season(context.FARMERS_MARKET_SEASON)).is_true()
+    assert_that(run.in_season(context.SUMMER_MEAL_SEASON)).is_false()
+
+
+def test_season_windows_other_date():
+    """
+    Tests a date other than the evaluation instant uses the windows of its year.
+    """
+
+    run = RunContext(datetime(2023, 7, 1))
+
+    assert_that(run.in_season(context.BLOOMFIELD_SEASON, datetime(2024, 10, 1))).is_true()
+    assert_that(run.in_season(context.FARMERS_MARKET_SEASON, datetime(2024, 10, 1))).is_false()
+
+
+def test_get_run_context():
+    """
+    Tests the same context is returned for the whole run.
+    """
+
+    context.set_run_context(None)
+    first = context.get_run_context()
+
+    assert_that(context.get_run_context()).is_same_as(first)
+
+    run = context.set_run_context(RunContext(datetime(2023, 1, 1)))
+    assert_that(context.get_run_context()).is_same_as(run)
+    context.set_run_context(None)
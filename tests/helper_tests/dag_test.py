@@ -0,0 +1,247 @@
+"""
+Unit tests for the DAG Helper
+"""
+
+import threading
+import time
+
+import pytest
+from assertpy import assert_that
+
+from data_scripts.helpers import dag, fingerprint
+
+
+def sleeper(seconds: float, result=None):
+    """
+    Creates a stage function sleeping before returning its result.
+
+    Args:
+        seconds (float): Seconds to sleep
+        result (any): Result of the stage
+
+    Returns:
+        callable: Stage function
+    """
+
+    def function(inputs):
+        time.sleep(seconds)
+        return result
+
+    return function
+
+
+def test_independent_stages_run_concurrently():
+    """
+    Tests stages without dependencies between them run at the same time.
+    """
+
+    stages = [dag.Stage(f"source{index}", sleeper(0.2, index)) for index in range(4)]
+
+    results, report = dag.run_stages(stages, workers=4)
+
+    assert_that(results).is_equal_to({'source0': 0, 'source1': 1, 'source2': 2, 'source3': 3})
+    assert_that(report['seconds']).is_less_than(0.6)
+    assert_that(report['stage_seconds']).is_greater_than_or_equal_to(0.8)
+
+
+def test_dependencies():
+    """
+    Tests a stage runs after its dependencies and receives their results.
+    """
+
+    order = []
+
+    def record(name, result):
+        def function(inputs):
+            order.append(name)
+            return result(inputs)
+        return function
+
+    stages = [
+        dag.Stage('total', record('total', lambda inputs: inputs['a'] + inputs['b']), depends=['a', 'b']),
+        dag.Stage('a', record('a', lambda inputs: 1)),
+        dag.Stage('b', record('b', lambda inputs: 2))
+    ]
+
+    results, _ = dag.run_stages(stages, workers=1)
+
+    assert_that(results['total']).is_equal_to(3)
+    assert_that(order).is_equal_to(['a', 'b', 'total'])
+
+
+def test_retries():
+    """
+    Tests a failing stage is retried.
+    """
+
+    calls = []
+
+    def flaky(inputs):
+        calls.append(time.perf_counter())
+        if len(calls) < 3:
+            raise ConnectionError('unavailable')
+        return 'ok'
+
+    results, report = dag.run_stages([dag.Stage('source', flaky, retries=2, retry_delay=0.01)])
+
+    assert_that(results['source']).is_equal_to('ok')
+    assert_that(report['stages']['source']).contains_entry({'attempts': 3}, {'status': dag.SUCCEEDED})
+
+
+def test_failure_skips_dependents():
+    """
+    Tests the stages depending on a failed stage are skipped and the other stages still run.
+    """
+
+    def broken(inputs):
+        raise ValueError('bad data')
+
+    stages = [
+        dag.Stage('broken', broken, retries=1, retry_delay=0.01),
+        dag.Stage('other', sleeper(0.05, 'done')),
+        dag.Stage('merge', lambda inputs: None, depends=['broken', 'other']),
+        dag.Stage('stage', lambda inputs: None, depends=['merge'])
+    ]
+    scheduler = dag.Scheduler(stages)
+
+    with pytest.raises(dag.StageError) as error:
+        scheduler.run()
+
+    stages = error.value.report['stages']
+    assert_that(stages['broken']).contains_entry({'status': dag.FAILED}, {'attempts': 2})
+    assert_that(stages['broken']['error']).is_equal_to('ValueError: bad data')
+    assert_that(stages['other']['status']).is_equal_to(dag.SUCCEEDED)
+    assert_that(stages['merge']['status']).is_equal_to(dag.SKIPPED)
+    assert_that(stages['stage']['status']).is_equal_to(dag.SKIPPED)
+    assert_that(scheduler.results).is_equal_to({'other': 'done'})
+
+
+def test_timeout():
+    """
+    Tests an attempt running past its timeout fails the stage without waiting for it.
+    """
+
+    release = threading.Event()
+    stages = [dag.Stage('hung', lambda inputs: release.wait(5), timeout=0.05)]
+
+    started = time.perf_counter()
+    with pytest.raises(dag.StageError) as error:
+        dag.run_stages(stages)
+    release.set()
+
+    assert_that(time.perf_counter() - started).is_less_than(1)
+    assert_that(error.value.report['stages']['hung']['error']).starts_with('TimeoutError')
+
+
+def test_timeout_not_retried():
+    """
+    Tests a timed out stage is not retried while its abandoned attempt is still running,
+    and the abandoned attempt does not keep the process from exiting.
+    """
+
+    release = threading.Event()
+    attempts = []
+
+    def hung(inputs):
+        attempts.append(threading.current_thread())
+        release.wait(5)
+
+    with pytest.raises(dag.StageError) as error:
+        dag.run_stages([dag.Stage('hung', hung, retries=2, retry_delay=0.01, timeout=0.05)])
+    release.set()
+
+    assert_that(error.value.report['stages']['hung']).contains_entry({'attempts': 1}, {'status': dag.FAILED})
+    assert_that(attempts).is_length(1)
+    assert_that(attempts[0].daemon).is_true()
+
+
+def test_invalid_graphs():
+    """
+    Tests duplicate stages, unknown dependencies and cycles are rejected.
+    """
+
+    def noop(inputs):
+        return None
+
+    assert_that(dag.sort_stages).raises(ValueError).when_called_with(
+        [dag.Stage('a', noop), dag.Stage('a', noop)]).contains('more than once')
+    assert_that(dag.sort_stages).raises(ValueError).when_called_with(
+        [dag.Stage('a', noop, depends=['b'])]).contains('unknown stage b')
+    assert_that(dag.sort_stages).raises(ValueError).when_called_with(
+        [dag.Stage('a', noop, depends=['b']), dag.Stage('b', noop, depends=['a'])]).contains('depend on each other')
+
+
+def test_critical_path():
+    """
+    Tests the critical path follows the slowest chain of stages.
+    """
+
+    stages = [
+        dag.Stage('fast', sleeper(0.01)),
+        dag.Stage('slow', sleeper(0.15)),
+        dag.Stage('merge', sleeper(0.01), depends=['fast', 'slow']),
+        dag.Stage('stage', sleeper(0.01), depends=['merge'])
+    ]
+
+    _, report = dag.run_stages(stages)
+
+    assert_that(report['critical_path']).is_equal_to(['slow', 'merge', 'stage'])
+    assert_that(report['critical_path_seconds']).is_less_than_or_equal_to(report['seconds'])
+
+
+def test_reuse_unchanged_stages(tmp_path):
+    """
+    Tests stages whose inputs did not change reuse their last output and stages depending
+    on a changed output run again.
+    """
+
+    manifest = fingerprint.Manifest(str(tmp_path / 'fingerprints.json'))
+    calls = []
+    source_data = {'a': [1, 2], 'b': [3]}
+
+    def stages():
+        def source(name):
+            return dag.Stage(name, lambda inputs: calls.append(name) or source_data[name])
+
+        return [
+            source('a'),
+            source('b'),
+            dag.Stage('total', lambda inputs: calls.append('total') or sum(inputs['a'] + inputs['b']),
+                      depends=['a', 'b'], reuse=lambda: 6)
+        ]
+
+    _, first = dag.run_stages(stages(), manifest=manifest)
+    results, second = dag.run_stages(stages(), manifest=fingerprint.Manifest(manifest.path))
+    source_data['b'] = [4]
+    changed_results, _ = dag.run_stages(stages(), manifest=fingerprint.Manifest(manifest.path))
+
+    assert_that(first['stages']['total']['status']).is_equal_to(dag.SUCCEEDED)
+    assert_that(second['stages']['total']['status']).is_equal_to(dag.REUSED)
+    assert_that(results['total']).is_equal_to(6)
+    assert_that(changed_results['total']).is_equal_to(7)
+    assert_that(calls.count('total')).is_equal_to(2)
+
+
+def test_reuse_checks_output(tmp_path):
+    """
+    Tests a stage runs again when its last output is missing or no longer matches its fingerprint.
+    """
+
+    manifest = fingerprint.Manifest(str(tmp_path / 'fingerprints.json'))
+    previous = {}
+
+    def load():
+        return previous['value']
+
+    stages = [dag.Stage('stage', lambda inputs: 'value', reuse=load)]
+
+    dag.run_stages(stages, manifest=manifest)
+    _, missing = dag.run_stages(stages, manifest=manifest)
+    previous['value'] = 'changed'
+    _, changed = dag.run_stages(stages, manifest=manifest)
+    previous['value'] = 'value'
+    _, reused = dag.run_stages(stages, manifest=manifest)
+
+    assert_that(missing['stages']['stage']['status']).is_equal_to(dag.SUCCEEDED)
+    assert_that(changed['stages']['stage']['status']).is_equal_to(dag.SUCCEEDED)
+    assert_that(reused['stages']['stage']['status']).is_equal_to(dag.REUSED)
@@ -0,0 +1,78 @@
+"""
+Tests for the aggregated error index.
+"""
+
+import json
+
+from assertpy import assert_that
+
+from data_scripts.helpers import errors
+
+
+def test_add_record():
+    """
+    Tests error codes are counted for each source with sample ids.
+    """
+
+    index = errors.ErrorIndex(sample_size=2)
+    index.add_record({'id': 1, 'file_name': 'snap', 'data_issues': 'name:type;zip_code:minLength'})
+    index.add_record({'id': 2, 'file_name': 'snap', 'data_issues': 'name:type'})
+    index.add_record({'id': 3, 'file_name': 'snap', 'data_issues': 'name:type'})
+    index.add_record({'id': 4, 'file_name': 'wic', 'data_issues': ''})
+
+    result = index.to_dict()
+
+    assert_that(result).is_equal_to({
+        'snap': {
+            'name:type': {'count': 3, 'samples': [1, 2]},
+            'zip_code:minLength': {'count': 1, 'samples': [1]}
+        }
+    })
+    assert_that(index.total()).is_equal_to(4)
+
+
+def test_write(tmp_path):
+    """
+    Tests writing the index adds to the index already in the file.
+    """
+
+    path = str(tmp_path / 'error-index.json')
+    first = errors.ErrorIndex()
+    first.add('snap', ['name:type'], 1)
+    first.write(path, replace=True)
+
+    second = errors.ErrorIndex()
+    second.add('snap', ['name:type'], 2)
+    second.add('merge', ['coordinates:region'], '1;2')
+    second.write(path)
+
+    with open(path, 'r', encoding='utf-8') as input_file:
+        result = json.load(input_file)
+
+    assert_that(result).contains_entry({'merge': {'coordinates:region': {'count': 1, 'samples': ['1;2']}}})
+    assert_that(result['snap']['name:type']).is_equal_to({'count': 2, 'samples': [1, 2]})
+
+
+def test_write_replaces_sources(tmp_path):
+    """
+    Tests the entries of the given sources are replaced instead of added to.
+    """
+
+    path = str(tmp_path / 'error-index.json')
+    first = errors.ErrorIndex()
+    first.add('snap', ['name:type'], 1)
+    first.write(path, replace=True)
+
+    for _ in range(2):
+        merge = errors.ErrorIndex()
+        merge.add('merge', ['coordinates:region'], '1;2')
+        merge.write(path, sources=['merge'])
+    with open(path, 'r', encoding='utf-8') as input_file:
+        rerun = json.load(input_file)
+
+    errors.ErrorIndex().write(path, sources=['merge'])
+    with open(path, 'r', encoding='utf-8') as input_file:
+        fixed = json.load(input_file)
+
+    assert_that(rerun['merge']['coordinates:region']['count']).is_equal_to(1)
+    assert_that(fixed).is_equal_to({'snap': {'name:type': {'count': 1, 'samples': [1]}}})
@@ -0,0 +1,77 @@
+"""
+Unit tests for the Fingerprint Helper
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import fingerprint
+
+
+def test_hash_records():
+    """
+    Tests records have the same fingerprint in memory and read back from a CSV file.
+    """
+
+    columns = ['name', 'zip_code', 'latitude', 'snap', 'phone']
+    in_memory = [{'name': 'Market', 'zip_code': 15213, 'latitude': 40.5, 'snap': True, 'phone': None}]
+    from_file = [{'name': 'Market', 'zip_code': '15213', 'latitude': '40.5', 'snap': 'True', 'phone': '', 'extra': 1}]
+    changed = [{'name': 'Market', 'zip_code': 15213, 'latitude': 40.6, 'snap': True, 'phone': None}]
+
+    assert_that(fingerprint.hash_records(in_memory, columns)).is_equal_to(fingerprint.hash_records(from_file, columns))
+    assert_that(fingerprint.hash_records(in_memory, columns)).is_not_equal_to(
+        fingerprint.hash_records(changed, columns))
+
+
+def test_hash_files(tmp_path):
+    """
+    Tests file fingerprints change with the content and when a file is missing.
+    """
+
+    path = tmp_path / 'a.csv'
+    path.write_text('name\nMarket\n', encoding='utf-8')
+    missing = tmp_path / 'b.csv'
+
+    first = fingerprint.hash_files([str(path), str(missing)])
+    assert_that(fingerprint.hash_files([str(path), str(missing)])).is_equal_to(first)
+
+    missing.write_text('', encoding='utf-8')
+    assert_that(fingerprint.hash_files([str(path), str(missing)])).is_not_equal_to(first)
+
+    path.write_text('name\nGarden\n', encoding='utf-8')
+    missing.unlink()
+    assert_that(fingerprint.hash_files([str(path), str(missing)])).is_not_equal_to(first)
+
+
+def test_get_code_version(tmp_path):
+    """
+    Tests the code version changes with the Python files only.
+    """
+
+    (tmp_path / 'helpers').mkdir()
+    (tmp_path / 'helpers' / 'util.py').write_text('VALUE = 1\n', encoding='utf-8')
+    version = fingerprint.get_code_version(str(tmp_path))
+
+    (tmp_path / 'notes.txt').write_text('notes', encoding='utf-8')
+    assert_that(fingerprint.get_code_version(str(tmp_path))).is_equal_to(version)
+
+    (tmp_path / 'helpers' / 'util.py').write_text('VALUE = 2\n', encoding='utf-8')
+    assert_that(fingerprint.get_code_version(str(tmp_path))).is_not_equal_to(version)
+
+
+def test_manifest(tmp_path):
+    """
+    Tests the manifest returns the output fingerprint of a stage run with the same inputs.
+    """
+
+    path = str(tmp_path / 'fingerprints.json')
+    manifest = fingerprint.Manifest(path)
+    manifest.set('merge', 'inputs', 'output')
+    manifest.set('source', 'inputs', 'output')
+    manifest.remove('source')
+    manifest.save()
+
+    loaded = fingerprint.Manifest(path)
+
+    assert_that(loaded.get_output('merge', 'inputs')).is_equal_to('output')
+    assert_that(loaded.get_output('merge', 'changed')).is_none()
+    assert_that(loaded.get_output('source', 'inputs')).is_none()
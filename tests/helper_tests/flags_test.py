@@ -0,0 +1,125 @@
+"""
+Tests for the bit-packed service flags.
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import flags
+
+
+def test_to_mask():
+    """
+    Tests packing the flag fields of a record into a mask.
+    """
+
+    record = {
+        'snap': True,
+        'wic': False,
+        'fresh_produce': True,
+        'name': 'Corner Store'
+    }
+
+    result = flags.to_mask(record)
+
+    assert_that(result).is_equal_to(flags.SNAP | flags.FRESH_PRODUCE)
+
+
+def test_to_mask_file_values():
+    """
+    Tests values read from a file set the flags they are true for.
+    """
+
+    record = {
+        'snap': 'True',
+        'wic': 1,
+        'fmnp': 'False',
+        'food_bucks': '',
+        'fresh_produce': None
+    }
+
+    assert_that(flags.to_mask(record)).is_equal_to(flags.SNAP | flags.WIC)
+
+
+def test_from_mask():
+    """
+    Tests unpacking a mask back onto the record fields.
+    """
+
+    record = {'name': 'Farmer\'s Market'}
+
+    result = flags.from_mask(flags.FMNP | flags.FOOD_RX, record)
+
+    assert_that(result)\
+        .contains_entry({'fmnp': True})\
+        .contains_entry({'food_rx': True})\
+        .contains_entry({'snap': False})\
+        .contains_entry({'wic': False})\
+        .contains_entry({'food_bucks': False})\
+        .contains_entry({'fresh_produce': False})\
+        .contains_entry({'free_distribution': False})\
+        .contains_entry({'name': 'Farmer\'s Market'})
+
+
+def test_round_trip():
+    """
+    Tests every flag combination survives packing and unpacking.
+    """
+
+    for mask in range(flags.ALL_FLAGS + 1):
+        record = flags.from_mask(mask, {})
+        assert_that(flags.to_mask(record)).is_equal_to(mask)
+
+
+def test_priority_masks():
+    """
+    Tests the winning side is computed from the priority tables.
+    """
+
+    priorities = {
+        'first': {'snap': 1, 'wic': 2},
+        'second': {'snap': 2, 'wic': 1, 'fmnp': 1}
+    }
+
+    masks = flags.priority_masks(priorities)
+
+    assert_that(masks[('first', 'second')]).is_equal_to(
+        (flags.SNAP, flags.WIC | flags.FMNP))
+    assert_that(masks[('second', None)]).is_equal_to(
+        (flags.SNAP | flags.WIC | flags.FMNP, 0))
+    assert_that(masks[(None, None)]).is_equal_to((0, 0))
+
+
+def test_resolve():
+    """
+    Tests resolving flags between two records.
+    """
+
+    source = flags.SNAP | flags.FRESH_PRODUCE
+    target = flags.WIC
+
+    result = flags.resolve(source, target, flags.WIC, flags.SNAP)
+
+    assert_that(result).is_equal_to(flags.FRESH_PRODUCE)
+
+
+def test_resolve_all():
+    """
+    Tests resolving flags between any number of records matches resolving two records.
+    """
+
+    priorities = {
+        'first': {'snap': 1, 'wic': 2},
+        'second': {'snap': 2, 'wic': 1, 'fmnp': 1}
+    }
+    table = flags.priority_table(priorities)
+    masks = flags.priority_masks(priorities)
+
+    for source in range(0, flags.ALL_FLAGS + 1, 5):
+        for target in range(0, flags.ALL_FLAGS + 1, 7):
+            expected = flags.resolve(source, target, *masks[('first', 'second')])
+            assert_that(flags.resolve_all([(source, table['first']), (target, table['second'])])).is_equal_to(expected)
+
+    third = flags.SNAP | flags.FMNP
+    result = flags.resolve_all([(flags.WIC, table['first']), (0, table['second']), (third, table['first'])])
+
+    assert_that(result).is_equal_to(flags.SNAP)
@@ -0,0 +1,82 @@
+"""
+Tests for the deterministic record ids.
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import identity
+
+
+def get_record(**values) -> dict:
+
+    record = {'source_file': 'ARC_GIS_SNAP_QUERY', 'original_id': '', 'type': 'supermarket',
+              'name': 'Giant Eagle 63', 'address': '4250 Murray Ave', 'city': 'Pittsburgh', 'zip_code': '15217'}
+    record.update(values)
+    return record
+
+
+def test_source_key():
+    """
+    Tests the source id is used when present and the normalized content otherwise.
+    """
+
+    assert_that(identity.get_source_key(get_record(original_id='4085'))).is_equal_to('ARC_GIS_SNAP_QUERY|id|4085')
+    assert_that(identity.get_source_key(get_record(original_id='None')))\
+        .is_equal_to(identity.get_source_key(get_record(name='GIANT EAGLE #63', address='4250 Murray Ave.')))
+
+
+def test_hash_id():
+    """
+    Tests ids are stable positive integers that fit a JavaScript number.
+    """
+
+    record_id = identity.hash_id('ARC_GIS_SNAP_QUERY|id|4085')
+
+    assert_that(record_id).is_equal_to(identity.hash_id('ARC_GIS_SNAP_QUERY|id|4085'))
+    assert_that(record_id).is_greater_than(0).is_less_than(2 ** 53)
+    assert_that(identity.hash_id('ARC_GIS_SNAP_QUERY|id|4086')).is_not_equal_to(record_id)
+
+
+def test_id_assigner():
+    """
+    Tests the same records get the same ids in every run, and repeated records get different ids.
+    """
+
+    records = [get_record(original_id='1'), get_record(), get_record(), get_record(name='Aldi')]
+    first = identity.IdAssigner()
+    second = identity.IdAssigner()
+
+    ids = [first.next_id(record) for record in records]
+
+    assert_that(set(ids)).is_length(4)
+    assert_that([second.next_id(record) for record in records]).is_equal_to(ids)
+    assert_that(identity.IdAssigner().next_id(records[3])).is_equal_to(ids[3])
+
+
+def test_id_assigner_namespace():
+    """
+    Tests records of different raw files sharing a source_file get different ids.
+    """
+
+    record = get_record(original_id='1')
+    ids = identity.IdAssigner()
+
+    first = ids.next_id(dict(record), 'jh-fresh-access-raw.csv')
+    second = ids.next_id(dict(record), 'jh-fresh-corners-raw.csv')
+
+    assert_that(second).is_not_equal_to(first)
+    assert_that(identity.IdAssigner().next_id(dict(record), 'jh-fresh-corners-raw.csv')).is_equal_to(second)
+
+
+def test_cluster_id():
+    """
+    Tests the id of a merged record does not depend on the order of its records.
+    """
+
+    records = [get_record(id=11), get_record(id=12, source_file='WIC_WS_QUERY')]
+
+    cluster_id, original_id = identity.cluster_id(records)
+
+    assert_that(identity.cluster_id(list(reversed(records)))).is_equal_to((cluster_id, original_id))
+    assert_that(original_id).is_length(32)
+    assert_that(identity.cluster_id([get_record(id=11), get_record(id=13)])[0]).is_not_equal_to(cluster_id)
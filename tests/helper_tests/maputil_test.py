@@ -368,3 +368,101 @@ def test_apply_schema_to_record():
     assert_that(record['type']).is_type_of(str).is_equal_to('goofy')
     assert_that(record['is_active']).is_type_of(bool).is_false()
     assert_that(record['in_error']).is_type_of(bool).is_true()
+
+
+def test_create_record_copies_template():
+    """
+    Tests every record is a new dictionary with the default values.
+    """
+
+    schema = get_schema()
+    schema['properties']['name'] = {'type': 'string'}
+    schema['properties']['snap'] = {'type': 'boolean'}
+
+    first = maputil.new_record(schema)
+    first['name'] = 'Market'
+    second = maputil.new_record(schema)
+
+    assert_that(type(second)).is_same_as(dict)
+    assert_that(second).is_equal_to({'name': '', 'snap': False})
+
+
+def test_create_record_invalid_field_names():
+    """
+    Tests properties that are not Python identifiers are kept.
+    """
+
+    schema = get_schema()
+    schema['properties']['open-hours'] = {'type': 'string'}
+
+    result = maputil.new_record(schema)
+
+    assert_that(type(result)).is_same_as(dict)
+    assert_that(result).is_equal_to({'open-hours': ''})
+
+
+def test_to_record():
+    """
+    Tests converting a dictionary read from a file to a record.
+    """
+
+    schema = get_schema()
+    schema['properties']['name'] = {'type': 'string'}
+    schema['properties']['latitude'] = {'type': 'number'}
+
+    result = maputil.to_record({'name': 'Market'}, schema)
+
+    assert_that(type(result)).is_same_as(dict)
+    assert_that(result).is_equal_to({'name': 'Market', 'latitude': 0})
+
+
+def test_get_coercer():
+    """
+    Tests the coercer pairs each property with its converter once per schema.
+    """
+
+    schema = get_schema()
+    schema['properties']['name'] = {'type': ['string', 'null']}
+    schema['properties']['latitude'] = {'type': 'number'}
+    schema['properties']['snap'] = {'type': 'boolean'}
+
+    coercer = maputil.get_coercer(schema)
+
+    assert_that(coercer).is_equal_to((('name', str), ('latitude', float), ('snap', maputil.convert_boolean)))
+    assert_that(maputil.get_coercer(schema)).is_same_as(coercer)
+
+
+def test_coerce_columns():
+    """
+    Tests converting whole columns to the schema types.
+    """
+
+    schema = get_schema()
+    schema['properties']['id'] = {'type': 'integer'}
+    schema['properties']['latitude'] = {'type': 'number'}
+    schema['properties']['snap'] = {'type': 'boolean'}
+    columns = {'id': ['1', '2'], 'latitude': ['40.5', '-79.25'], 'snap': ['True', 'False'], 'other': ['a', 'b']}
+
+    result = maputil.coerce_columns(columns, schema, arrays=True)
+
+    assert_that(result['id']).is_equal_to([1, 2])
+    assert_that(list(result['latitude'])).is_equal_to([40.5, -79.25])
+    assert_that(result['latitude'].typecode).is_equal_to('d')
+    assert_that(result['snap']).is_equal_to([True, False])
+    assert_that(result['other']).is_equal_to(['a', 'b'])
+
+
+def test_columns_to_records():
+    """
+    Tests building records from columns.
+    """
+
+    schema = get_schema()
+    schema['properties']['name'] = {'type': 'string'}
+    schema['properties']['latitude'] = {'type': 'number'}
+
+    in_order = maputil.columns_to_records({'name': ['A', 'B'], 'latitude': [1.0, 2.0]}, schema)
+    partial = maputil.columns_to_records({'latitude': [1.0]}, schema)
+
+    assert_that(in_order).is_equal_to([{'name': 'A', 'latitude': 1.0}, {'name': 'B', 'latitude': 2.0}])
+    assert_that(partial).is_equal_to([{'name': '', 'latitude': 1.0}])
@@ -6,7 +6,7 @@ import json
 import os
 
 from assertpy import assert_that
-from data_scripts.helpers import merge
+from data_scripts.helpers import maputil, merge
 
 FARMERS_MARKET = 'farmer\'s market'
 CONVENIENCE_STORE = 'convenience store'
@@ -314,3 +314,393 @@ def test_deduplicate_merge():
         .contains_entry({'snap': False})\
         .contains_entry({'merged_record': True})\
         .contains_entry({'group_id': '234987234;234876234'})  
+
+
+def test_resolve_flags_hierarchy():
+    """
+    Tests the flags are resolved from the source hierarchy in a single pass.
+    """
+
+    source = {
+        'source_file': 'WIC_WS_QUERY',
+        'wic': False,
+        'snap': True,
+        'food_rx': True
+    }
+
+    target = {
+        'source_file': 'ARC_GIS_SNAP_QUERY',
+        'wic': True,
+        'snap': False,
+        'food_rx': False
+    }
+
+    result = merge.resolve_flags(source, target)
+
+    assert_that(result & merge.flags.WIC).is_zero()
+    assert_that(result & merge.flags.SNAP).is_zero()
+    assert_that(result & merge.flags.FOOD_RX).is_not_zero()
+    assert_that(merge.get_flag_value(source, target, 'snap')).is_false()
+
+
+def test_merge_record_carries_errors():
+    """
+    Tests the merged record keeps the error codes of unchanged fields and validates the changed fields.
+    """
+
+    source = {
+        'id': '334555',
+        'name': 'Kuhn\'s',
+        'type': SUPERMARKET,
+        'address': '700 North St',
+        'phone': '412-555-1234',
+        'longitude': -80.0,
+        'latitude': 40.4,
+        'source_file': 'WIC_WS_QUERY',
+        'data_issues': 'phone:minLength;name:type'
+    }
+
+    target = {
+        'id': '3333425',
+        'name': 'Green Grocer - Kuhn\'s Market',
+        'type': SUPERMARKET,
+        'address': '700 North St',
+        'phone': '412-555-1234',
+        'longitude': -80.0,
+        'latitude': 40.4,
+        'source_file': 'ARC_GIS_SNAP_QUERY',
+        'data_issues': ''
+    }
+
+    schema = load_schema()
+    result = merge.merge_records(source, target, schema)
+
+    assert_that(result['data_issues'].split(';'))\
+        .contains('phone:minLength', 'city:minLength')\
+        .does_not_contain('name:type', 'latitude:type')
+    assert_that(result).contains_entry({'in_error': True})
+
+
+def test_deduplicate_cluster_order():
+    """
+    Tests three records at the same address are merged into one record in any order.
+    """
+
+    schema = load_schema()
+
+    def get_records():
+        records = []
+        for record_id, name, wic in [(11, 'Penn Farmer\'s Market', False), (12, 'Penn Farmers Market', True),
+                                     (13, 'The Penn Farmer\'s Market', False)]:
+            record = maputil.new_record(schema)
+            record.update({'id': str(record_id), 'name': name, 'type': FARMERS_MARKET, 'address': '700 Penn Ave',
+                           'wic': wic, 'longitude': 90, 'latitude': 80, 'source_file': 'ARC_GIS_FMNP_QUERY'})
+            records.append(record)
+        return records
+
+    results = []
+    for order in [[0, 1, 2], [2, 0, 1], [1, 2, 0]]:
+        records = get_records()
+        result = merge.deduplicate([records[index] for index in order], schema)
+        assert_that(result['records']).is_length(1)
+        assert_that(result['duplicates']).is_length(3)
+        results.append({key: value for key, value in result['records'][0].items() if key != 'original_id'})
+
+    assert_that(results[0])\
+        .contains_entry({'group_id': '13;12;11'})\
+        .contains_entry({'name': 'The Penn Farmer\'s Market'})\
+        .contains_entry({'wic': True})
+    assert_that(results[1]).is_equal_to(results[0])
+    assert_that(results[2]).is_equal_to(results[0])
+
+
+def test_deduplicate_nearby():
+    """
+    Tests records with different addresses for the same location are merged when they are close together.
+    """
+
+    schema = load_schema()
+
+    def get_records():
+        records = []
+        for record_id, name, address, latitude in [(21, 'Giant Eagle 63', '4250 Murray Ave', 40.42256),
+                                                   (22, 'Giant Eagle Greenfield #63', '4250 MURRAY AVENUE', 40.42229),
+                                                   (23, 'Giant Eagle Express', '4300 Murray Ave', 40.42240)]:
+            record = maputil.new_record(schema)
+            record.update({'id': record_id, 'name': name, 'type': SUPERMARKET, 'address': address,
+                           'longitude': -79.9289, 'latitude': latitude, 'source_file': 'ARC_GIS_SNAP_QUERY'})
+            records.append(record)
+        return records
+
+    result = merge.deduplicate(get_records(), schema)
+
+    assert_that(result['records']).is_length(2)
+    assert_that(result['duplicates']).is_length(2)
+    assert_that([record['group_id'] for record in result['records']]).contains('22;21')
+
+    result = merge.deduplicate(get_records(), schema, distance=0)
+
+    assert_that(result['records']).is_length(3)
+    assert_that(result['duplicates']).is_empty()
+
+
+def test_is_similar_name():
+    """
+    Tests the name comparison used for records near each other.
+    """
+
+    assert_that(merge.is_similar_name('Giant Eagle 63', 'Giant Eagle Greenfield #63')).is_true()
+    assert_that(merge.is_similar_name('Dollar General 21679', 'Family Dollar Store 7104')).is_false()
+    assert_that(merge.is_similar_name('', 'Family Dollar Store 7104')).is_false()
+
+
+def test_deduplicate_similar_names():
+    """
+    Tests records with similar names at the same street number and zip code are merged.
+    """
+
+    schema = load_schema()
+
+    def get_records():
+        records = []
+        for record_id, name, address, zip_code in [(31, 'Olympia Shop N Save', '4313 Walnut Street', '15132'),
+                                                   (32, 'Olympia Shop-n-Save', '4313 Walnut St., McKeesport', '15132'),
+                                                   (33, 'Olympia Shop N Save', '4313 Walnut Ave', '15222'),
+                                                   (34, 'Olympia Shop N Save 2', '4313 Walnut Rd', '15132')]:
+            record = maputil.new_record(schema)
+            record.update({'id': record_id, 'name': name, 'type': SUPERMARKET, 'address': address,
+                           'zip_code': zip_code, 'source_file': 'ARC_GIS_SNAP_QUERY'})
+            records.append(record)
+        return records
+
+    result = merge.deduplicate(get_records(), schema)
+
+    assert_that(result['records']).is_length(3)
+    assert_that([record['group_id'] for record in result['records']]).contains('32;31')
+    assert_that(result['blocking'])\
+        .contains_entry({'records': 4})\
+        .contains_entry({'pairs': 1})\
+        .contains_key('candidates', 'records_per_second', 'recall')
+
+    result = merge.deduplicate(get_records(), schema, name_similarity=0)
+
+    assert_that(result['records']).is_length(4)
+    assert_that(result['blocking']).is_empty()
+
+
+def test_deduplicate_reuses_state():
+    """
+    Tests clusters with unchanged members reuse the merged record of the previous run.
+    """
+
+    schema = load_schema()
+
+    def get_records(name):
+        records = []
+        for record_id, record_name, address in [(41, 'Aldi 73', '100 Main St'), (42, 'Aldi #73', '100 Main St'),
+                                                (43, name, '200 Main St'), (44, 'Aldi #88', '200 Main St')]:
+            record = maputil.new_record(schema)
+            record.update({'id': record_id, 'name': record_name, 'type': SUPERMARKET, 'address': address,
+                           'source_file': 'ARC_GIS_SNAP_QUERY'})
+            records.append(record)
+        return records
+
+    first = merge.deduplicate(get_records('Aldi 88'), schema)
+    second = merge.deduplicate(get_records('Aldi 88'), schema, state=first['state'])
+
+    assert_that(first['state']['clusters']).is_length(2)
+    assert_that(first['reused']).is_equal_to(0)
+    assert_that(second['reused']).is_equal_to(2)
+    assert_that(second['records']).is_equal_to(first['records'])
+
+    changed = merge.deduplicate(get_records('ALDI 88'), schema, state=second['state'])
+
+    assert_that(changed['reused']).is_equal_to(1)
+    assert_that(changed['state']['clusters']).is_length(2)
+    assert_that(set(changed['state']['clusters']) & set(first['state']['clusters'])).is_length(1)
+
+
+def test_deduplicate_rebuilds_changed_blocks():
+    """
+    Tests only the blocks with changed records are clustered again, with the same result as
+    clustering every record.
+    """
+
+    schema = load_schema()
+
+    def get_records(latitude):
+        records = []
+        for record_id, record_name, address, zip_code, point in [
+                (51, 'Aldi 73', '100 Main St', '15213', (40.44, -79.95)),
+                (52, 'Aldi', '100 Main Street', '15213', (40.44, -79.9501)),
+                (53, 'Aldi 88', '200 Oak St', '15106', (40.40, -80.09)),
+                (54, 'Aldi #88', '200 Oak Street', '15106', (latitude, -80.09)),
+                (55, 'Sunoco', '300 Elm St', '15106', (40.40, -80.09))]:
+            record = maputil.new_record(schema)
+            record_type = CONVENIENCE_STORE if record_name == 'Sunoco' else SUPERMARKET
+            record.update({'id': record_id, 'name': record_name, 'type': record_type, 'address': address,
+                           'zip_code': zip_code, 'latitude': point[0], 'longitude': point[1],
+                           'source_file': 'ARC_GIS_SNAP_QUERY'})
+            records.append(record)
+        return records
+
+    first = merge.deduplicate(get_records(40.40), schema)
+    second = merge.deduplicate(get_records(40.40), schema, state=first['state'])
+    moved = merge.deduplicate(get_records(40.41), schema, state=second['state'])
+
+    assert_that(first['blocks']).is_equal_to({'blocks': 3, 'rebuilt': 3, 'records': 5})
+    assert_that(first['records']).is_length(3)
+    assert_that(second['blocks']).is_equal_to({'blocks': 3, 'rebuilt': 0, 'records': 0})
+    assert_that(second['records']).is_equal_to(first['records'])
+    assert_that(moved['blocks']).is_equal_to({'blocks': 3, 'rebuilt': 1, 'records': 2})
+    assert_that(moved['records']).is_equal_to(merge.deduplicate(get_records(40.41), schema)['records'])
+
+
+def test_deduplicate_incremental_matches_full_run():
+    """
+    Tests runs reusing the state of the previous run give the same records as clustering every
+    record, and a block whose stored clusters no longer fit is clustered again.
+    """
+
+    schema = load_schema()
+
+    def get_records(rows):
+        records = []
+        for record_id, record_name, address, point in rows:
+            record = maputil.new_record(schema)
+            record.update({'id': record_id, 'name': record_name, 'type': SUPERMARKET, 'address': address,
+                           'latitude': point[0], 'longitude': point[1], 'source_file': 'ARC_GIS_SNAP_QUERY'})
+            records.append(record)
+        return records
+
+    far = [(61, 'Aldi', '1 Main St', (25.0, -80.0)), (62, 'Aldi', '2 Main St', (47.0, -80.0))]
+    near = [(63, 'Giant Eagle', '100 Oak St', (40.44, -79.95)), (64, 'Giant Eagle', '150 Oak St', (40.44, -79.95058))]
+
+    first = merge.deduplicate(get_records(far), schema)
+    second = merge.deduplicate(get_records(far + near), schema, state=first['state'])
+    third = merge.deduplicate(get_records(far + near), schema, state=second['state'])
+    full = merge.deduplicate(get_records(far + near), schema)
+
+    assert_that(second['records']).is_equal_to(full['records'])
+    assert_that(third['records']).is_equal_to(full['records'])
+    assert_that(third['state']).is_equal_to(full['state'])
+    assert_that(merge.restore_clusters([0], ['a'], [['a', 'b']])).is_none()
+    assert_that(merge.restore_clusters([0, 1], ['a', 'b'], [['a', 'b']])).is_equal_to([[0, 1]])
+
+
+def test_partition():
+    """
+    Tests clusters are split into chunks of about the same total size.
+    """
+
+    chunks = merge.partition([9, 1, 1, 5, 4, 1, 3], 3)
+
+    assert_that(chunks).is_length(3)
+    assert_that(sorted(item for chunk in chunks for item in chunk)).is_equal_to(list(range(7)))
+    totals = [sum([9, 1, 1, 5, 4, 1, 3][item] for item in chunk) for chunk in chunks]
+    assert_that(max(totals)).is_equal_to(9)
+    assert_that(min(totals)).is_greater_than_or_equal_to(7)
+    assert_that(merge.partition([2], 4)).is_equal_to([[0]])
+    assert_that(merge.partition([], 4)).is_empty()
+
+
+def test_deduplicate_workers():
+    """
+    Tests merging the clusters in a process pool gives the same records in the same order.
+    """
+
+    schema = load_schema()
+
+    def get_records():
+        records = []
+        for index in range(12):
+            for copy in range(index % 3 + 2):
+                record = maputil.new_record(schema)
+                record.update({'id': index * 10 + copy, 'name': f"Aldi {index}", 'type': SUPERMARKET,
+                               'address': f"{index} Main St", 'wic': copy == 1, 'source_file': 'ARC_GIS_SNAP_QUERY'})
+                records.append(record)
+        return records
+
+    def get_values(result):
+        return [{key: value for key, value in record.items() if key != 'original_id'} for record in result['records']]
+
+    serial = merge.deduplicate(get_records(), schema, workers=1)
+    parallel = merge.deduplicate(get_records(), schema, workers=2)
+
+    assert_that(parallel['records']).is_length(12)
+    assert_that(get_values(parallel)).is_equal_to(get_values(serial))
+    assert_that([record['group_id'] for record in parallel['records']]).contains('42;41;40')
+    assert_that(parallel['blocks']).is_equal_to({'blocks': 12, 'rebuilt': 12, 'records': 36})
+    assert_that(parallel['blocking']).contains_entry({'records': 36}, {'pairs': serial['blocking']['pairs']})
+
+
+def test_deduplicate_workers_same_state():
+    """
+    Tests the blocks clustered in a pool give the same clusters and state for any number of workers.
+    """
+
+    schema = load_schema()
+
+    def get_records():
+        records = []
+        for index in range(16):
+            for copy in range(2):
+                record = maputil.new_record(schema)
+                record.update({'id': index * 10 + copy, 'name': 'Giant Eagle', 'type': SUPERMARKET,
+                               'address': f"{index * 10 + copy} Oak St", 'latitude': 40.44 + index * 0.01,
+                               'longitude': -79.95 - copy * 0.0004 * (index % 3), 'source_file': 'ARC_GIS_SNAP_QUERY'})
+                records.append(record)
+        return records
+
+    serial = merge.deduplicate(get_records(), schema, workers=1)
+    parallel = merge.deduplicate(get_records(), schema, workers=4)
+
+    assert_that(parallel['state']).is_equal_to(serial['state'])
+    assert_that(parallel['records']).is_equal_to(serial['records'])
+    assert_that(parallel['blocks']).is_equal_to(serial['blocks']).contains_entry({'blocks': 16})
+
+
+def test_combine_blocking():
+    """
+    Tests the name blocking statistics of chunks clustered in separate workers are added up.
+    """
+
+    chunk = {'records': 10, 'candidates': 4, 'pairs': 2, 'seconds': 0.5, 'records_per_second': 20,
+             'sampled': 10, 'similar_pairs': 3, 'candidate_pairs': 2, 'recall': 2 / 3}
+    other = dict(chunk, records=30, similar_pairs=1, candidate_pairs=1, seconds=1.5)
+
+    combined = merge.combine_blocking([chunk, other])
+
+    assert_that(combined).contains_entry({'records': 40}, {'candidates': 8}, {'pairs': 4}, {'seconds': 2.0},
+                                          {'records_per_second': 20}, {'similar_pairs': 4}, {'recall': 0.75})
+    assert_that(merge.combine_blocking([chunk])).is_equal_to(chunk)
+    assert_that(merge.combine_blocking([{}, {}])).is_empty()
+
+
+def test_merge_cluster():
+    """
+    Tests merging more than two records at once resolves each flag by source priority and keeps the longest values.
+    """
+
+    schema = load_schema()
+    records = []
+    for record_id, name, source_file, values in [
+            (53, 'Giant Eagle', 'ARC_GIS_SNAP_QUERY', {'snap': True, 'wic': False, 'latitude': 40.1, 'longitude': -79.1}),
+            (52, 'Giant Eagle Market District', 'WIC_WS_QUERY', {'snap': False, 'wic': True, 'latitude': 40.2, 'longitude': -79.2}),
+            (51, 'Giant Eagle', 'FART_FILE', {'snap': False, 'wic': False, 'food_rx': True, 'phone': '412-555-0100'})]:
+        record = maputil.new_record(schema)
+        record.update({'id': record_id, 'name': name, 'type': SUPERMARKET, 'address': '100 Main St', 'source_file': source_file})
+        record.update(values)
+        records.append(record)
+
+    result = merge.merge_cluster(records, schema)
+
+    assert_that(result)\
+        .contains_entry({'name': 'Giant Eagle Market District'})\
+        .contains_entry({'phone': '412-555-0100'})\
+        .contains_entry({'snap': True})\
+        .contains_entry({'wic': True})\
+        .contains_entry({'food_rx': True})\
+        .contains_entry({'latitude': 40.2})\
+        .contains_entry({'group_id': '53;52;51'})\
+        .contains_entry({'merged_record': True})
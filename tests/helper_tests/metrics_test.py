@@ -0,0 +1,80 @@
+"""
+Unit tests for the Metrics Helper
+"""
+
+import json
+import threading
+
+import responses
+from assertpy import assert_that
+
+from data_scripts.helpers import metrics, web
+
+
+def test_stage_metrics():
+    """
+    Tests spans and counters are grouped by the stage running in each thread.
+    """
+
+    run_metrics = metrics.reset()
+
+    @metrics.timed(metrics.VALIDATE)
+    def validate():
+        metrics.count(metrics.ERRORS)
+
+    def run(name: str, records: int):
+        metrics.count(metrics.RECORDS_IN, records)
+        with metrics.span(metrics.MAP):
+            for _ in range(records):
+                validate()
+
+    threads = [threading.Thread(target=metrics.bind(name, run), args=(name, records))
+               for name, records in (('a_source', 3), ('b_source', 2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    a_source = run_metrics.get_stage('a_source')
+    assert_that(a_source['counters']).is_equal_to({'errors': 3, 'records_in': 3})
+    assert_that(a_source['spans']['map']['calls']).is_equal_to(1)
+    assert_that(a_source['spans']['validate']['calls']).is_equal_to(3)
+    assert_that(run_metrics.get_totals()).contains_entry(
+        {'records_in': 5}, {'errors': 5}, {'validate_calls': 5}, {'map_calls': 2})
+
+
+@responses.activate
+def test_fetch_metrics():
+    """
+    Tests web requests are recorded as fetches with the bytes downloaded.
+    """
+
+    responses.add(responses.GET, 'https://example.com/sites', body='x' * 100)
+    web.close_session()
+    run_metrics = web.metrics.reset()
+
+    with web.metrics.stage('snap_source'):
+        web.get_session().get('https://example.com/sites')
+    web.close_session()
+
+    snap = run_metrics.get_stage('snap_source')
+    assert_that(snap['spans']['fetch']['calls']).is_equal_to(1)
+    assert_that(snap['counters']).is_equal_to({'bytes_downloaded': 100})
+
+
+def test_report_files(tmp_path):
+    """
+    Tests the report is replaced and the trend file is appended every run.
+    """
+
+    report_path = str(tmp_path / 'run-report.json')
+    trend_path = str(tmp_path / 'run-trend.ndjson')
+
+    for seconds in (1.5, 2.5):
+        metrics.write_report(report_path, {'seconds': seconds})
+        metrics.append_trend(trend_path, {'seconds': seconds})
+
+    with open(report_path, encoding='utf-8') as report_file:
+        assert_that(json.load(report_file)).is_equal_to({'seconds': 2.5})
+    with open(trend_path, encoding='utf-8') as trend_file:
+        assert_that([json.loads(line) for line in trend_file]).is_equal_to([{'seconds': 1.5}, {'seconds': 2.5}])
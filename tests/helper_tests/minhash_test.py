@@ -0,0 +1,81 @@
+"""
+Tests for the MinHash signatures and LSH buckets.
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import minhash
+
+
+def test_get_shingles():
+    """
+    Tests names are shingled ignoring case and punctuation.
+    """
+
+    assert_that(minhash.get_shingles('Shop-N-Save')).is_equal_to(minhash.get_shingles('shop n save'))
+    assert_that(minhash.get_shingles('Aldi')).contains(' al', 'ldi', 'di ')
+    assert_that(minhash.get_shingles('--')).is_empty()
+
+
+def test_jaccard():
+    """
+    Tests the Jaccard similarity of two sets.
+    """
+
+    assert_that(minhash.jaccard(frozenset('abc'), frozenset('abd'))).is_equal_to(0.5)
+    assert_that(minhash.jaccard(frozenset(), frozenset('abd'))).is_equal_to(0)
+
+
+def test_signature_deterministic():
+    """
+    Tests signatures do not change between hashers and estimate the similarity.
+    """
+
+    first = minhash.get_shingles('Giant Eagle Market District')
+    second = minhash.get_shingles('Giant Eagle Market District Express')
+    signature = minhash.MinHasher().signature(first)
+    other = minhash.MinHasher().signature(second)
+
+    assert_that(signature).is_length(minhash.BANDS * minhash.ROWS)
+    assert_that(signature).is_equal_to(minhash.MinHasher().signature(first))
+    estimate = sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+    assert_that(estimate).is_close_to(minhash.jaccard(first, second), 0.25)
+    assert_that(minhash.MinHasher().signature(frozenset())).is_empty()
+
+
+def test_lsh_pairs():
+    """
+    Tests similar names in the same block become candidates while different names and blocks do not.
+    """
+
+    names = ['Olympia Shop N Save', 'Olympia Shop-N-Save', 'Kiev International Market', 'Olympia Shop N Save']
+    keys = ['15213', '15213', '15213', '15222']
+    hasher = minhash.MinHasher()
+    index = minhash.LSHIndex()
+    for item, name in enumerate(names):
+        index.add(item, hasher.signature(minhash.get_shingles(name)), keys[item])
+
+    assert_that(index.pairs()).is_equal_to({(0, 1)})
+
+
+def test_candidate_probability():
+    """
+    Tests the LSH settings find similar names and skip different ones.
+    """
+
+    assert_that(minhash.candidate_probability(0.6)).is_greater_than(0.98)
+    assert_that(minhash.candidate_probability(0.1)).is_less_than(0.05)
+
+
+def test_estimate_recall():
+    """
+    Tests the recall is the share of the similar pairs found in the candidates.
+    """
+
+    shingles = [minhash.get_shingles(name) for name in ['Aldi Market', 'Aldi Markets', 'Aldi Market', 'Target']]
+    keys = ['15213', '15213', '15213', '15213']
+
+    result = minhash.estimate_recall(shingles, keys, {(0, 1), (0, 2)}, 0.6)
+
+    assert_that(result).contains_entry({'similar_pairs': 3}).contains_entry({'candidate_pairs': 2})
+    assert_that(result['recall']).is_close_to(2 / 3, 0.001)
@@ -0,0 +1,120 @@
+"""
+Tests for the Rules Engine profiler.
+"""
+
+import json
+import threading
+
+from assertpy import assert_that
+
+from data_scripts.helpers import maputil, rules
+from data_scripts.helpers.rules import RulesEngine
+
+profiling = rules.profiling
+
+
+def load_schema() -> dict:
+    """
+    Loads the JSON Schema for the Data sets.
+    """
+
+    with open('./food-data/schema/map-data-schema.json', 'r', encoding='utf-8') as schema_file:
+        return json.load(schema_file)
+
+
+def get_record() -> dict:
+    """
+    Provides a farmer's market record based on the Data Schema.
+
+    Returns:
+        dict: Dictionary
+    """
+
+    record = maputil.new_record(load_schema())
+    record['type'] = "farmer's market"
+    record['name'] = "Happy Farmer's Market"
+    return record
+
+
+def test_profiling_disabled():
+    """
+    Tests the rule methods are not wrapped when profiling is disabled.
+    """
+
+    profiling.disable()
+
+    assert_that(profiling.get_profiler()).is_none()
+    assert_that(RulesEngine.apply_global_rules.__qualname__).is_equal_to('RulesEngine.apply_global_rules')
+    assert_that(RulesEngine.apply_global_rules).is_same_as(vars(RulesEngine)['apply_global_rules'])
+
+
+def test_profiling_counts():
+    """
+    Tests the calls and changed fields are recorded for each rule.
+    """
+
+    original = vars(RulesEngine)['apply_global_rules']
+    profiler = profiling.enable(source='fmnp_source')
+    try:
+        for _ in range(3):
+            RulesEngine(get_record()).apply_global_rules().apply_grow_pgh_rules().commit()
+        RulesEngine.apply_batch([get_record(), get_record()]).apply_food_bank_rules().commit()
+    finally:
+        profiling.disable()
+
+    stats = profiler.to_dict()['fmnp_source']
+    assert_that(stats).contains_key('apply_global_rules', 'apply_grow_pgh_rules', 'apply_food_bank_rules')
+    assert_that(stats['apply_global_rules'])\
+        .contains_entry({'calls': 3})\
+        .contains_entry({'changed': 9})
+    assert_that(stats['apply_grow_pgh_rules']).contains_entry({'changed': 0})
+    assert_that(stats['apply_food_bank_rules']).contains_entry({'calls': 1})
+    assert_that(vars(RulesEngine)['apply_global_rules']).is_same_as(original)
+
+
+def test_profiling_stages():
+    """
+    Tests the statistics are grouped by the pipeline stage running the rules in each thread.
+    """
+
+    metrics = profiling.metrics
+    profiler = profiling.enable(source='pipeline')
+    try:
+        def run():
+            for _ in range(50):
+                RulesEngine(get_record()).apply_global_rules().commit()
+
+        threads = [threading.Thread(target=metrics.bind(name, run)) for name in ('a_source', 'b_source')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        RulesEngine(get_record()).apply_global_rules().commit()
+    finally:
+        profiling.disable()
+
+    stats = profiler.to_dict()
+    assert_that(stats).contains_only('a_source', 'b_source', 'pipeline')
+    assert_that(stats['a_source']['apply_global_rules']).contains_entry({'calls': 50})
+    assert_that(stats['b_source']['apply_global_rules']).contains_entry({'calls': 50})
+    assert_that(stats['pipeline']['apply_global_rules']).contains_entry({'calls': 1})
+
+
+def test_profiling_write(tmp_path):
+    """
+    Tests the report keeps the statistics of other sources.
+    """
+
+    path = tmp_path / 'rules-profile.json'
+    path.write_text(json.dumps({'snap_source': {'apply_global_rules': {'calls': 1}}}))
+
+    profiler = profiling.RulesProfiler('wic_source')
+    profiler.record('apply_global_rules', 2, 0.5)
+    profiler.write(str(path))
+
+    report = json.loads(path.read_text())
+    assert_that(report).contains_key('snap_source', 'wic_source')
+    assert_that(report['wic_source']['apply_global_rules'])\
+        .contains_entry({'calls': 1})\
+        .contains_entry({'changed': 2})\
+        .contains_entry({'seconds': 0.5})
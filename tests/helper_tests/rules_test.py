@@ -2,12 +2,15 @@
 Tests for Rules Engine.
 """
 
+import copy
 import json
+import random
 from datetime import datetime, timedelta
 
 from assertpy import assert_that
 
 from data_scripts.helpers import maputil
+from data_scripts.helpers import rules
 from data_scripts.helpers.rules import RulesEngine
 
 FARMER_MARKET = "farmer's market"
@@ -688,3 +691,135 @@ def test_summer_mean_site_inactive_range(monkeypatch):
     result = engine.apply_global_rules().apply_summer_meal_rules().commit()
 
     assert_that(result).contains_entry({'active_record': False})
+
+
+def build_batch_records(count: int) -> list:
+    """
+    Builds a varied set of records for comparing the batch and record rules.
+
+    Args:
+        count (int): Number of records
+
+    Returns:
+        list: List of records
+    """
+
+    rand = random.Random(42)
+    types = [FARMER_MARKET, FOOD_BANK, SUMMER_MEAL_SITE, 'supermarket',
+             'convenience store', 'grow pgh garden', 'other']
+    source_files = ['Just Harvest Fresh Corner Stores.xlsx', 'Just Harvest - Fresh Access Markets.xlsx',
+                    'Allegheny_County_WIC_Vendor_Locations.xlsx', 'GPCFB - Green Grocer.xlsx',
+                    'Greater Pittsburgh Community Food Bank', 'PA.xlsx', 'ARC_GIS_SNAP_QUERY']
+    names = ["Bloomfield Farmer's Market", "Community Green Grocer", 'Giant Eagle', 'Corner Mart']
+    descriptions = ['Fresh produce available', 'Groceries on Tuesday', '', None]
+    records = []
+    for _ in range(count):
+        record = get_record()
+        record['type'] = rand.choice(types)
+        record['source_file'] = rand.choice(source_files)
+        record['source_org'] = rand.choice([JUST_HARVEST_SOURCE, 'PFPC'])
+        record['name'] = rand.choice(names)
+        record['location_description'] = rand.choice(descriptions)
+        for field in ['snap', 'wic', 'fmnp', 'food_bucks', 'fresh_produce', 'free_distribution', 'food_rx']:
+            record[field] = rand.random() < 0.3
+        records.append(record)
+    return records
+
+
+def test_apply_batch_matches_record_rules(monkeypatch):
+    """
+    Tests the batch rules produce the same records as the record rules.
+    """
+
+    for current_date in [datetime(2023, 7, 1), datetime(2023, 10, 1), datetime(2023, 1, 15)]:
+        records = build_batch_records(300)
+        expected = []
+        for record in copy.deepcopy(records):
+            engine = RulesEngine(record)
+            monkeypatch.setattr(engine, 'get_current_date', lambda: current_date)
+            expected.append(engine
+                            .apply_global_rules()
+                            .apply_farmer_market_rules()
+                            .apply_fresh_access_rules()
+                            .apply_fresh_corners_rules()
+                            .apply_bridgeway_rules()
+                            .apply_food_bank_rules()
+                            .apply_summer_meal_rules()
+                            .apply_grow_pgh_rules()
+                            .commit())
+
+        engine = RulesEngine.apply_batch(records)
+        monkeypatch.setattr(engine, 'get_current_date', lambda: current_date)
+        result = engine\
+            .apply_global_rules()\
+            .apply_farmer_market_rules()\
+            .apply_fresh_access_rules()\
+            .apply_fresh_corners_rules()\
+            .apply_bridgeway_rules()\
+            .apply_food_bank_rules()\
+            .apply_summer_meal_rules()\
+            .apply_grow_pgh_rules()\
+            .commit()
+
+        assert_that(result).is_equal_to(expected)
+
+
+def test_apply_batch_without_global_rules():
+    """
+    Tests the batch keeps the active flag when no rule sets it.
+    """
+
+    records = build_batch_records(50)
+    for record in records:
+        record['type'] = 'grow pgh garden'
+        record['active_record'] = False
+
+    result = RulesEngine.apply_batch(records).apply_grow_pgh_rules().commit()
+
+    for record in result:
+        assert_that(record)\
+            .contains_entry({'active_record': False})\
+            .contains_entry({'fresh_produce': True})\
+            .contains_entry({'snap': False})\
+            .contains_entry({'free_distribution': False})
+
+
+def test_apply_batch_columns(monkeypatch):
+    """
+    Tests the batch rules applied to a column batch match the record rules.
+    """
+
+    records = build_batch_records(100)
+    columns = {key: [record[key] for record in records] for key in records[0].keys()}
+    expected = [RulesEngine(record).apply_global_rules().apply_food_bank_rules().apply_grow_pgh_rules().commit()
+                for record in records]
+
+    batch = rules.RecordBatch.from_columns(columns)
+    result = RulesEngine.apply_batch(batch)\
+        .apply_global_rules()\
+        .apply_food_bank_rules()\
+        .apply_grow_pgh_rules()\
+        .commit()
+
+    assert_that(result).is_same_as(batch)
+    assert_that(result.to_records()).is_equal_to(expected)
+
+
+def test_rules_share_run_context():
+    """
+    Tests records evaluated with the same run context use the same evaluation instant.
+    """
+
+    run = rules.RunContext(datetime(2023, 7, 1))
+    market = get_record()
+    market['type'] = FARMER_MARKET
+    market['name'] = "Happy Farmer's Market"
+    summer = get_record()
+    summer['type'] = SUMMER_MEAL_SITE
+
+    market_engine = RulesEngine(market, run)
+    summer_engine = RulesEngine(summer, run)
+
+    assert_that(market_engine.get_current_date()).is_same_as(summer_engine.get_current_date())
+    assert_that(market_engine.apply_farmer_market_rules().commit()).contains_entry({'active_record': True})
+    assert_that(summer_engine.apply_summer_meal_rules().commit()).contains_entry({'active_record': True})
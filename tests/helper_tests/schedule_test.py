@@ -0,0 +1,187 @@
+"""
+Tests for the schedule parser and the open hours index.
+"""
+
+from datetime import datetime
+
+from assertpy import assert_that
+
+from data_scripts.helpers import schedule
+
+TUESDAY = datetime(2024, 7, 2, 10, 30)
+
+
+def test_parse_weekday_hours():
+    """
+    Tests weekdays followed by hours.
+    """
+
+    schedules = schedule.parse_schedule('Tuesdays 9am-1pm')
+
+    assert_that(schedules).is_length(1)
+    assert_that(schedules[0].weekdays).is_equal_to(1 << 1)
+    assert_that(schedules[0].hours).is_equal_to(((9 * 60, 13 * 60),))
+    assert_that(schedules[0].start).is_none()
+
+
+def test_parse_date_range():
+    """
+    Tests a date range with a weekday range, and afternoon hours without a suffix.
+    """
+
+    schedules = schedule.parse_schedule('June 1 - October 31 Mon-Fri 10:00-2:00')
+
+    assert_that(schedules).is_length(1)
+    assert_that(schedules[0].start).is_equal_to((6, 1))
+    assert_that(schedules[0].end).is_equal_to((10, 31))
+    assert_that(schedules[0].weekdays).is_equal_to(0b0011111)
+    assert_that(schedules[0].hours).is_equal_to(((10 * 60, 14 * 60),))
+
+
+def test_parse_ordinal_weekday():
+    """
+    Tests ordinal weekdays limit the schedule to those weekdays of the month.
+    """
+
+    schedules = schedule.parse_schedule('2nd Saturday of every month 10-12')
+
+    assert_that(schedules).is_length(1)
+    assert_that(schedules[0].weekdays).is_equal_to(1 << 5)
+    assert_that(schedules[0].hours).is_equal_to(((10 * 60, 12 * 60),))
+    assert_that(schedules[0].occurrences).is_equal_to((2,))
+    assert_that(schedule.parse_schedule('1st and 3rd Saturday 9am-noon')[0].occurrences).is_equal_to((1, 3))
+
+
+def test_parse_repeated_ordinal_weekday():
+    """
+    Tests an ordinal weekday mentioned again without hours limits the matching weekdays of
+    the previous schedule.
+    """
+
+    schedules = schedule.parse_schedule('Tue & Sat 9-12, last Sat of the month')
+
+    assert_that(schedules).is_length(2)
+    assert_that(schedules[0]).is_equal_to(schedule.Schedule(None, None, 1 << 1, ((9 * 60, 12 * 60),)))
+    assert_that(schedules[1]).is_equal_to(schedule.Schedule(None, None, 1 << 5, ((9 * 60, 12 * 60),), (-1,)))
+
+
+def test_parse_unknown():
+    """
+    Tests text without a schedule returns no schedules.
+    """
+
+    assert_that(schedule.parse_schedule('Contact site for details')).is_empty()
+    assert_that(schedule.parse_schedule('')).is_empty()
+
+
+def test_parse_memoized():
+    """
+    Tests the same text is only parsed once.
+    """
+
+    schedule.parse_schedule.cache_clear()
+    schedule.parse_schedule('Saturdays 8am-noon')
+    schedule.parse_schedule('Saturdays 8am-noon')
+
+    assert_that(schedule.parse_schedule.cache_info().hits).is_equal_to(1)
+    assert_that(schedule.parse_schedule.cache_info().misses).is_equal_to(1)
+
+
+def test_encode_decode():
+    """
+    Tests schedules with the same date range are combined into one entry.
+    """
+
+    schedules = schedule.parse_schedule('June 1 - August 31 Tuesday 9am-1pm, Thursday 3-6pm')
+    value = schedule.encode_open_hours(schedules)
+
+    assert_that(value).starts_with('0601-0831:')
+    entries = schedule.decode_open_hours(value)
+    assert_that(entries).is_length(1)
+    assert_that(entries[0][:2]).is_equal_to((601, 831))
+
+
+def test_encode_compact():
+    """
+    Tests the index groups weekdays sharing the same hours, and plain hex masks still decode.
+    """
+
+    schedules = schedule.parse_schedule('Mon-Fri 9am-5pm, Saturday 8am-noon 1-3pm')
+    value = schedule.encode_open_hours(schedules)
+
+    assert_that(value).is_equal_to('0101-1231:1f/0900-1700;20/0800-1200+1300-1500')
+    mask = schedule.get_week_mask(schedules[0]) | schedule.get_week_mask(schedules[1])
+    assert_that(schedule.decode_open_hours(value)).is_equal_to(((101, 1231, mask),))
+    assert_that(schedule.decode_open_hours(f"0101-1231:{mask:x}")).is_equal_to(((101, 1231, mask),))
+
+
+def test_encode_ordinal_weekday():
+    """
+    Tests ordinal weekday schedules are open only on the dates they fall on.
+    """
+
+    value = schedule.encode_open_hours(schedule.parse_schedule('June - August, 2nd Saturday 10-12'), year=2024)
+
+    assert_that(value).is_equal_to('0608-0608:20/1000-1200,0713-0713:20/1000-1200,0810-0810:20/1000-1200')
+    assert_that(schedule.is_open(value, datetime(2024, 7, 13, 11))).is_true()
+    assert_that(schedule.is_open(value, datetime(2024, 7, 6, 11))).is_false()
+    assert_that(schedule.is_open_this_week(value, datetime(2024, 7, 14))).is_false()
+
+
+def test_encode_default_window():
+    """
+    Tests schedules without months use the default date range.
+    """
+
+    schedules = schedule.parse_schedule('Mon-Fri 11:30am-1pm')
+
+    assert_that(schedule.encode_open_hours(schedules, ((6, 15), (8, 20)))).starts_with('0615-0820:')
+    assert_that(schedule.encode_open_hours(schedules)).starts_with('0101-1231:')
+    assert_that(schedule.encode_open_hours([])).is_equal_to('')
+
+
+def test_is_open():
+    """
+    Tests checking if a site is open at a given time.
+    """
+
+    value = schedule.encode_open_hours(schedule.parse_schedule('June 1 - October 31 Tuesday 9am-1pm'))
+
+    assert_that(schedule.is_open(value, TUESDAY)).is_true()
+    assert_that(schedule.is_open(value, TUESDAY.replace(hour=13))).is_false()
+    assert_that(schedule.is_open(value, TUESDAY.replace(day=3))).is_false()
+    assert_that(schedule.is_open(value, TUESDAY.replace(month=11, day=5))).is_false()
+    assert_that(schedule.is_open('', TUESDAY)).is_none()
+
+
+def test_is_open_this_week():
+    """
+    Tests checking if a site is open during the next seven days.
+    """
+
+    value = schedule.encode_open_hours(schedule.parse_schedule('June 1 - October 31 Saturday 9am-1pm'))
+
+    assert_that(schedule.is_open_this_week(value, TUESDAY)).is_true()
+    assert_that(schedule.is_open_this_week(value, datetime(2024, 10, 27))).is_false()
+    assert_that(schedule.is_open_this_week(None, TUESDAY)).is_none()
+
+
+def test_window_wraps_year():
+    """
+    Tests date ranges running past the end of the year.
+    """
+
+    assert_that(schedule.in_window(1101, 228, 1215)).is_true()
+    assert_that(schedule.in_window(1101, 228, 115)).is_true()
+    assert_that(schedule.in_window(1101, 228, 615)).is_false()
+
+
+def test_set_open_hours():
+    """
+    Tests the open hours of a record are set from all of its schedule texts.
+    """
+
+    record = schedule.set_open_hours({}, ['Tuesday 9am-1pm', 'Contact site for details'])
+
+    assert_that(schedule.is_open(record['open_hours'], TUESDAY)).is_true()
+    assert_that(schedule.set_open_hours({}, [None])['open_hours']).is_equal_to('')
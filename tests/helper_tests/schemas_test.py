@@ -0,0 +1,106 @@
+"""
+Tests for the compiled schema shared by every stage.
+"""
+
+from assertpy import assert_that
+
+from data_scripts.helpers import maputil, merge, schemas, validation
+
+SCHEMA_FILE = 'food-data/schema/map-data-schema.json'
+
+
+def get_schema():
+
+    return {
+        "$schema": "https://json-schema.org/draft/2020-12/schema",
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "name": {"type": "string", "minLength": 1},
+            "phone": {"type": ["string", "null"]},
+            "latitude": {"type": "number"},
+            "snap": {"type": "boolean"}
+        },
+        "required": ["id", "name"]
+    }
+
+
+def test_compile_schema():
+    """
+    Tests the values derived from the schema.
+    """
+
+    compiled = schemas.CompiledSchema(get_schema())
+
+    assert_that(compiled.columns).is_equal_to(['id', 'name', 'phone', 'latitude', 'snap'])
+    assert_that(compiled.template).is_equal_to(
+        {'id': None, 'name': '', 'phone': '', 'latitude': 0, 'snap': False})
+    assert_that(compiled.skip_fields).is_equal_to(['id', 'latitude', 'snap'])
+    assert_that(compiled.required).is_equal_to(['id', 'name'])
+    assert_that(compiled.types).contains_entry({'phone': 'string'})
+    assert_that(compiled).is_equal_to(get_schema())
+
+
+def test_convert():
+    """
+    Tests converting a record read from a file.
+    """
+
+    compiled = schemas.CompiledSchema(get_schema())
+    record = {'id': '4', 'name': 'Market', 'latitude': '40.5', 'snap': 'True'}
+
+    compiled.convert(record)
+
+    assert_that(record).is_equal_to({'id': 4, 'name': 'Market', 'latitude': 40.5, 'snap': True})
+    assert_that(compiled.is_valid(record)).is_true()
+
+
+def test_normalize():
+    """
+    Tests a record handed over in memory gets the values it would have read from a file.
+    """
+
+    compiled = schemas.CompiledSchema(get_schema())
+    record = {'id': 4, 'name': 15213, 'phone': None, 'latitude': '40.5', 'snap': None}
+
+    compiled.normalize(record)
+
+    assert_that(record).is_equal_to({'id': 4, 'name': '15213', 'phone': '', 'latitude': 40.5, 'snap': False})
+
+
+def test_metadata_in_memory():
+    """
+    Tests the derived values are kept in memory by the schema hash.
+    """
+
+    compiled = schemas.CompiledSchema(get_schema())
+    again = schemas.CompiledSchema(get_schema())
+
+    assert_that(schemas._metadata).contains_key(compiled.digest)
+    assert_that(again.skip_fields).is_same_as(compiled.skip_fields)
+
+
+def test_compile_schema_once():
+    """
+    Tests a schema is compiled once and compiled schemas are returned unchanged.
+    """
+
+    schema = get_schema()
+    compiled = schemas.compile_schema(schema)
+
+    assert_that(schemas.compile_schema(schema)).is_same_as(compiled)
+    assert_that(schemas.compile_schema(compiled)).is_same_as(compiled)
+    assert_that(schemas.load_schema(SCHEMA_FILE)).is_same_as(schemas.load_schema(SCHEMA_FILE))
+
+
+def test_helpers_accept_compiled_schema():
+    """
+    Tests the helpers accept a compiled schema in place of the schema dictionary.
+    """
+
+    compiled = schemas.load_schema(SCHEMA_FILE)
+    record = maputil.new_record(compiled)
+
+    assert_that(list(record.keys())).is_equal_to(compiled.columns)
+    assert_that(merge.get_skip_fields(compiled)).is_equal_to(compiled.skip_fields)
+    assert_that(validation.validate(compiled, record)).contains_key('valid')
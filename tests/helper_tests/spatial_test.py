@@ -0,0 +1,79 @@
+"""
+Tests for the spatial grid index.
+"""
+
+import random
+
+from assertpy import assert_that
+
+from data_scripts.helpers import spatial
+
+
+def test_distance():
+    """
+    Tests the great circle distance between two points.
+    """
+
+    assert_that(spatial.distance((40.4406, -79.9959), (40.4406, -79.9959))).is_equal_to(0)
+    assert_that(spatial.distance((40.0, -80.0), (41.0, -80.0))).is_close_to(111195, 10)
+
+
+def test_has_coordinates():
+    """
+    Tests missing and invalid coordinates are not used.
+    """
+
+    assert_that(spatial.has_coordinates(40.44, -79.99)).is_true()
+    assert_that(spatial.has_coordinates(0, 0)).is_false()
+    assert_that(spatial.has_coordinates('', -79.99)).is_false()
+    assert_that(spatial.has_coordinates(95, -79.99)).is_false()
+
+
+def test_nearby_pairs():
+    """
+    Tests only the points within the distance are paired, including points in neighbouring cells.
+    """
+
+    points = [
+        (40.44060, -79.99590),
+        (40.44070, -79.99600),
+        None,
+        (40.45060, -79.99590),
+        (40.44100, -79.99590)
+    ]
+
+    assert_that(sorted(spatial.nearby_pairs(points, 50))).is_equal_to([(0, 1), (0, 4), (1, 4)])
+    assert_that(list(spatial.nearby_pairs(points, 0))).is_empty()
+
+
+def test_nearby_pairs_match_brute_force():
+    """
+    Tests the grid finds the same pairs as comparing every pair of points.
+    """
+
+    generator = random.Random(7)
+    points = [(40.4 + generator.random() * 0.02, -80.0 + generator.random() * 0.02) for _ in range(300)]
+    index = spatial.GridIndex(points, 100)
+
+    expected = set()
+    for first in range(len(points)):
+        for second in range(first + 1, len(points)):
+            if spatial.distance(points[first], points[second]) <= 100:
+                expected.add((first, second))
+
+    assert_that(expected).is_not_empty()
+    assert_that(set(index.pairs())).is_equal_to(expected)
+
+
+def test_nearby_pairs_independent_of_other_points():
+    """
+    Tests two points are paired the same whatever other points are in the index.
+    """
+
+    pair = [(40.44060, -79.99590), (40.44060, -79.99649)]
+    distance = spatial.distance(*pair) + 0.01
+
+    assert_that(list(spatial.nearby_pairs(pair, distance))).is_equal_to([(0, 1)])
+    assert_that(list(spatial.nearby_pairs(pair + [(47.5, -79.99)], distance))).is_equal_to([(0, 1)])
+    assert_that(list(spatial.nearby_pairs(pair + [(25.0, -79.99)], distance))).is_equal_to([(0, 1)])
+    assert_that(list(spatial.nearby_pairs(pair, distance - 0.02))).is_empty()
@@ -2,7 +2,10 @@
 Unit tests for the validation helper.
 """
 
+import jsonschema
 from assertpy import assert_that
+from jsonschema.exceptions import ValidationError
+
 from data_scripts.helpers import validation
 
 
@@ -152,4 +155,95 @@ def test_validate_zero_longitude():
     Tests that a longitude of 0 is invalid.
     """
     
-    assert_that(validation.validate_longitude(0)).is_false()
\ No newline at end of file
+    assert_that(validation.validate_longitude(0)).is_false()
+
+def test_get_validator_cached():
+    """
+    Tests the validator is compiled once for each schema object.
+    """
+
+    schema = get_schema()
+    validator = validation.get_validator(schema)
+
+    assert_that(validation.get_validator(schema)).is_same_as(validator)
+    assert_that(validation.get_validator(get_schema())).is_not_same_as(validator)
+
+
+def test_is_valid():
+    """
+    Tests the fast path only returns valid or invalid.
+    """
+
+    schema = get_schema()
+    schema['required'] = ["id", "name"]
+
+    assert_that(validation.is_valid(schema, {"id": 1, "name": "My Record"})).is_true()
+    assert_that(validation.is_valid(schema, {"id": 1})).is_false()
+
+
+def test_validation_matches_jsonschema():
+    """
+    Tests the error message matches the message from jsonschema.validate.
+    """
+
+    schema = get_schema()
+    schema['required'] = ["id", "name"]
+    record = {"id": "12345"}
+
+    try:
+        jsonschema.validate(record, schema)
+        expected = ''
+    except ValidationError as e:
+        expected = f"{e.json_path} is invalid: {e.message}"
+
+    result = validation.validate(schema, record)
+    assert_that(result).contains_entry({'errors': expected})
+
+
+def test_validate_record():
+    """
+    Tests the validation result is stored on the record as error codes.
+    """
+
+    schema = get_schema()
+    schema['required'] = ["id", "name"]
+    record = {"id": "12345"}
+
+    result = validation.validate_record(schema, record)
+
+    assert_that(result).is_false()
+    assert_that(record)\
+        .contains_entry({'in_error': True})\
+        .contains_entry({'data_issues': 'id:type;name:required'})
+
+
+def test_validate_record_coordinates():
+    """
+    Tests coordinates outside of the service area are recorded as an error code.
+    """
+
+    schema = get_schema()
+    record = {"id": 1, "name": "My Record", "latitude": 10.0, "longitude": -80.0}
+
+    assert_that(validation.validate_record(schema, record)).is_false()
+    assert_that(record).contains_entry({'data_issues': validation.COORDINATES_ERROR})
+
+    record['latitude'] = 40.4
+    assert_that(validation.validate_record(schema, record, ['latitude'])).is_true()
+    assert_that(record).contains_entry({'in_error': False})
+
+
+def test_validate_record_changed_fields():
+    """
+    Tests only the changed fields are validated again and the other codes are kept.
+    """
+
+    schema = get_schema()
+    record = {"id": "12345", "name": 10, "data_issues": "id:type;name:type"}
+
+    record['name'] = 'My Record'
+    validation.validate_record(schema, record, ['name'])
+
+    assert_that(record)\
+        .contains_entry({'in_error': True})\
+        .contains_entry({'data_issues': 'id:type'})
@@ -0,0 +1,161 @@
+"""
+Unit tests for the Merge Data Script.
+"""
+
+import contextlib
+import csv
+import os
+
+from assertpy import assert_that
+
+from data_scripts import merge_data
+
+TYPES = {
+    'id': 'integer',
+    'name': 'string',
+    'source_file': 'string',
+    'original_id': 'string',
+    'latitude': 'number',
+    'longitude': 'number',
+    'active_record': 'boolean',
+    'in_error': 'boolean',
+    'data_issues': 'string'
+}
+COLUMNS = list(TYPES)
+
+
+def write_raw_file(directory, file: str, count: int, invalid: int = 0) -> None:
+    """
+    Writes a raw file with valid records followed by records without coordinates.
+
+    Args:
+        directory (path): Raw files directory
+        file (str): File name
+        count (int): Number of valid records
+        invalid (int): Number of invalid records
+    """
+
+    with open(os.path.join(directory, file), 'w', newline='', encoding='utf-8') as raw_file:
+        writer = csv.DictWriter(raw_file, fieldnames=COLUMNS, delimiter=merge_data.DELIMITER)
+        writer.writeheader()
+        for index in range(count + invalid):
+            valid = index < count
+            writer.writerow({
+                'id': index,
+                'name': f"{file} {index}",
+                'source_file': file,
+                'original_id': index,
+                'latitude': 40.44 if valid else 0,
+                'longitude': -79.99 if valid else 0,
+                'active_record': 'True',
+                'in_error': False,
+                'data_issues': ''
+            })
+
+
+def merge(directory, output, workers: int, typed: bool = False) -> tuple:
+    """
+    Merges the raw files of a directory.
+
+    Args:
+        directory (path): Raw files directory
+        output (path): Output directory
+        workers (int): Number of processes
+        typed (bool): Read and write the typed columnar files
+
+    Returns:
+        tuple: Merged file text, invalid file text, error index entries and typed merged columns
+    """
+
+    output = os.path.join(output, f"{workers}-{typed}")
+    os.makedirs(output)
+    files = merge_data.get_input_files(os.listdir(directory), typed)
+    error_index = merge_data.errors.ErrorIndex()
+    with contextlib.ExitStack() as stack:
+        writers = merge_data.open_writers(stack, output, TYPES, typed)
+        if workers > 1:
+            merge_data.ingest_parallel(str(directory), files, writers, error_index, TYPES, workers)
+        else:
+            for record, mergeable in merge_data.stream_records(str(directory), files, error_index):
+                merge_data.write_record(writers, record, mergeable)
+
+    with open(writers['merged'].path, encoding='utf-8') as merged_file, \
+            open(writers['invalid'].path, encoding='utf-8') as invalid_file:
+        typed_columns = merge_data.columnar.read_columns(writers['typed'].path) if typed else None
+        return merged_file.read(), invalid_file.read(), error_index.to_dict(), typed_columns
+
+
+def test_ingest_parallel(tmp_path):
+    """
+    Tests reading the raw files in a pool gives the same files as reading them in turn.
+    """
+
+    raw_directory = tmp_path / 'raw'
+    raw_directory.mkdir()
+    write_raw_file(raw_directory, 'b-raw.csv', 5, 2)
+    write_raw_file(raw_directory, 'a-raw.csv', 3, 1)
+    write_raw_file(raw_directory, 'c-raw.csv', 4)
+
+    serial = merge(raw_directory, tmp_path, 1)
+    parallel = merge(raw_directory, tmp_path, 2)
+
+    assert_that(parallel).is_equal_to(serial)
+    assert_that(serial[0].splitlines()).is_length(13)
+    assert_that(serial[0].splitlines()[1]).contains('a-raw.csv 0')
+    assert_that(serial[1].splitlines()).is_length(4)
+    assert_that(serial[2]).contains_key('a-raw.csv', 'b-raw.csv')
+
+
+def test_record_writer_lazy(tmp_path):
+    """
+    Tests the writer only creates its file once there is a record.
+    """
+
+    path = tmp_path / 'empty.csv'
+    with merge_data.RecordWriter(str(path), COLUMNS) as writer:
+        writer.append(str(tmp_path / 'missing.csv'), 0)
+
+    assert_that(path.exists()).is_false()
+    assert_that(writer.count).is_equal_to(0)
+
+
+def test_ingest_typed(tmp_path):
+    """
+    Tests typed columnar raw files are read instead of the CSV files and give the same merged file.
+    """
+
+    raw_directory = tmp_path / 'raw'
+    raw_directory.mkdir()
+    write_raw_file(raw_directory, 'a-raw.csv', 3, 1)
+    write_raw_file(raw_directory, 'b-raw.csv', 2)
+    with open(raw_directory / 'a-raw.csv', encoding='utf-8') as raw_file:
+        records = list(merge_data.csv.DictReader(raw_file, delimiter=merge_data.DELIMITER))
+    merge_data.columnar.write_records(str(raw_directory / 'a-raw.col'), records, TYPES)
+
+    assert_that(merge_data.get_input_files(os.listdir(raw_directory), True)).is_equal_to(['a-raw.col', 'b-raw.csv'])
+    assert_that(merge_data.get_input_files(os.listdir(raw_directory))).is_equal_to(['a-raw.csv', 'b-raw.csv'])
+
+    serial = merge(raw_directory, tmp_path, 1)
+    typed = merge(raw_directory, tmp_path, 1, True)
+    parallel = merge(raw_directory, tmp_path, 2, True)
+
+    assert_that(typed[:3]).is_equal_to(serial[:3])
+    assert_that(parallel).is_equal_to(typed)
+    assert_that(typed[3]['latitude']).is_equal_to([40.44] * 5)
+    assert_that(typed[3]['active_record']).is_equal_to([True] * 5)
+
+
+def test_stream_batches_shared_source():
+    """
+    Tests sources sharing a source_file and original ids still get ids unique across the run.
+    """
+
+    def batch(name: str) -> tuple:
+        return name, [{'source_file': 'JUST_HARVEST', 'original_id': str(index), 'latitude': 40.44,
+                       'longitude': -79.99, 'active_record': 'True'} for index in range(3)]
+
+    error_index = merge_data.errors.ErrorIndex()
+    records = [record for record, _ in merge_data.stream_batches(
+        [batch('jh-fresh-access-raw.csv'), batch('jh-fresh-corners-raw.csv')], error_index)]
+
+    assert_that({record['id'] for record in records}).is_length(6)
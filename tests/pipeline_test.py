@@ -0,0 +1,255 @@
+"""
+Unit tests for the in-process Pipeline runner.
+"""
+
+import json
+import os
+from types import SimpleNamespace
+
+from assertpy import assert_that
+
+from data_scripts import pipeline
+
+
+def build_record(schema: dict, name: str, latitude: float = 40.44) -> dict:
+    """
+    Creates a source record for testing.
+
+    Args:
+        schema (dict): Compiled JSON Schema
+        name (str): Name
+        latitude (float): Latitude
+
+    Returns:
+        dict: Record
+    """
+
+    record = schema.new_record()
+    record.update({
+        'name': name,
+        'type': 'supermarket',
+        'address': f"{len(name)} Main St",
+        'city': 'Pittsburgh',
+        'state': 'PA',
+        'zip_code': 15213,
+        'latitude': latitude,
+        'longitude': -79.99,
+        'original_id': len(name),
+        'active_record': True
+    })
+    return record
+
+
+def build_source(tmp_path, file: str, records: list):
+    """
+    Creates a source script for testing.
+
+    Args:
+        tmp_path (path): Raw files directory
+        file (str): Raw file name
+        records (list): Records returned by the source
+
+    Returns:
+        SimpleNamespace: Source
+    """
+
+    written = []
+    return SimpleNamespace(
+        RAW_OUTPUT_FOLDER=str(tmp_path),
+        RAW_OUTPUT_FILE=file,
+        get_records=lambda schema: records,
+        write_output=lambda records, schema: written.append(records),
+        written=written
+    )
+
+
+def test_run_source(tmp_path):
+    """
+    Tests source records are converted to the values read from a raw file.
+    """
+
+    session = pipeline.Session(write_intermediates=False)
+    source = build_source(tmp_path, 'a-raw.csv', [build_record(session.schema, 'Market')])
+
+    name, records = pipeline.run_source(session, source)
+
+    assert_that(name).is_equal_to('a-raw.csv')
+    assert_that(records[0]['zip_code']).is_equal_to('15213')
+    assert_that(records[0]['original_id']).is_equal_to('6')
+    assert_that(source.written).is_length(1)
+
+
+def test_run_source_previous_file(tmp_path):
+    """
+    Tests a source without records falls back to its last raw file.
+    """
+
+    session = pipeline.Session(write_intermediates=False)
+    (tmp_path / 'a-raw.csv').write_text('name|latitude|snap\nMarket|40.5|True\n', encoding='utf-8')
+
+    _, records = pipeline.run_source(session, build_source(tmp_path, 'a-raw.csv', []))
+    _, missing = pipeline.run_source(session, build_source(tmp_path, 'b-raw.csv', []))
+
+    assert_that(records).is_equal_to([{'name': 'Market', 'latitude': 40.5, 'snap': True}])
+    assert_that(missing).is_empty()
+
+
+def test_run_merge(tmp_path, monkeypatch):
+    """
+    Tests the sources are merged in the order of their raw file names without writing the merged file.
+    """
+
+    monkeypatch.setattr(pipeline.merge_data, 'OUTPUT_DIRECTORY', str(tmp_path))
+    session = pipeline.Session(write_intermediates=False, incremental=False)
+    batches = [
+        pipeline.run_source(session, build_source(tmp_path, 'b-raw.csv', [build_record(session.schema, 'Giant Eagle')])),
+        pipeline.run_source(session, build_source(tmp_path, 'a-raw.csv', [
+            build_record(session.schema, 'Aldi'),
+            build_record(session.schema, 'Nowhere', 0)
+        ]))
+    ]
+
+    merged = pipeline.run_merge(session, batches)
+
+    assert_that([record['name'] for record in merged]).is_equal_to(['Aldi', 'Giant Eagle'])
+    assert_that(sorted(os.listdir(tmp_path))).is_equal_to(['error-index.json', 'invalid-raw-sources.csv'])
+    with open(tmp_path / 'error-index.json', encoding='utf-8') as index_file:
+        assert_that(json.load(index_file)).contains_key('a-raw.csv')
+
+
+def test_run_merge_intermediates(tmp_path, monkeypatch):
+    """
+    Tests the merged file is written with the intermediates.
+    """
+
+    monkeypatch.setattr(pipeline.merge_data, 'OUTPUT_DIRECTORY', str(tmp_path))
+    session = pipeline.Session(write_intermediates=True)
+    source = build_source(tmp_path, 'a-raw.csv', [build_record(session.schema, 'Aldi')])
+
+    merged = pipeline.run_merge(session, [pipeline.run_source(session, source)])
+
+    assert_that(source.written).is_length(1)
+    assert_that(merged).is_length(1)
+    assert_that(os.listdir(tmp_path)).contains('merged-raw-sources.csv').does_not_contain('invalid-raw-sources.csv')
+
+
+def test_build_stages(tmp_path):
+    """
+    Tests the sources run as independent stages ahead of the merge, de-duplication and staging.
+    """
+
+    session = pipeline.Session(write_intermediates=False)
+    sources = [SimpleNamespace(__name__=f"data_scripts.{name}") for name in ('a_source', 'b_source')]
+
+    stages = {stage.name: stage for stage in pipeline.build_stages(session, sources)}
+
+    assert_that(list(stages)).is_equal_to(['a_source', 'b_source', 'merge', 'deduplicate', 'stage_files'])
+    assert_that(stages['a_source'].depends).is_empty()
+    assert_that(stages['a_source'].retries).is_equal_to(pipeline.SOURCE_RETRIES)
+    assert_that(stages['merge'].depends).is_equal_to(('a_source', 'b_source'))
+    assert_that(stages['stage_files'].depends).is_equal_to(('deduplicate',))
+
+
+def test_run_merge_incremental(tmp_path, monkeypatch):
+    """
+    Tests incremental runs write the merged file and the next run reuses the same records.
+    """
+
+    monkeypatch.setattr(pipeline.merge_data, 'OUTPUT_DIRECTORY', str(tmp_path))
+    session = pipeline.Session(write_intermediates=False, incremental=True)
+    source = build_source(tmp_path, 'a-raw.csv', [build_record(session.schema, 'Aldi')])
+
+    merged = pipeline.run_merge(session, [pipeline.run_source(session, source)])
+    reused = pipeline.reuse_merge(session)
+
+    assert_that(pipeline.fingerprint.hash_records(reused, session.schema.columns)).is_equal_to(
+        pipeline.fingerprint.hash_records(merged, session.schema.columns))
+
+
+def test_build_stages_reuse(tmp_path):
+    """
+    Tests only the sources reading files in the repository can reuse their output.
+    """
+
+    session = pipeline.Session(write_intermediates=False)
+    web_source = SimpleNamespace(__name__='web_source')
+    file_source = SimpleNamespace(__name__='file_source', INPUT_FILES=(str(tmp_path / 'input.csv'),))
+
+    stages = {stage.name: stage for stage in pipeline.build_stages(session, [web_source, file_source])}
+
+    assert_that(stages['web_source'].reuse).is_none()
+    assert_that(stages['file_source'].reuse).is_not_none()
+    assert_that(stages['file_source'].version).is_not_equal_to(stages['web_source'].version)
+    assert_that(stages['merge'].reuse).is_not_none()
+
+
+def test_write_run_report(tmp_path, monkeypatch):
+    """
+    Tests the run report combines the stage timings with their metrics and each run is added to the trend file.
+    """
+
+    monkeypatch.setattr(pipeline, 'REPORT_FILE', str(tmp_path / 'run-report.json'))
+    monkeypatch.setattr(pipeline, 'TREND_FILE', str(tmp_path / 'run-trend.ndjson'))
+    run_metrics = pipeline.metrics.reset()
+    run_metrics.add(pipeline.metrics.RECORDS_OUT, 10, 'a_source')
+    run_metrics.add_time(pipeline.metrics.FETCH, 0.5, 'a_source')
+    report = {
+        'seconds': 1.0,
+        'stage_seconds': 1.5,
+        'critical_path': ['a_source', 'merge'],
+        'critical_path_seconds': 1.0,
+        'stages': {
+            'a_source': {'start': 0.0, 'end': 0.8, 'seconds': 0.8, 'attempts': 1, 'status': 'succeeded'},
+            'merge': {'start': 0.8, 'end': 1.0, 'seconds': 0.2, 'attempts': 0, 'status': 'reused'}
+        }
+    }
+
+    pipeline.write_run_report('2024-01-07T02:00:00+00:00', report)
+    pipeline.write_run_report('2024-01-14T02:00:00+00:00', report)
+
+    with open(tmp_path / 'run-report.json', encoding='utf-8') as report_file:
+        run_report = json.load(report_file)
+    with open(tmp_path / 'run-trend.ndjson', encoding='utf-8') as trend_file:
+        trend = [json.loads(line) for line in trend_file]
+    assert_that(run_report['stages']['a_source']['counters']).is_equal_to({'records_out': 10})
+    assert_that(run_report['stages']['a_source']['spans']['fetch']).is_equal_to({'calls': 1, 'seconds': 0.5})
+    assert_that(run_report['caches']['stages_reused']).is_equal_to(1)
+    assert_that(trend).is_length(2)
+    assert_that(trend[1]).contains_entry({'started': '2024-01-14T02:00:00+00:00'}, {'reused': ['merge']})
+
+
+def test_build_stages_settings(monkeypatch):
+    """
+    Tests the stage versions change with the settings that change their output.
+    """
+
+    session = pipeline.Session(write_intermediates=False)
+    sources = [SimpleNamespace(__name__='web_source')]
+
+    def get_version() -> str:
+        return pipeline.build_stages(session, sources)[0].version
+
+    version = get_version()
+    assert_that(get_version()).is_equal_to(version)
+    for module, name, value in ((pipeline.merge, 'DEDUP_DISTANCE', 75.0),
+                                (pipeline.merge, 'DEDUP_NAME_SIMILARITY', 0.8),
+                                (pipeline.columnar, 'ENABLED', not pipeline.columnar.ENABLED),
+                                (pipeline.manual_source, 'MAPBOX_KEY', 'pk.key')):
+        with monkeypatch.context() as patch:
+            patch.setattr(module, name, value)
+            assert_that(get_version()).described_as(name).is_not_equal_to(version)
+
+
+def test_session_run_context():
+    """
+    Tests every source of a run evaluates the rules against the context of the session.
+    """
+
+    session = pipeline.Session(write_intermediates=False)
+
+    assert_that(pipeline.context.get_run_context()).is_same_as(session.run_context)
+    session.close()
+
+    following = pipeline.Session(write_intermediates=False)
+    assert_that(following.run_context).is_not_same_as(session.run_context)
+    following.close()
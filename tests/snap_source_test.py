@@ -148,4 +148,24 @@ def test_map_record_other():
         .contains_entry({'food_bucks': True})\
         .contains_entry({'fmnp': False})\
         .contains_entry({'free_distribution': False})\
-        .contains_entry({'type': OTHER})
\ No newline at end of file
+        .contains_entry({'type': OTHER})
+
+def test_get_records_batch(monkeypatch):
+    """
+    Tests applying the rules to every location at once gives the same records as mapping them one at a time.
+    """
+
+    names = ['Green Grocer - Greater Pittsburgh Comm Food Bank', 'Sunoco', 'Giant Eagle',
+             'Bloomfield Farmers Market', 'Dollar General']
+    locations = [dict(build_item(name), ObjectId=index) for index, name in enumerate(names)]
+    monkeypatch.setattr(snap_source.gis, 'get_snap_sites', lambda: [dict(location) for location in locations])
+    schema = snap_source.schemas.load_schema('food-data/schema/map-data-schema.json')
+
+    records = snap_source.get_records(schema)
+
+    def mapped(record: dict) -> dict:
+        return {key: value for key, value in record.items() if key not in ('id', 'in_error', 'data_issues')}
+
+    assert_that(records).is_length(len(locations))
+    for location, record in zip(locations, records):
+        assert_that(mapped(record)).is_equal_to(mapped(snap_source.map_record(location, schema)))